@@ -5,14 +5,16 @@ from PIL import Image, ImageTk  # Used to handle images in the GUI.
 import os
 import pandas as pd  # Used to handle CSV file data.
 import numpy as np  # Used for numerical operations.
-from sklearn.cluster import DBSCAN  # DBSCAN is used for clustering points.
 import json  # json is used to save and load JSON files.
-import networkx as nx  # NetworkX is used for graph-based data structure.
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Floorplan_Detection_Phase1'))
+from FloorplanDetection import SpatialIndex, WallClusters, WallGraph, snap_points  # Array backed wall graph (node ids stay stable when points are deleted)
 
 """
 Upload csv, upload image, process, save, add point, link point, delink point, modify point, delete point, undo.
 
-snap is working to an extent
+snap aligns close points to the axes and straightens walls to the dominant wall angles
 """
 
 class WallEndpointsEditor:
@@ -36,7 +38,11 @@ class WallEndpointsEditor:
         ########## Define constants ##########
         self.csv_path = ""
         self.img_path = ""
-        self.graph = nx.Graph()
+        self.graph = WallGraph()
+        self.index_cell_size = 30  # Grid cell of the nearest point index, same as the clustering eps
+        self.node_index = SpatialIndex(self.index_cell_size)  # Kept in sync with self.graph's nodes
+        self.wall_clusters = None  # Incremental clustering of the csv boxes, owns self.graph after process()
+        self.graph_edited = False  # Manual edits since process(), the next process() then starts from scratch
         self.action_history = []
         self.selected_point = None
         self.snapping_enabled = True
@@ -50,6 +56,7 @@ class WallEndpointsEditor:
         self.link_points_active = False
         self.delink_points_active = False
         self.modify_point_active = False
+        self.delete_point_active = False
 
         self.scale_factor_x = 1
         self.scale_factor_y = 1
@@ -105,34 +112,17 @@ class WallEndpointsEditor:
         Adjust the coordinates of nodes so that close endpoints are aligned.
         """
         snap_threshold = 20  # Define a threshold for snapping
+        angle_tolerance = 5  # Walls within this many degrees of the axes or a dominant wall angle get straightened
 
-        # Get the list of all node coordinates
-        node_coords = [self.graph.nodes[node]['coord'] for node in self.graph.nodes]
-
-        # Snap nodes along the x-axis
-        for i, coord1 in enumerate(node_coords):
-            for j, coord2 in enumerate(node_coords):
-                if i != j:
-                    # Check if the x-coordinates are within the snapping threshold
-                    if abs(coord1[0] - coord2[0]) < snap_threshold:
-                        average_x = (coord1[0] + coord2[0]) / 2
-                        new_coord1 = (average_x, coord1[1])
-                        new_coord2 = (average_x, coord2[1])
-                        self.graph.nodes[i]['coord'] = new_coord1
-                        self.graph.nodes[j]['coord'] = new_coord2
-
-        # Snap nodes along the y-axis
-        for i, coord1 in enumerate(node_coords):
-            for j, coord2 in enumerate(node_coords):
-                if i != j:
-                    # Check if the y-coordinates are within the snapping threshold
-                    if abs(coord1[1] - coord2[1]) < snap_threshold:
-                        average_y = (coord1[1] + coord2[1]) / 2
-                        new_coord1 = (coord1[0], average_y)
-                        new_coord2 = (coord2[0], average_y)
-                        self.graph.nodes[i]['coord'] = new_coord1
-                        self.graph.nodes[j]['coord'] = new_coord2
+        # Snap x, then y, then the dominant wall angles (vectorised, see FloorplanDetection/snapping.py).
+        # Node ids can have gaps (deleted points), so only the live slots are snapped.
+        node_ids = self.graph.node_ids()
+        snapped = snap_points(self.graph.coords, snap_threshold, edges=self.graph.live_edges(),
+                              tolerance=angle_tolerance, nodes=node_ids)
+        self.graph.move_nodes(node_ids, snapped[node_ids])
 
+        self.rebuild_node_index()  # Every node may have moved
+        self.graph_edited = True
         self.draw_wall_endpoints()  # Redraw the wall endpoints with the updated coordinates
         print("Points snapped")
 
@@ -183,7 +173,6 @@ class WallEndpointsEditor:
         Logic to visualise the YOLO based bounding boxes for wall detection and its corresponding endpoints 
         """
         if self.csv_path and self.img_path:
-            self.graph.clear() # Remove all nodes and edges from the graph
             self.visualise_boundingbox(self.csv_path, self.img_path)
             self.print_graph_statistics()
             self.display_image()
@@ -191,18 +180,11 @@ class WallEndpointsEditor:
 
     def draw_wall_endpoints(self):
         self.canvas.delete("wall_point")
-        for node in self.graph.nodes:
-            x, y = self.graph.nodes[node]['coord']
-            x = x * self.scale_factor_x
-            y = y * self.scale_factor_y
+        scale = np.array([self.scale_factor_x, self.scale_factor_y])
+        # Scale all points and walls in one go, straight from the graph's arrays
+        for x, y in (self.graph.coords[self.graph.node_ids()] * scale).tolist():
             self.canvas.create_oval(x-3, y-3, x+3, y+3, fill="red", tags="wall_point")
-        for edge in self.graph.edges:
-            x1, y1 = self.graph.nodes[edge[0]]['coord']
-            x2, y2 = self.graph.nodes[edge[1]]['coord']
-            x1 = x1 * self.scale_factor_x
-            y1 = y1 * self.scale_factor_y
-            x2 = x2 * self.scale_factor_x
-            y2 = y2 * self.scale_factor_y
+        for (x1, y1), (x2, y2) in (self.graph.segments() * scale).tolist():
             self.canvas.create_line(x1, y1, x2, y2, fill="blue", tags="wall_point")
 
     def add_point_mode(self):
@@ -210,12 +192,14 @@ class WallEndpointsEditor:
         self.link_points_active = False
         self.delink_points_active = False
         self.modify_point_active = False
+        self.delete_point_active = False
 
     def link_points_mode(self):
         self.link_points_active = True
         self.add_point_active = False
         self.delink_points_active = False
         self.modify_point_active = False
+        self.delete_point_active = False
         self.selected_point = None
 
     def delink_points_mode(self):
@@ -223,6 +207,7 @@ class WallEndpointsEditor:
         self.add_point_active = False
         self.link_points_active = False
         self.modify_point_active = False
+        self.delete_point_active = False
         self.selected_point = None
     
     def modify_point_mode(self):
@@ -230,6 +215,7 @@ class WallEndpointsEditor:
         self.add_point_active = False
         self.link_points_active = False
         self.delink_points_active = False
+        self.delete_point_active = False
         self.selected_point = None
     
     def delete_point_mode(self):
@@ -245,10 +231,12 @@ class WallEndpointsEditor:
         x = event.x / self.scale_factor_x
         y = event.y / self.scale_factor_y
         print(f"Click at: ({x}, {y})")
+        if self.add_point_active or self.link_points_active or self.delink_points_active or self.delete_point_active:
+            self.graph_edited = True
 
         if self.add_point_active:
-            new_node_id = len(self.graph.nodes)
-            self.graph.add_node(new_node_id, coord=(x, y))
+            new_node_id = self.graph.add_node(x, y)
+            self.node_index.insert(new_node_id, x, y)
             self.draw_wall_endpoints()
             self.add_point_active = False
             self.action_history.append(("add_node", new_node_id))
@@ -287,10 +275,13 @@ class WallEndpointsEditor:
         
         elif self.delete_point_active:
             closest_node = self.find_closest_node((x, y))
-            if closest_node in self.graph.nodes:
+            if closest_node is not None:
+                coord = self.graph.coord(closest_node)
+                neighbors = self.graph.neighbors(closest_node).tolist()
                 self.graph.remove_node(closest_node)
+                self.node_index.remove(closest_node)
                 self.draw_wall_endpoints()
-                self.action_history.append(("remove_node", closest_node))
+                self.action_history.append(("remove_node", closest_node, coord, neighbors))
                 self.delete_point_active = False
                 print(f"Point {closest_node} deleted")
 
@@ -298,17 +289,23 @@ class WallEndpointsEditor:
         if self.modify_point_active and self.selected_point is not None:
             x = event.x / self.scale_factor_x
             y = event.y / self.scale_factor_y
-            self.graph.nodes[self.selected_point]['coord'] = (x, y)
+            self.graph.move_node(self.selected_point, x, y)
+            self.node_index.move(self.selected_point, x, y)
+            self.graph_edited = True
             self.draw_wall_endpoints()
 
     def find_closest_node(self, point):
         """
         Finds the closest point in a list of points to a given target point.(Euclidean distance)
         """
-        closest_node = min(self.graph.nodes, key=lambda n: np.linalg.norm(np.array(self.graph.nodes[n]['coord']) - np.array(point)))
-        return closest_node
+        hit = self.node_index.nearest(point[0], point[1])  # Only looks at the grid cells around the point
+        return hit[0] if hit else None
 
-    
+    def rebuild_node_index(self):
+        """
+        Re-index all nodes, after the graph was rebuilt or its coordinates were changed in place.
+        """
+        self.node_index = SpatialIndex.from_graph(self.graph, self.index_cell_size)
 
     def visualise_boundingbox(self, csv, img):
         # Read image and csv files
@@ -317,6 +314,7 @@ class WallEndpointsEditor:
         # Image Dimensions
         img_height, img_width = input_img.shape[:2]
 
+        boxes = []
         wall_endpoints_pairs = []
         for _, row in results_df.iterrows():
             if row['name'] == 'wall':
@@ -326,32 +324,28 @@ class WallEndpointsEditor:
                 cv2.circle(input_img, (x1, y1), 5, (0, 0, 255), -1)
                 cv2.circle(input_img, (x2, y2), 5, (0, 0, 255), -1)
                 wall_endpoints_pairs.append([(x1, y1), (x2, y2)])
+                boxes.append((x1, y1, x2, y2))
 
         self.wall_endpoints_pairs = wall_endpoints_pairs
         print("Wall Endpoints Pairs: ", wall_endpoints_pairs)
         
-        cluster_model = DBSCAN(eps=30, min_samples=1)
-        cluster_points = [pt for pair in wall_endpoints_pairs for pt in pair]
-        cluster_model.fit(cluster_points)
-        cluster_labels = cluster_model.labels_
-
-        clusters = {}
-        for point, label in zip(cluster_points, cluster_labels):
-            if label not in clusters:
-                clusters[label] = []
-            clusters[label].append(point)
-
-        cluster_centers = [np.mean(clusters[label], axis=0).astype(int).tolist() for label in clusters]
-
-        self.graph.clear()  # Clear the graph before adding new nodes and edges
-        for idx, center in enumerate(cluster_centers):
-            self.graph.add_node(idx, coord=center)
-
-        for pair in wall_endpoints_pairs:
-            node1 = self.find_closest_node(pair[0])
-            node2 = self.find_closest_node(pair[1])
-            if node1 != node2:
-                self.graph.add_edge(node1, node2)
+        # Endpoints within 30px of each other become one corner (grid hash clustering, same clusters as
+        # DBSCAN(eps=30, min_samples=1)), every wall links the corners of its two endpoints
+        if self.wall_clusters is not None and not self.graph_edited:
+            # Re-processed (e.g. the csv got new detections): only the boxes that changed are re-clustered
+            changes = self.wall_clusters.sync(boxes)
+            for node in changes.nodes_removed:
+                self.node_index.discard(node)
+            for node in changes.nodes_added | changes.nodes_moved:
+                self.node_index.insert(node, *self.graph.coord(node))
+            print("Graph changes: ", changes.to_dict())
+        else:
+            box_corners = lambda x1, y1, x2, y2: ((x1, y1), (x2, y2))  # Same endpoints as drawn above
+            self.wall_clusters = WallClusters.from_boxes(boxes, self.index_cell_size, endpoints=box_corners)
+            self.graph = self.wall_clusters.graph  # Replaces the graph and any manual edits
+            self.rebuild_node_index()
+            self.action_history = []
+        self.graph_edited = False
 
         self.print_graph_statistics()
 
@@ -359,10 +353,11 @@ class WallEndpointsEditor:
         """
         Prints the graph statistics: nodes and edges
         """
-        print(f"Graph Nodes: {len(self.graph.nodes)}")
-        print(f"Graph Nodes: {self.graph.nodes}")
-        print(f"Graph Edges: {len(self.graph.edges)}")
-        print(f"Graph Edges: {self.graph.edges}")
+        data = self.graph.to_dict()
+        print(f"Graph Nodes: {self.graph.n_nodes}")
+        print(f"Graph Nodes: {data['nodes']}")
+        print(f"Graph Edges: {self.graph.n_edges}")
+        print(f"Graph Edges: {data['edges']}")
 
     def save(self):
         """
@@ -370,10 +365,7 @@ class WallEndpointsEditor:
         """
         save_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
         if save_path:
-            data = {
-                "nodes": {node: {"coord": list(map(float, self.graph.nodes[node]['coord']))} for node in self.graph.nodes},
-                "edges": list(self.graph.edges)
-            }
+            data = self.graph.to_dict()
             with open(save_path, 'w') as f:
                 json.dump(data, f, indent=4)
             print(f"Graph saved to {save_path}")
@@ -386,16 +378,19 @@ class WallEndpointsEditor:
             return
 
         last_action = self.action_history.pop()
+        self.graph_edited = True
         action_type = last_action[0]
 
         if action_type == "add_node":
             node_id = last_action[1]
             self.graph.remove_node(node_id)
+            self.node_index.remove(node_id)
 
         elif action_type == "remove_node":
-            node_id = last_action[1]
-            coord = last_action[2]
-            self.graph.add_node(node_id, coord=coord)
+            coord, neighbors = last_action[2], last_action[3]
+            node_id = self.graph.add_node(*coord)  # Gets the freed id back unless other points were deleted since
+            self.node_index.insert(node_id, *coord)
+            self.graph.add_edges([[node_id, neighbor] for neighbor in neighbors if self.graph.has_node(neighbor)])
 
         elif action_type == "add_edge":
             node1, node2 = last_action[1], last_action[2]
@@ -3,49 +3,18 @@ import pandas as pd
 import cv2
 from google.colab.patches import cv2_imshow
 import numpy as np
-from sklearn.cluster import DBSCAN
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Floorplan_Detection_Phase1'))
+from FloorplanDetection import build_wall_graph, calculate_eps
 
 """
 Takes in a csv file that has bounding box params from yolov9 and 
 * Generates the wall endpoints
 * Cluster and merge endpoints within a certain range into a single point, img size considered (wall corners)
-* Visualise bounding boxes as well as wall endpoints, save overlapped images of them
+* Visualise bounding boxes as well as wall endpoints and walls (WallGraph), save overlapped images of them
 """
 
-def calculate_eps(image_size, scale_factor=0.01):
-    width, height = image_size
-    diagonal = np.sqrt(width**2 + height**2)
-    eps = scale_factor * diagonal
-    return eps
-
-def cluster_coordinates(coordinates, eps, min_samples=1):
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(coordinates)
-    unique_labels = set(clustering.labels_)
-    clustered_coordinates = []
-
-    for label in unique_labels:
-        if label == -1:  # Noise
-            continue
-        class_member_mask = (clustering.labels_ == label)
-        cluster = coordinates[class_member_mask]
-        centroid = cluster.mean(axis=0)
-        clustered_coordinates.append(tuple(centroid))
-    
-    return clustered_coordinates
-
-def wall_endpoints(xmin, ymin, xmax, ymax):
-  width = abs(xmax - xmin)
-  height = abs(ymax - ymin)
-
-  if height >= width:  # Vertical or square bounding box
-      x_top, y_top = xmin + (width / 2), ymin
-      x_bottom, y_bottom = xmin + (width / 2), ymax
-      return (x_top, y_top), (x_bottom, y_bottom)
-  else:  # Horizontal box
-      x_right, y_right = xmin, ymin + (height / 2)
-      x_left, y_left = xmax, ymin + (height / 2)
-      return (x_right, y_right), (x_left, y_left)
-
 def visualise_boundingbox(csv, img):
   path = "/content/drive/MyDrive/Coding_central/FreshTrialYolo/"
   savepath = "/content/drive/MyDrive/Coding_central/FreshTrialYolo/saved_vis"
@@ -62,7 +31,7 @@ def visualise_boundingbox(csv, img):
   input_img = cv2.imread(img_file)
   img_height, img_width = input_img.shape[:2]
 
-  wall_endpoints_list = []
+  boxes = []
 
   # Draw bounding boxes on the image
   for index, row in results_df.iterrows():
@@ -75,23 +44,21 @@ def visualise_boundingbox(csv, img):
       thickness = 2 # Thickness of bounding box
       cv2.rectangle(input_img, (x1, y1), (x2, y2), box_color, thickness)
 
-      # Get wall endpoints
-      start_point, end_point = wall_endpoints(x1, y1, x2, y2)
-      wall_endpoints_list.extend([start_point, end_point])
-    
-  # Convert to numpy array for clustering
-  wall_endpoints_np = np.array(wall_endpoints_list)
+      boxes.append((x1, y1, x2, y2))
 
   # Calculate dynamic eps value
   eps = calculate_eps((img_width, img_height), scale_factor=0.02)
 
-  # Cluster the wall endpoints
-  clustered_wall_endpoints = cluster_coordinates(wall_endpoints_np, eps)
+  # Wall endpoints clustered into corners (nodes), one wall (edge) per bounding box
+  graph = build_wall_graph(boxes, eps)
 
-    # Draw clustered wall endpoints
+  # Draw walls and clustered wall endpoints, straight from the graph's arrays
+  wall_color = (255, 0, 0)  # Color for walls
+  for (x1, y1), (x2, y2) in graph.segments().astype(int).tolist():
+      cv2.line(input_img, (x1, y1), (x2, y2), color=wall_color, thickness=2)
   endpoint_color = (0, 0, 255)  # Color for wall endpoints
-  for point in clustered_wall_endpoints:
-      cv2.circle(input_img, (int(point[0]), int(point[1])), radius=5, color=endpoint_color, thickness=2)
+  for x, y in graph.coords[graph.node_ids()].astype(int).tolist():
+      cv2.circle(input_img, (x, y), radius=5, color=endpoint_color, thickness=2)
 
   # Save the image with bounding boxes to Google Drive
   output_file = os.path.join(savepath, img)
@@ -8,9 +8,14 @@ Returns:
 """
 
 import bpy
+import json
 from math import sqrt
 import csv
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Floorplan_Detection_Phase1'))
+from FloorplanDetection import WallGraph  # Corrected graph from Floorplan_Corrector_GUI.py (json)
 
 def read_csv(csv_filename):
     """
@@ -186,6 +191,17 @@ class WallBuilder:
         start, end = self.wall_endpoints(scaled_params_x[0], scaled_params_y[0], scaled_params_x[1], scaled_params_y[1])
         self.create_wall(start, end, self.wall_height, self.wall_thickness)
 
+    def create_walls_from_graph(self, graph, scale_x = 1.0, scale_y = 1.0):
+        # One wall per graph edge, walls meeting at a corner share the exact same (clustered) endpoint
+        for (x1, y1), (x2, y2) in (graph.segments() * [scale_x, scale_y]).tolist():
+            self.create_wall((x1, y1), (x2, y2), self.wall_height, self.wall_thickness)
+
+def read_graph(json_filename):
+    # Generate the path of the json file saved by Floorplan_Corrector_GUI.py
+    source_code_directory = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(source_code_directory, json_filename), mode='r') as file:
+        return WallGraph.from_dict(json.load(file))
+
 if __name__ == "__main__":
     """
     TODOs:
@@ -225,6 +241,9 @@ if __name__ == "__main__":
     # for xmin, ymin, xmax, ymax in read_csv(csv_file_path):
     #     wall_builder.create_wall_from_bbox(xmin, ymin, xmax, ymax, scale_x = 1, scale_y = 1)
     
+    # # 2b) Or walls from the graph corrected and saved with Floorplan_Corrector_GUI.py
+    # wall_builder.create_walls_from_graph(read_graph("propall1_graph.json"), scale_x = 1, scale_y = 1)
+    
     # 3) Create a wall from bounding box
     xmin, ymin, xmax, ymax = 0, 0, 2, 3  # Replace with actual coordinates
     wall_builder.create_wall_from_bbox(xmin, ymin, xmax, ymax, scale_x = 1, scale_y = 1)
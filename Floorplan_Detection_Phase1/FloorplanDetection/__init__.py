@@ -1,12 +1,26 @@
-"""
-This library implements floorplan based detection 
-
-FloorplanDetection
-    |______1) __init__.py : Exposes variables/fns to outside library
-    |______2) const.py : Contains constant
-
-__all__ has all the variables/fns exposed outside from this library
-
-__all__ = []
-"""
-
+"""
+This library implements floorplan based detection
+
+FloorplanDetection
+    |______1) __init__.py : Exposes variables/fns to outside library
+    |______2) const.py : Contains constant
+    |______3) walls.py : Wall bounding boxes (yolov9 csv) to wall endpoints, corner clusters and a wall graph
+    |______4) graph.py : WallGraph, numpy array backed wall graph (coords, edges, CSR adjacency, stable ids)
+    |______5) spatial.py : SpatialIndex, uniform grid hash for nearest / k-nearest / radius / rectangle point queries
+    |______6) snapping.py : Vectorised snapping of wall endpoints to the axes and dominant wall angles (sweep + union-find)
+    |______7) clustering.py : cluster_points, grid hash + union-find endpoint clustering (DBSCAN min_samples=1 without sklearn)
+    |______8) incremental.py : WallClusters, add / move / remove single boxes, re-clusters only the affected corners (ChangeSet)
+
+__all__ has all the variables/fns exposed outside from this library
+
+__all__ = ['WallGraph', 'SpatialIndex', 'snap_points', 'cluster_points', 'WallClusters', 'ChangeSet', 'dominant_angles', 'calculate_eps', 'wall_endpoints', 'read_detections', 'build_wall_graph', 'detections_to_graph']
+"""
+
+from .clustering import cluster_points
+from .graph import WallGraph
+from .incremental import ChangeSet, WallClusters
+from .snapping import dominant_angles, snap_points
+from .spatial import SpatialIndex
+from .walls import build_wall_graph, calculate_eps, detections_to_graph, read_detections, wall_endpoints
+
+__all__ = ['WallGraph', 'SpatialIndex', 'snap_points', 'cluster_points', 'WallClusters', 'ChangeSet', 'dominant_angles', 'calculate_eps', 'wall_endpoints', 'read_detections', 'build_wall_graph', 'detections_to_graph']
@@ -0,0 +1,106 @@
+"""
+Grid hash clustering of 2D points, same clusters as DBSCAN(eps, min_samples=1) without scikit-learn.
+
+    points       ==> square cells of size eps, two points within eps of each other are in the same or in
+                     neighbouring cells
+    candidates   every point against the points of its own cell and of 4 of its 8 neighbour cells (the
+                     other 4 are covered from the other side), sorted by cell key + searchsorted, no loops
+    union-find   candidate pairs within eps (inclusive, like DBSCAN) are joined, clusters are the
+                     connected components
+    labels       numbered by the smallest point index of every cluster (the order DBSCAN finds them in)
+    centroids    bincount of x and y per label
+
+Linear in the number of points as long as the cells hold a bounded number of points, which is the case
+for wall endpoints (a few per corner).
+
+    labels, centroids = cluster_points(points, eps)
+"""
+
+import numpy as np
+
+_NEIGHBOURS = ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1))  # Own cell + half of the 8 neighbours
+
+
+def union_find(n, pairs):
+    """
+    Union-find over `n` items linked by (m, 2) `pairs`, vectorised: hook every pair onto the smaller root,
+    then pointer jumping, until every pair shares a root. Returns the root (smallest member) of every item.
+    """
+    roots = np.arange(n)
+    if not len(pairs):
+        return roots
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        ra, rb = roots[a], roots[b]
+        pending = ra != rb
+        if not pending.any():
+            return roots
+        low = np.minimum(ra[pending], rb[pending])
+        np.minimum.at(roots, ra[pending], low)
+        np.minimum.at(roots, rb[pending], low)
+        while True:
+            jumped = roots[roots]
+            if np.array_equal(jumped, roots):
+                break
+            roots = jumped
+
+
+def close_pairs(points, eps):
+    """
+    (m, 2) index pairs (i < j in cell order) of the points within `eps` of each other.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    if n < 2:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    # One int64 key per cell, with a margin of one cell on every side so neighbour keys never collide
+    cells = np.floor(points / eps).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * width + cells[:, 1]
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_points = points[order]
+    cell_keys, cell_start, cell_count = np.unique(sorted_keys, return_index=True, return_counts=True)
+    rank = np.arange(n)
+
+    pairs = []
+    for dx, dy in _NEIGHBOURS:
+        target = sorted_keys + dx * width + dy
+        slot = np.minimum(np.searchsorted(cell_keys, target), len(cell_keys) - 1)
+        found = cell_keys[slot] == target
+        first = np.where(found, cell_start[slot], 0)
+        last = np.where(found, cell_start[slot] + cell_count[slot], 0)
+        if (dx, dy) == (0, 0):
+            first = np.maximum(first, rank + 1)  # Own cell: only the points after this one
+        counts = np.maximum(last - first, 0)
+        total = int(counts.sum())
+        if not total:
+            continue
+        # Expand (point, candidate range) into one row per candidate
+        source = np.repeat(rank, counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidate = np.repeat(first, counts) + within
+        delta = sorted_points[source] - sorted_points[candidate]
+        close = (delta ** 2).sum(axis=1) <= eps * eps
+        pairs.append(np.column_stack([order[source[close]], order[candidate[close]]]))
+    return np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+
+def cluster_points(points, eps):
+    """
+    (labels, centroids) of (n, 2) `points`: points within `eps` of each other (transitively) share a
+    label, labels are 0..k-1 in order of the smallest point index of each cluster, centroids is (k, 2).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 2))
+    roots = union_find(len(points), close_pairs(points, eps))
+    _, labels = np.unique(roots, return_inverse=True)  # Roots are the smallest index of their cluster
+    labels = labels.reshape(-1)
+    counts = np.bincount(labels)
+    centroids = np.column_stack([np.bincount(labels, weights=points[:, 0]),
+                                 np.bincount(labels, weights=points[:, 1])]) / counts[:, None]
+    return labels, centroids
@@ -0,0 +1,318 @@
+"""
+Array backed wall graph.
+
+Corners (nodes) and walls (edges) live in numpy arrays instead of networkx dicts:
+    coords      float64 (capacity, 2)   x, y of every node slot
+    node_alive  bool    (capacity,)     slot holds a node
+    edges       int32   (capacity, 2)   node ids of every wall slot, undirected
+    edge_alive  bool    (capacity,)
+    edge keys   int64   (walls,)        sorted min id * 2^31 + max id of the live walls (+ their edge ids),
+                                        node pair lookups and dedupe are searchsorted / unique, no dicts
+
+Deleted slots go on a free list and are reused by later adds, so the ids of the other nodes/walls never
+change. Arrays grow by doubling, 100k walls between 100k corners take ~5.5MB (nbytes()). Neighbours come from a CSR adjacency (indptr,
+indices) rebuilt lazily after the edges changed, the properties return views, not copies, so vectorised
+code (snapping, clustering, drawing) runs on the arrays directly.
+
+    g = WallGraph()
+    ids = g.add_nodes([[0, 0], [10, 0], [10, 5]])
+    g.add_edges([[ids[0], ids[1]], [ids[1], ids[2]]])
+    g.move_nodes([ids[2]], [[10, 6]])
+    g.remove_nodes([ids[0]])          <=== also removes its walls
+"""
+
+import numpy as np
+
+_MIN_CAPACITY = 16
+_KEY_BASE = np.int64(2 ** 31)  # Edge key min id * _KEY_BASE + max id, node ids are int32
+
+
+class WallGraph:
+    def __init__(self, node_capacity=_MIN_CAPACITY, edge_capacity=_MIN_CAPACITY):
+        self._coords = np.zeros((max(node_capacity, 1), 2), dtype=np.float64)
+        self._node_alive = np.zeros(len(self._coords), dtype=bool)
+        self._node_end = 0  # Slots >= _node_end were never used
+        self._free_nodes = []
+        self._edges = np.zeros((max(edge_capacity, 1), 2), dtype=np.int32)
+        self._edge_alive = np.zeros(len(self._edges), dtype=bool)
+        self._degree = np.zeros(len(self._coords), dtype=np.int32)  # Walls per node slot
+        self._edge_end = 0
+        self._free_edges = []
+        self._edge_keys = np.zeros(0, dtype=np.int64)  # Sorted keys of the live walls, for lookup by node pair
+        self._edge_key_ids = np.zeros(0, dtype=np.int64)  # Edge id of every key
+        self._csr = None
+
+    ########## Views ##########
+    @property
+    def coords(self):
+        """
+        (node slots, 2) view of the coordinates, dead slots included (see node_alive). Writable, nodes can
+        be moved in place (edges and adjacency don't depend on coordinates).
+        """
+        return self._coords[:self._node_end]
+
+    @property
+    def node_alive(self):
+        view = self._node_alive[:self._node_end]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def edges(self):
+        """
+        (edge slots, 2) read only view of the edge array, dead slots included (see edge_alive).
+        """
+        view = self._edges[:self._edge_end]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def edge_alive(self):
+        view = self._edge_alive[:self._edge_end]
+        view.flags.writeable = False
+        return view
+
+    def node_ids(self):
+        return np.flatnonzero(self._node_alive[:self._node_end])
+
+    def edge_ids(self):
+        return np.flatnonzero(self._edge_alive[:self._edge_end])
+
+    def live_edges(self):
+        """
+        (walls, 2) node ids of the live walls.
+        """
+        return self._edges[self.edge_ids()]
+
+    def segments(self):
+        """
+        (walls, 2, 2) start/end coordinates of the live walls, e.g. for drawing.
+        """
+        return self._coords[self.live_edges()]
+
+    @property
+    def n_nodes(self):
+        return self._node_end - len(self._free_nodes)
+
+    @property
+    def n_edges(self):
+        return self._edge_end - len(self._free_edges)
+
+    def __len__(self):
+        return self.n_nodes
+
+    def has_node(self, node):
+        return 0 <= node < self._node_end and bool(self._node_alive[node])
+
+    def has_edge(self, a, b):
+        return bool(self._find_edges(np.array([[a, b]], dtype=np.int64))[0] >= 0)
+
+    def coord(self, node):
+        if not self.has_node(node):
+            raise KeyError(f'No node {node}')
+        return float(self._coords[node, 0]), float(self._coords[node, 1])
+
+    def nbytes(self):
+        return (self._coords.nbytes + self._node_alive.nbytes + self._degree.nbytes + self._edges.nbytes
+                + self._edge_alive.nbytes + self._edge_keys.nbytes + self._edge_key_ids.nbytes)
+
+    ########## Storage ##########
+    @staticmethod
+    def _grown(array, needed):
+        capacity = len(array)
+        if needed <= capacity:
+            return array
+        while capacity < needed:
+            capacity *= 2
+        grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _take_slots(self, count, free, end, kind):
+        """
+        `count` slot ids, reused ones from `free` first (lowest id first, so ids are deterministic).
+        """
+        reused = []
+        if free:
+            free.sort(reverse=True)
+            while free and len(reused) < count:
+                reused.append(free.pop())
+        fresh = np.arange(end, end + count - len(reused), dtype=np.int64)
+        if kind == 'node':
+            self._node_end = end + len(fresh)
+            self._coords = self._grown(self._coords, self._node_end)
+            self._node_alive = self._grown(self._node_alive, self._node_end)
+            self._degree = self._grown(self._degree, self._node_end)
+        else:
+            self._edge_end = end + len(fresh)
+            self._edges = self._grown(self._edges, self._edge_end)
+            self._edge_alive = self._grown(self._edge_alive, self._edge_end)
+        return np.concatenate([np.array(reused, dtype=np.int64), fresh])
+
+    ########## Nodes ##########
+    def add_nodes(self, coords):
+        """
+        Add nodes at (n, 2) `coords`, returns their ids.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        ids = self._take_slots(len(coords), self._free_nodes, self._node_end, 'node')
+        self._coords[ids] = coords
+        self._node_alive[ids] = True
+        return ids
+
+    def add_node(self, x, y):
+        return int(self.add_nodes([[x, y]])[0])
+
+    def move_nodes(self, ids, coords):
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        self._check_nodes(ids)
+        self._coords[ids] = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+    def move_node(self, node, x, y):
+        self.move_nodes([node], [[x, y]])
+
+    def remove_nodes(self, ids):
+        """
+        Remove nodes and every wall touching them. Returns the ids of the removed walls.
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64).reshape(-1))
+        self._check_nodes(ids)
+        touching = np.zeros(0, dtype=np.int64)
+        if self._degree[ids].any():  # Isolated nodes are removed without scanning the walls
+            live = self.edge_ids()
+            touching = live[np.isin(self._edges[live], ids).any(axis=1)]
+            self._drop_edges(touching)
+        self._node_alive[ids] = False
+        self._free_nodes.extend(ids.tolist())
+        return touching
+
+    def remove_node(self, node):
+        return self.remove_nodes([node])
+
+    def _check_nodes(self, ids):
+        if len(ids) and (ids.min() < 0 or ids.max() >= self._node_end or not self._node_alive[ids].all()):
+            raise KeyError(f'Unknown node in {ids.tolist()}')
+
+    ########## Edges ##########
+    @staticmethod
+    def _keys(pairs):
+        return np.minimum(pairs[:, 0], pairs[:, 1]) * _KEY_BASE + np.maximum(pairs[:, 0], pairs[:, 1])
+
+    def _find_edges(self, pairs):
+        """
+        Edge id of every (n, 2) node id pair (either direction), -1 where there is no wall.
+        """
+        keys = self._keys(pairs)
+        if not len(self._edge_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self._edge_keys, keys), len(self._edge_keys) - 1)
+        return np.where(self._edge_keys[slots] == keys, self._edge_key_ids[slots], -1)
+
+    def add_edges(self, pairs):
+        """
+        Add walls between (n, 2) node id `pairs`. Pairs that already exist (either direction) and self
+        loops are skipped. Returns the ids of the walls, existing ones included (-1 for self loops).
+        """
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        self._check_nodes(pairs.reshape(-1))
+        result = self._find_edges(pairs)
+        pending = (result < 0) & (pairs[:, 0] != pairs[:, 1])
+        if pending.any():
+            # New keys once each, in order of first appearance (ids are handed out in that order)
+            keys, first, rows = np.unique(self._keys(pairs[pending]), return_index=True, return_inverse=True)
+            order = np.argsort(first, kind='stable')
+            ids = np.empty(len(keys), dtype=np.int64)
+            ids[order] = self._take_slots(len(keys), self._free_edges, self._edge_end, 'edge')
+            self._edges[ids] = np.column_stack([keys // _KEY_BASE, keys % _KEY_BASE])
+            self._edge_alive[ids] = True
+            np.add.at(self._degree, self._edges[ids].reshape(-1), 1)
+            positions = np.searchsorted(self._edge_keys, keys)
+            self._edge_keys = np.insert(self._edge_keys, positions, keys)
+            self._edge_key_ids = np.insert(self._edge_key_ids, positions, ids)
+            result[pending] = ids[rows.reshape(-1)]
+            self._csr = None
+        return result
+
+    def add_edge(self, a, b):
+        return int(self.add_edges([[a, b]])[0])
+
+    def remove_edges(self, pairs):
+        """
+        Remove the walls between (n, 2) node id `pairs`, pairs without a wall are ignored.
+        """
+        ids = self._find_edges(np.asarray(pairs, dtype=np.int64).reshape(-1, 2))
+        self._drop_edges(np.unique(ids[ids >= 0]))
+
+    def remove_edge(self, a, b):
+        self.remove_edges([[a, b]])
+
+    def _drop_edges(self, ids):
+        if not len(ids):
+            return
+        positions = np.searchsorted(self._edge_keys, self._keys(self._edges[ids].astype(np.int64)))
+        self._edge_keys = np.delete(self._edge_keys, positions)
+        self._edge_key_ids = np.delete(self._edge_key_ids, positions)
+        self._edge_alive[ids] = False
+        np.add.at(self._degree, self._edges[ids].reshape(-1), -1)
+        self._free_edges.extend(np.asarray(ids).tolist())
+        self._csr = None
+
+    ########## Adjacency ##########
+    def csr(self):
+        """
+        (indptr, indices): the neighbours of node n are indices[indptr[n]:indptr[n + 1]].
+        """
+        if self._csr is None:
+            live = self.live_edges().astype(np.int64)
+            sources = np.concatenate([live[:, 0], live[:, 1]])
+            targets = np.concatenate([live[:, 1], live[:, 0]])
+            order = np.argsort(sources, kind='stable')
+            counts = np.bincount(sources, minlength=self._node_end)
+            indptr = np.zeros(self._node_end + 1, dtype=np.int64)
+            np.cumsum(counts, out=indptr[1:])
+            self._csr = (indptr, targets[order].astype(np.int32))
+        return self._csr
+
+    def neighbors(self, node):
+        indptr, indices = self.csr()
+        return indices[indptr[node]:indptr[node + 1]]
+
+    def degree(self):
+        """
+        Degree of every node slot (0 for dead slots).
+        """
+        indptr = self.csr()[0]
+        return np.diff(indptr)
+
+    ########## Conversion ##########
+    def clear(self):
+        self.__init__()
+
+    def to_dict(self):
+        """
+        The json layout the Tk editor saves: {'nodes': {id: {'coord': [x, y]}}, 'edges': [[id, id]]}
+        """
+        return {
+            'nodes': {int(node): {'coord': [float(x), float(y)]}
+                      for node, (x, y) in zip(self.node_ids().tolist(), self._coords[self.node_ids()].tolist())},
+            'edges': sorted(self.live_edges().tolist()),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Inverse of to_dict(), node ids of the json are kept (gaps become free slots).
+        """
+        nodes = {int(node): attrs['coord'] for node, attrs in data.get('nodes', {}).items()}
+        graph = cls(node_capacity=max(nodes, default=0) + 1, edge_capacity=len(data.get('edges', [])))
+        if nodes:
+            end = max(nodes) + 1
+            graph.add_nodes(np.zeros((end, 2)))
+            ids = np.array(list(nodes), dtype=np.int64)
+            graph._coords[ids] = np.array(list(nodes.values()), dtype=np.float64)
+            dead = np.setdiff1d(np.arange(end), ids)
+            graph._node_alive[dead] = False
+            graph._free_nodes.extend(dead.tolist())
+        if data.get('edges'):
+            graph.add_edges(data['edges'])
+        return graph
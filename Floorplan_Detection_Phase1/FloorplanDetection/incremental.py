@@ -0,0 +1,295 @@
+"""
+Incremental wall clustering: add, move or remove one bounding box without re-clustering the whole plan.
+
+WallClusters keeps the state build_wall_graph throws away:
+    endpoints   SpatialIndex of the wall endpoints, keyed (box id, 0 | 1)
+    clusters    node id -> endpoint keys, every cluster is one WallGraph node (at its centroid)
+    walls       box id -> node pair, with a count per pair (two boxes can make the same wall)
+
+An edit only re-clusters the endpoints of the clusters it touches (the clusters of the box's old
+endpoints and the clusters within eps of its new ones), with radius queries on the spatial index, and only
+re-links the boxes with an endpoint in them. The result is the same graph as clustering from scratch
+(same clusters as DBSCAN min_samples=1), node ids of untouched corners never change, and every edit
+returns a ChangeSet of the nodes and walls it added, moved and removed, e.g. to redraw only those.
+
+    clusters = WallClusters.from_boxes(boxes, eps)
+    box_id, changes = clusters.add_box((10, 10, 20, 200))
+    changes = clusters.move_box(box_id, (12, 10, 22, 200))
+    changes = clusters.remove_box(box_id)
+    changes = clusters.sync(new_boxes)        <=== diff against a new detection set (e.g. re-read csv)
+    clusters.graph                            <=== WallGraph
+"""
+
+from collections import Counter
+
+import numpy as np
+
+from .clustering import cluster_points
+from .graph import WallGraph
+from .spatial import SpatialIndex
+from .walls import wall_endpoints
+
+
+class ChangeSet:
+    """
+    Nodes and walls changed by one or more edits. Nodes are ids of the WallGraph, walls (min id, max id).
+    """
+
+    def __init__(self):
+        self.nodes_added = set()
+        self.nodes_moved = set()
+        self.nodes_removed = set()
+        self.edges_added = set()
+        self.edges_removed = set()
+
+    def __bool__(self):
+        return bool(self.nodes_added or self.nodes_moved or self.nodes_removed or self.edges_added
+                    or self.edges_removed)
+
+    def update(self, other):
+        """
+        Fold a later change set into this one (added then removed cancels out, etc.).
+        """
+        for node in other.nodes_removed:
+            if node in self.nodes_added:
+                self.nodes_added.discard(node)
+            else:
+                self.nodes_moved.discard(node)
+                self.nodes_removed.add(node)
+        for node in other.nodes_added:
+            if node in self.nodes_removed:
+                self.nodes_removed.discard(node)  # Slot reused, same id at a new place
+                self.nodes_moved.add(node)
+            else:
+                self.nodes_added.add(node)
+        self.nodes_moved |= other.nodes_moved - self.nodes_added
+        for edge in other.edges_removed:
+            if edge in self.edges_added:
+                self.edges_added.discard(edge)
+            else:
+                self.edges_removed.add(edge)
+        for edge in other.edges_added:
+            if edge in self.edges_removed:
+                self.edges_removed.discard(edge)
+            else:
+                self.edges_added.add(edge)
+        return self
+
+    def to_dict(self):
+        return {
+            'nodesAdded': sorted(self.nodes_added),
+            'nodesMoved': sorted(self.nodes_moved),
+            'nodesRemoved': sorted(self.nodes_removed),
+            'edgesAdded': sorted(list(edge) for edge in self.edges_added),
+            'edgesRemoved': sorted(list(edge) for edge in self.edges_removed),
+        }
+
+
+class WallClusters:
+    def __init__(self, eps, endpoints=wall_endpoints):
+        self.eps = float(eps)
+        self.endpoints = endpoints  # (xmin, ymin, xmax, ymax) -> the 2 endpoints of the wall in the box
+        self.graph = WallGraph()
+        self.boxes = {}  # box id -> (xmin, ymin, xmax, ymax)
+        self._index = SpatialIndex(self.eps)
+        self._node_of = {}  # endpoint key -> node id
+        self._members = {}  # node id -> {endpoint key}
+        self._wall_of = {}  # box id -> (min node, max node), None when both ends are in one cluster
+        self._wall_count = Counter()  # (min node, max node) -> boxes making that wall
+        self._next_box = 0
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def from_boxes(cls, boxes, eps, endpoints=wall_endpoints):
+        """
+        Cluster all boxes in one vectorised pass (cluster_points), box ids are their positions in `boxes`.
+        Node ids match build_wall_graph().
+        """
+        clusters = cls(eps, endpoints)
+        boxes = [tuple(float(value) for value in box) for box in boxes]
+        points = np.array([point for box in boxes for point in endpoints(*box)], dtype=float).reshape(-1, 2)
+        labels, centres = cluster_points(points, eps)
+        clusters.graph.add_nodes(centres)
+        keys = [(box_id, end) for box_id in range(len(boxes)) for end in (0, 1)]
+        clusters._index.insert_many(keys, points.tolist())
+        labels = labels.tolist()
+        for key, node in zip(keys, labels):
+            clusters._node_of[key] = node
+            clusters._members.setdefault(node, set()).add(key)
+        for box_id, box in enumerate(boxes):
+            clusters.boxes[box_id] = box
+            a, b = labels[2 * box_id], labels[2 * box_id + 1]
+            pair = (min(a, b), max(a, b)) if a != b else None
+            clusters._wall_of[box_id] = pair
+            if pair:
+                clusters._wall_count[pair] += 1
+        clusters.graph.add_edges(list(clusters._wall_count))  # In order of first appearance, like build_wall_graph
+        clusters._next_box = len(boxes)
+        return clusters
+
+    ########## Edits ##########
+    def add_box(self, box, box_id=None):
+        """
+        Add a detection, returns (box id, ChangeSet).
+        """
+        if box_id is None:
+            box_id = self._next_box
+        elif box_id in self.boxes:
+            raise KeyError(f'Box {box_id} already exists')
+        if isinstance(box_id, int):
+            self._next_box = max(self._next_box, box_id + 1)
+        return box_id, self._edit(box_id, tuple(float(value) for value in box))
+
+    def move_box(self, box_id, box):
+        if box_id not in self.boxes:
+            raise KeyError(f'No box {box_id}')
+        return self._edit(box_id, tuple(float(value) for value in box))
+
+    def remove_box(self, box_id):
+        if box_id not in self.boxes:
+            raise KeyError(f'No box {box_id}')
+        return self._edit(box_id, None)
+
+    def sync(self, boxes):
+        """
+        Make the detections equal to `boxes` with the fewest edits (boxes present in both are kept), e.g.
+        after the csv was re-read. Returns the combined ChangeSet.
+        """
+        wanted = Counter(tuple(float(value) for value in box) for box in boxes)
+        changes = ChangeSet()
+        for box_id, box in list(self.boxes.items()):
+            if wanted[box] > 0:
+                wanted[box] -= 1
+            else:
+                changes.update(self.remove_box(box_id))
+        for box, count in wanted.items():
+            for _ in range(count):
+                changes.update(self.add_box(box)[1])
+        return changes
+
+    def _edit(self, box_id, box):
+        """
+        Replace the endpoints of `box_id` (None removes the box) and re-cluster the clusters around the old
+        and new endpoints.
+        """
+        changes = ChangeSet()
+        affected = set()
+        if box_id in self.boxes:
+            for end in (0, 1):
+                key = (box_id, end)
+                affected.add(self._node_of.pop(key))
+                self._index.remove(key)
+            for node in affected:
+                self._members[node] -= {(box_id, 0), (box_id, 1)}
+            del self.boxes[box_id]
+        new_keys = []
+        if box is not None:
+            self.boxes[box_id] = box
+            points = self.endpoints(*box)
+            for point in points:  # Clusters within eps of the new endpoints, before they are indexed
+                for neighbour in self._index.within_radius(point[0], point[1], self.eps):
+                    affected.add(self._node_of[neighbour])
+            for end, point in enumerate(points):
+                self._index.insert((box_id, end), *point)
+                new_keys.append((box_id, end))
+        self._recluster(box_id, affected, new_keys, changes)
+        return changes
+
+    ########## Re-clustering ##########
+    def _recluster(self, edited, affected, new_keys, changes):
+        keys = set(new_keys)
+        for node in affected:
+            keys |= self._members[node]
+        boxes = {key[0] for key in keys} | {edited}  # Every box with an end in an affected cluster
+        for box_id in boxes:
+            self._unlink(box_id, changes)
+
+        # Connected components of the affected endpoints, only radius queries around them
+        components, seen = [], set()
+        for start in sorted(keys):
+            if start in seen:
+                continue
+            component, stack = [], [start]
+            seen.add(start)
+            while stack:
+                key = stack.pop()
+                component.append(key)
+                for neighbour in self._index.within_radius(*self._index.coord(key), self.eps):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        stack.append(neighbour)
+            components.append(component)
+
+        # Old nodes keep the component holding most of their endpoints, then the left over old nodes go to
+        # components without one (e.g. a moved box), only what is still left is removed / added
+        old_coords = {node: self.graph.coord(node) for node in affected}
+        reused = {}
+        for index, component in enumerate(components):
+            votes = Counter(self._node_of[key] for key in component if key in self._node_of)
+            for node, _ in sorted(votes.items(), key=lambda item: (-item[1], item[0])):
+                if node not in reused.values():
+                    reused[index] = node
+                    break
+        spare = sorted(set(affected) - set(reused.values()))
+        for index in range(len(components)):
+            if index not in reused and spare:
+                reused[index] = spare.pop(0)
+        removed = sorted(set(affected) - set(reused.values()))
+        if removed:
+            self.graph.remove_nodes(removed)
+        for node in removed:
+            del self._members[node]
+            changes.nodes_removed.add(node)
+
+        for index, component in enumerate(components):
+            centre = np.mean([self._index.coord(key) for key in component], axis=0)
+            node = reused.get(index)
+            if node is None:
+                node = self.graph.add_node(*centre)
+                if node in changes.nodes_removed:
+                    changes.nodes_removed.discard(node)  # Freed slot reused at once
+                    changes.nodes_moved.add(node)
+                else:
+                    changes.nodes_added.add(node)
+            else:
+                self.graph.move_node(node, *centre)
+                if tuple(self.graph.coord(node)) != old_coords[node]:
+                    changes.nodes_moved.add(node)
+            self._members[node] = set(component)
+            for key in component:
+                self._node_of[key] = node
+
+        for box_id in boxes:
+            if box_id in self.boxes:
+                self._link(box_id, changes)
+
+    def _unlink(self, box_id, changes):
+        pair = self._wall_of.pop(box_id, None)
+        if pair is None:
+            return
+        self._wall_count[pair] -= 1
+        if not self._wall_count[pair]:
+            del self._wall_count[pair]
+            if self.graph.has_edge(*pair):
+                self.graph.remove_edge(*pair)
+            if pair in changes.edges_added:
+                changes.edges_added.discard(pair)
+            else:
+                changes.edges_removed.add(pair)
+
+    def _link(self, box_id, changes):
+        a, b = self._node_of[(box_id, 0)], self._node_of[(box_id, 1)]
+        if a == b:
+            self._wall_of[box_id] = None  # Wall shorter than eps, both ends in one corner
+            return
+        pair = (min(a, b), max(a, b))
+        self._wall_of[box_id] = pair
+        self._wall_count[pair] += 1
+        if self._wall_count[pair] == 1:
+            self.graph.add_edge(*pair)
+            if pair in changes.edges_removed:
+                changes.edges_removed.discard(pair)
+            else:
+                changes.edges_added.add(pair)
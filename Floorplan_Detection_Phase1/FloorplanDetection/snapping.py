@@ -0,0 +1,186 @@
+"""
+Vectorised endpoint snapping (straightening walls), O(n log n) in the number of endpoints.
+
+For every snap direction (a wall angle, 0 = horizontal, 90 = vertical):
+    offsets     distance of every endpoint from a line through the origin along the direction
+                (y for 0 degrees, x for 90 degrees)
+    sweep       endpoints sorted by offset, runs of neighbours closer than `threshold` form groups. A run
+                as wide as the threshold is cut at its gaps of threshold / 2 and more (evenly spaced walls
+                stay apart), what is still too wide is split from its start, no group spans the threshold
+    walls       groups holding the two ends of a wall within `tolerance` degrees of the direction are merged
+                (union-find), unless that would move a point further than the threshold
+    means       every group gets its mean offset (bincount), so walls become exactly parallel to the
+                direction and nearby walls collinear, no point moves further than the threshold along the normal
+
+The axes snap every endpoint (x first, then y), other dominant wall angles (length weighted, see
+dominant_angles) only the endpoints of walls along them. The only loop splits runs that are still too
+wide, group by group, the result only depends on the coordinates, 100k endpoints snap in well under a second.
+
+    coords = snap_points(coords, threshold=20)                       <=== axes only
+    coords = snap_points(coords, threshold=20, edges=edges)          <=== axes + dominant wall angles
+"""
+
+import numpy as np
+
+from .clustering import union_find
+
+AXES = (90.0, 0.0)  # Vertical walls (snap x) first, then horizontal ones (snap y)
+
+
+def _wall_angles(coords, edges):
+    """
+    Angle (degrees, 0..180) and length of every wall.
+    """
+    vectors = coords[edges[:, 1]] - coords[edges[:, 0]]
+    angles = np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0])) % 180.0
+    return angles, np.hypot(vectors[:, 0], vectors[:, 1])
+
+
+def _angle_difference(angles, angle):
+    difference = np.abs(angles - angle) % 180.0
+    return np.minimum(difference, 180.0 - difference)
+
+
+def dominant_angles(coords, edges, tolerance=5.0, min_share=0.1):
+    """
+    Wall angles (degrees, 0..180) holding at least `min_share` of the total wall length within
+    `tolerance` degrees, strongest first. Angles closer than 2 * `tolerance` to a stronger one are merged
+    into it.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if not len(edges):
+        return []
+    angles, lengths = _wall_angles(coords, edges)
+    if lengths.sum() == 0:
+        return []
+
+    # Length weighted histogram with 1 degree bins, smoothed circularly over +-tolerance
+    histogram = np.bincount(np.round(angles).astype(np.int64) % 180, weights=lengths, minlength=180)
+    width = int(np.ceil(tolerance))
+    window = np.arange(-width, width + 1)
+    smoothed = histogram[(np.arange(180)[:, None] + window) % 180].sum(axis=1)
+
+    found = []
+    share = smoothed / lengths.sum()
+    for angle in np.argsort(-smoothed, kind='stable'):
+        if share[angle] < min_share:
+            break
+        if all(_angle_difference(float(angle), other) > 2 * tolerance for other in found):
+            # Refine the bin to the length weighted mean angle of the walls around it
+            near = _angle_difference(np.round(angles), float(angle)) <= width  # Same walls as the smoothed bin
+            offsets = (angles[near] - angle + 90.0) % 180.0 - 90.0
+            found.append(float((angle + np.average(offsets, weights=lengths[near])) % 180.0))
+    return found
+
+
+def _sweep_groups(offsets, threshold):
+    """
+    Group labels (0..k-1) of sorted `offsets`, see the module docstring.
+    """
+    n = len(offsets)
+    gaps = np.diff(offsets)
+    cut = gaps >= threshold
+    starts, ends = _runs(cut, n)
+    wide = offsets[ends - 1] - offsets[starts] >= threshold
+    if wide.any():
+        # A chain of evenly spaced points is no cluster, cut wide runs at their big gaps first
+        cut |= np.repeat(wide, ends - starts)[:-1] & (gaps >= threshold / 2)
+        starts, ends = _runs(cut, n)
+        wide = offsets[ends - 1] - offsets[starts] >= threshold
+        for start, end in zip(starts[wide].tolist(), ends[wide].tolist()):  # Still too wide, split from the start
+            position = start
+            while offsets[end - 1] - offsets[position] >= threshold:
+                position += int(np.searchsorted(offsets[position:end], offsets[position] + threshold))
+                cut[position - 1] = True
+    return np.concatenate([[0], np.cumsum(cut)])
+
+
+def _runs(cut, n):
+    """
+    (starts, ends) of the runs of sorted points between the `cut` gaps.
+    """
+    starts = np.flatnonzero(np.concatenate([[True], cut]))
+    return starts, np.append(starts[1:], n)
+
+
+def _group_means(labels, offsets):
+    counts = np.bincount(labels, minlength=len(offsets))
+    return np.bincount(labels, weights=offsets, minlength=len(offsets)) / np.maximum(counts, 1)
+
+
+def snap_direction(coords, angle, threshold, edges=None, tolerance=5.0, nodes=None):
+    """
+    Snap the offsets perpendicular to `angle` (degrees) of `nodes` (default: all rows of `coords`), see the
+    module docstring. Returns a new (n, 2) array, rows outside `nodes` are unchanged.
+    """
+    coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+    nodes = np.arange(len(coords)) if nodes is None else np.asarray(nodes, dtype=np.int64).reshape(-1)
+    if not len(nodes):
+        return coords
+    theta = np.radians(angle)
+    normal = np.array([-np.sin(theta), np.cos(theta)])
+    offsets = coords[nodes] @ normal
+
+    # Sweep: groups of neighbours in offset order, none as wide as the threshold
+    order = np.argsort(offsets, kind='stable')
+    groups = np.empty(len(nodes), dtype=np.int64)
+    groups[order] = _sweep_groups(offsets[order], threshold)
+    labels = groups
+
+    # Walls along the direction: merge the groups of their two ends
+    if edges is not None and len(edges):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        position = np.full(len(coords), -1, dtype=np.int64)
+        position[nodes] = np.arange(len(nodes))
+        local = position[edges]
+        local = local[(local >= 0).all(axis=1)]
+        if len(local):
+            angles, lengths = _wall_angles(coords[nodes], local)
+            aligned = (_angle_difference(angles, angle) <= tolerance) & (lengths > 0)
+            count = int(groups.max()) + 1
+            roots = union_find(count, groups[local[aligned]])
+            labels = roots[groups]
+            # Merged groups that would move a point further than the threshold keep their sweep groups
+            shift = np.abs(_group_means(labels, offsets)[labels] - offsets)
+            worst = np.zeros(count)
+            np.maximum.at(worst, labels, shift)
+            labels = np.where(worst[labels] > threshold, groups, labels)
+
+    coords[nodes] += (_group_means(labels, offsets)[labels] - offsets)[:, None] * normal
+    return coords
+
+
+def snap_points(coords, threshold, edges=None, tolerance=5.0, angles=None, nodes=None):
+    """
+    Snap (n, 2) `coords` to the axes and, when the walls (`edges`, node index pairs) are given, to their
+    dominant angles. `angles` overrides the dominant angles (off-axis angles need `edges`), `nodes` limits
+    snapping to those rows (e.g. the live slots of a WallGraph). Returns a new array.
+    """
+    coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+    if edges is not None:
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if angles is None:
+        angles = dominant_angles(coords, edges, tolerance) if edges is not None else []
+    extra = [angle for angle in angles if all(_angle_difference(angle, axis) > tolerance for axis in AXES)]
+    if extra and edges is None:
+        raise ValueError('Snapping to off-axis angles needs the walls (edges)')
+
+    for angle in AXES:
+        coords = snap_direction(coords, angle, threshold, edges, tolerance, nodes)
+    if extra:
+        # Off-axis directions only move the ends of the walls along them. Snapping one direction moves
+        # points perpendicular to it, so only the walls it moved need their angle measured again.
+        wall_angles, _ = _wall_angles(coords, edges)
+        for angle in extra:
+            subset = np.unique(edges[_angle_difference(wall_angles, angle) <= tolerance])
+            if nodes is not None:
+                subset = np.intersect1d(subset, nodes)
+            before = coords[subset]
+            coords = snap_direction(coords, angle, threshold, edges, tolerance, subset)
+            moved = np.zeros(len(coords), dtype=bool)
+            moved[subset[(coords[subset] != before).any(axis=1)]] = True
+            touched = np.flatnonzero(moved[edges].any(axis=1))
+            if len(touched):
+                wall_angles[touched] = _wall_angles(coords, edges[touched])[0]
+    return coords
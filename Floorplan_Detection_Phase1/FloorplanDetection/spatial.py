@@ -0,0 +1,239 @@
+"""
+Uniform grid hash over 2D points, for nearest point lookups without scanning every point.
+
+Points (id -> x, y) are bucketed into square cells of `cell_size`, a query only visits the cells around
+the query point, so clicks, drags and graph building cost O(points per cell) instead of O(points). Pick
+`cell_size` around the typical query radius (e.g. the clustering eps), every cell then holds a handful of
+points.
+
+    index = SpatialIndex(cell_size=30)
+    index.insert(0, 10, 20)
+    index.insert_many(graph.node_ids(), graph.coords[graph.node_ids()])
+    index.nearest(12, 18)             <=== (id, distance) or None
+    index.k_nearest(12, 18, 3)        <=== [(id, distance)] closest first
+    index.within_radius(12, 18, 30)   <=== [id]
+    index.within_rect(0, 0, 100, 50)  <=== [id]
+    index.move(0, 11, 21)
+    index.remove(0)
+"""
+
+import heapq
+import math
+
+
+class SpatialIndex:
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError('cell_size must be > 0')
+        self.cell_size = float(cell_size)
+        self._cells = {}  # (cx, cy) -> {id: (x, y)}
+        self._points = {}  # id -> (x, y)
+        self._bounds = None  # [min cx, min cy, max cx, max cy] of all cells ever used, bounds the ring search
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, point_id):
+        return point_id in self._points
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    ########## Updates ##########
+    def insert(self, point_id, x, y):
+        """
+        Add (or move) `point_id` to x, y.
+        """
+        if point_id in self._points:
+            self.remove(point_id)
+        x, y = float(x), float(y)
+        cell = self._cell(x, y)
+        self._cells.setdefault(cell, {})[point_id] = (x, y)
+        self._points[point_id] = (x, y)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), min(bounds[1], cell[1])
+            bounds[2], bounds[3] = max(bounds[2], cell[0]), max(bounds[3], cell[1])
+
+    def insert_many(self, ids, coords):
+        """
+        insert() for many points, the bounds are updated once at the end.
+        """
+        cells, points, size = self._cells, self._points, self.cell_size
+        used = []
+        for point_id, (x, y) in zip(ids, coords):
+            if point_id in points:
+                self.remove(point_id)
+            x, y = float(x), float(y)
+            cell = (math.floor(x / size), math.floor(y / size))
+            cells.setdefault(cell, {})[point_id] = (x, y)
+            points[point_id] = (x, y)
+            used.append(cell)
+        if used:
+            xs, ys = [cell[0] for cell in used], [cell[1] for cell in used]
+            if self._bounds is not None:
+                xs += self._bounds[0::2]
+                ys += self._bounds[1::2]
+            self._bounds = [min(xs), min(ys), max(xs), max(ys)]
+
+    def move(self, point_id, x, y):
+        if point_id not in self._points:
+            raise KeyError(f'No point {point_id}')
+        self.insert(point_id, x, y)
+
+    def remove(self, point_id):
+        x, y = self._points.pop(point_id)
+        cell = self._cell(x, y)
+        bucket = self._cells[cell]
+        del bucket[point_id]
+        if not bucket:
+            del self._cells[cell]
+
+    def discard(self, point_id):
+        if point_id in self._points:
+            self.remove(point_id)
+
+    def clear(self):
+        self._cells.clear()
+        self._points.clear()
+        self._bounds = None
+
+    def coord(self, point_id):
+        return self._points[point_id]
+
+    ########## Queries ##########
+    def _ring(self, cx, cy, r):
+        """
+        Occupied cells at Chebyshev distance `r` (in cells) from cx, cy.
+        """
+        cells = self._cells
+        if r == 0:
+            if (cx, cy) in cells:
+                yield cells[(cx, cy)]
+            return
+        for x in range(cx - r, cx + r + 1):
+            for cell in ((x, cy - r), (x, cy + r)):
+                if cell in cells:
+                    yield cells[cell]
+        for y in range(cy - r + 1, cy + r):
+            for cell in ((cx - r, y), (cx + r, y)):
+                if cell in cells:
+                    yield cells[cell]
+
+    def _ring_range(self, cx, cy):
+        """
+        First and last ring around cx, cy that can hold occupied cells.
+        """
+        min_x, min_y, max_x, max_y = self._bounds
+        first = max(min_x - cx, cx - max_x, min_y - cy, cy - max_y, 0)
+        last = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+        return first, last
+
+    def k_nearest(self, x, y, k, max_distance=None):
+        """
+        Up to `k` (id, distance) pairs closest to x, y, closest first (ties by id). Cells are visited ring
+        by ring, the search stops once no unvisited ring can hold anything closer than the k-th hit.
+        """
+        if k <= 0 or not self._points:
+            return []
+        cx, cy = self._cell(x, y)
+        heap = []  # Max heap (negated) of the k best so far
+        first_ring, last_ring = self._ring_range(cx, cy)
+        if max_distance is not None:
+            last_ring = min(last_ring, int(math.ceil(max_distance / self.cell_size)) + 1)
+        for r in range(first_ring, last_ring + 1):
+            # Anything in ring r or further is at least r - 1 cells away from the query point
+            if len(heap) == k and -heap[0][0] <= (r - 1) * self.cell_size:
+                break
+            scan_all = 8 * r > len(self._cells)  # Ring has more cells than are occupied (sparse points, far query)
+            if scan_all:
+                heap = []
+            for bucket in self._cells.values() if scan_all else self._ring(cx, cy, r):
+                for point_id, (px, py) in bucket.items():
+                    distance = math.hypot(px - x, py - y)
+                    if max_distance is not None and distance > max_distance:
+                        continue
+                    item = (-distance, _Reverse(point_id))
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+            if scan_all:
+                break
+        return [(entry.value, -distance) for distance, entry in sorted(heap, reverse=True)]
+
+    def nearest(self, x, y, max_distance=None):
+        """
+        (id, distance) of the point closest to x, y, None if the index is empty (or nothing is within
+        `max_distance`).
+        """
+        hits = self.k_nearest(x, y, 1, max_distance)
+        return hits[0] if hits else None
+
+    def within_radius(self, x, y, radius):
+        """
+        Ids of the points within `radius` of x, y (inclusive), sorted by id.
+        """
+        hits = []
+        for bucket in self._cells_in_rect(x - radius, y - radius, x + radius, y + radius):
+            hits.extend(point_id for point_id, (px, py) in bucket.items()
+                        if (px - x) ** 2 + (py - y) ** 2 <= radius * radius)
+        return sorted(hits)
+
+    def within_rect(self, xmin, ymin, xmax, ymax):
+        """
+        Ids of the points inside the rectangle (edges included), sorted by id.
+        """
+        xmin, xmax = min(xmin, xmax), max(xmin, xmax)
+        ymin, ymax = min(ymin, ymax), max(ymin, ymax)
+        hits = []
+        for bucket in self._cells_in_rect(xmin, ymin, xmax, ymax):
+            hits.extend(point_id for point_id, (px, py) in bucket.items()
+                        if xmin <= px <= xmax and ymin <= py <= ymax)
+        return sorted(hits)
+
+    def _cells_in_rect(self, xmin, ymin, xmax, ymax):
+        if not self._points:
+            return
+        (cx0, cy0), (cx1, cy1) = self._cell(xmin, ymin), self._cell(xmax, ymax)
+        min_x, min_y, max_x, max_y = self._bounds
+        cx0, cy0, cx1, cy1 = max(cx0, min_x), max(cy0, min_y), min(cx1, max_x), min(cy1, max_y)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # Query larger than the occupied area, walk the occupied cells instead of the empty ones
+            for (cx, cy), bucket in self._cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield bucket
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = self._cells.get((cx, cy))
+                if bucket:
+                    yield bucket
+
+    @classmethod
+    def from_graph(cls, graph, cell_size):
+        """
+        Index of the live nodes of a WallGraph.
+        """
+        index = cls(cell_size)
+        node_ids = graph.node_ids()
+        index.insert_many(node_ids.tolist(), graph.coords[node_ids].tolist())  # Plain ints as ids
+        return index
+
+
+class _Reverse:
+    """
+    Inverts the order of ids in the k-nearest heap, so equal distances keep the smallest ids.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
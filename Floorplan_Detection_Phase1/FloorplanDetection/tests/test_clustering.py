@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from FloorplanDetection.clustering import close_pairs, cluster_points, union_find
+from FloorplanDetection.walls import build_wall_graph, read_detections, wall_endpoints
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0, 2000, (n // 4, 2))
+    return corners[rng.integers(0, len(corners), n)] + rng.normal(0, 8, (n, 2))  # A few endpoints per corner
+
+
+@pytest.mark.parametrize('eps', [5.0, 20.0, 60.0])
+def test_same_clusters_as_dbscan(eps):
+    cluster = pytest.importorskip('sklearn.cluster')
+    points = random_points(2000)
+    labels, centroids = cluster_points(points, eps)
+    expected = cluster.DBSCAN(eps=eps, min_samples=1).fit(points).labels_
+    assert np.array_equal(labels, expected)
+    for label in range(len(centroids)):
+        assert np.allclose(centroids[label], points[labels == label].mean(axis=0))
+
+
+def test_close_pairs_inclusive_and_complete():
+    points = np.array([[0, 0], [3, 4], [10, 0], [13, 4.0001], [100, 100]])
+    pairs = {tuple(sorted(pair)) for pair in close_pairs(points, 5).tolist()}
+    assert pairs == {(0, 1)}
+    brute = random_points(300, seed=1)
+    distances = np.hypot(*(brute[:, None] - brute[None]).transpose(2, 0, 1))
+    expected = {(i, j) for i, j in zip(*np.nonzero(distances <= 25)) if i < j}
+    assert {tuple(sorted(pair)) for pair in close_pairs(brute, 25).tolist()} == expected
+
+
+def test_union_find_roots_are_smallest_members():
+    roots = union_find(6, np.array([[5, 3], [3, 1], [2, 4]]))
+    assert roots.tolist() == [0, 1, 2, 1, 2, 1]
+
+
+def test_empty_input():
+    labels, centroids = cluster_points(np.zeros((0, 2)), 10)
+    assert len(labels) == 0 and centroids.shape == (0, 2)
+
+
+def test_csv_to_graph():
+    boxes = read_detections('xmin,ymin,xmax,ymax,name\n0,0,10,200,wall\n0,195,300,205,wall\n5,5,6,6,door\n')
+    assert boxes == [(0, 0, 10, 200), (0, 195, 300, 205)]
+    assert wall_endpoints(*boxes[0]) == ((5, 0), (5, 200))
+    graph = build_wall_graph(boxes, eps=10)
+    assert graph.n_nodes == 3 and graph.live_edges().tolist() == [[0, 1], [1, 2]]
+    with pytest.raises(ValueError):
+        read_detections('x,y\n1,2\n')
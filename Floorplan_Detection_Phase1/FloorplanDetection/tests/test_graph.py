@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from FloorplanDetection.graph import WallGraph
+
+
+def square():
+    graph = WallGraph()
+    graph.add_nodes([[0, 0], [10, 0], [10, 10], [0, 10]])
+    graph.add_edges([[0, 1], [1, 2], [2, 3], [3, 0]])
+    return graph
+
+
+def test_add_edges_dedupes_and_skips_self_loops():
+    graph = WallGraph()
+    graph.add_nodes(np.zeros((4, 2)))
+    ids = graph.add_edges([[0, 1], [1, 0], [2, 2], [2, 3], [1, 2], [3, 2]])
+    assert ids.tolist() == [0, 0, -1, 1, 2, 1]
+    assert graph.n_edges == 3
+    assert graph.add_edges([[2, 1]]).tolist() == [2]
+
+
+def test_has_and_remove_edge_either_direction():
+    graph = square()
+    assert graph.has_edge(1, 0) and not graph.has_edge(0, 2)
+    graph.remove_edges([[1, 0], [0, 2]])
+    assert not graph.has_edge(0, 1)
+    assert graph.n_edges == 3
+    assert graph.add_edge(0, 1) == 0  # Freed slot reused
+
+
+def test_remove_nodes_drops_their_walls_and_keeps_ids():
+    graph = square()
+    removed = graph.remove_nodes([0])
+    assert sorted(removed.tolist()) == [0, 3]
+    assert graph.live_edges().tolist() == [[1, 2], [2, 3]]
+    assert not graph.has_edge(0, 1)
+    assert graph.add_node(5, 5) == 0
+    with pytest.raises(KeyError):
+        graph.add_edges([[1, 7]])
+
+
+def test_neighbors_and_degree():
+    graph = square()
+    assert sorted(graph.neighbors(0).tolist()) == [1, 3]
+    assert graph.degree().tolist() == [2, 2, 2, 2]
+
+
+def test_dict_round_trip_keeps_ids():
+    graph = square()
+    graph.remove_nodes([1])
+    restored = WallGraph.from_dict(graph.to_dict())
+    assert restored.to_dict() == graph.to_dict()
+    assert restored.has_edge(2, 3) and not restored.has_node(1)
+
+
+def test_bulk_edges_match_a_set():
+    rng = np.random.default_rng(0)
+    graph = WallGraph()
+    graph.add_nodes(rng.uniform(0, 100, (500, 2)))
+    pairs = rng.integers(0, 500, (5000, 2))
+    graph.add_edges(pairs)
+    expected = {(min(a, b), max(a, b)) for a, b in pairs.tolist() if a != b}
+    assert {tuple(edge) for edge in graph.live_edges().tolist()} == expected
+    graph.remove_edges(pairs[:2500])
+    expected -= {(min(a, b), max(a, b)) for a, b in pairs[:2500].tolist()}
+    assert {tuple(edge) for edge in graph.live_edges().tolist()} == expected
+    assert all(graph.has_edge(a, b) for a, b in expected)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from FloorplanDetection.incremental import ChangeSet, WallClusters
+from FloorplanDetection.walls import build_wall_graph
+
+
+def random_boxes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0, 3000, (n, 2))
+    boxes = []
+    for x, y in corners:
+        if rng.random() < 0.5:
+            boxes.append((x, y, x + 10, y + rng.uniform(50, 400)))
+        else:
+            boxes.append((x, y, x + rng.uniform(50, 400), y + 10))
+    return [tuple(float(v) for v in box) for box in boxes]
+
+
+def shape(graph):
+    """
+    A graph without its node ids: its walls as sorted pairs of corner coordinates.
+    """
+    coords = np.round(graph.coords, 6)
+    return sorted(tuple(sorted((tuple(coords[a]), tuple(coords[b])))) for a, b in graph.live_edges().tolist())
+
+
+def test_from_boxes_matches_build_wall_graph():
+    boxes = random_boxes(300)
+    clusters = WallClusters.from_boxes(boxes, 30)
+    expected = build_wall_graph(boxes, 30)
+    assert clusters.graph.to_dict() == expected.to_dict()
+
+
+def test_edits_match_a_rebuild():
+    rng = np.random.default_rng(1)
+    boxes = random_boxes(200)
+    clusters = WallClusters.from_boxes(boxes[:150], 30)
+    live = dict(enumerate(boxes[:150]))
+    for box in boxes[150:]:
+        box_id, _ = clusters.add_box(box)
+        live[box_id] = box
+    for box_id in rng.choice(list(live), 40, replace=False).tolist():
+        dx, dy = rng.uniform(-40, 40, 2).tolist()
+        x0, y0, x1, y1 = live[box_id]
+        moved = (x0 + dx, y0 + dy, x1 + dx, y1 + dy)
+        clusters.move_box(box_id, moved)
+        live[box_id] = moved
+    for box_id in rng.choice(list(live), 30, replace=False).tolist():
+        clusters.remove_box(box_id)
+        del live[box_id]
+    assert shape(clusters.graph) == shape(build_wall_graph(list(live.values()), 30))
+
+
+def test_change_set_and_stable_ids():
+    clusters = WallClusters.from_boxes([(0, 0, 10, 200), (0, 195, 300, 205)], 10)
+    before = clusters.graph.to_dict()['nodes']
+    box_id, changes = clusters.add_box((295, 0, 305, 200))  # Shares the corner at (300, 200)
+    assert changes.nodes_added == {3} and not changes.nodes_moved
+    assert changes.edges_added == {(2, 3)} and not changes.edges_removed
+    assert {node: before[node] for node in (0, 1)} == {node: clusters.graph.to_dict()['nodes'][node] for node in (0, 1)}
+    undone = clusters.remove_box(box_id)
+    assert undone.nodes_removed == {3} and undone.edges_removed == {(2, 3)}
+    assert not ChangeSet().update(changes).update(undone).nodes_added
+
+
+def test_sync_keeps_common_boxes():
+    boxes = random_boxes(50)
+    clusters = WallClusters.from_boxes(boxes, 30)
+    changes = clusters.sync(boxes[5:] + random_boxes(3, seed=7))
+    assert len(clusters) == 48
+    assert shape(clusters.graph) == shape(build_wall_graph(boxes[5:] + random_boxes(3, seed=7), 30))
+    assert not clusters.sync(boxes[5:] + random_boxes(3, seed=7))
+    assert changes
+
+
+def test_unknown_boxes():
+    clusters = WallClusters(30)
+    with pytest.raises(KeyError):
+        clusters.move_box(3, (0, 0, 1, 1))
+    box_id, _ = clusters.add_box((0, 0, 10, 100))
+    with pytest.raises(KeyError):
+        clusters.add_box((0, 0, 10, 100), box_id=box_id)
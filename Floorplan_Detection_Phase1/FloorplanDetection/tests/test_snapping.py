@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from FloorplanDetection.snapping import dominant_angles, snap_direction, snap_points
+
+
+def test_snaps_close_endpoints_to_their_mean():
+    coords = np.array([[100, 0], [102, 50], [104, 100], [300, 0]], dtype=float)
+    snapped = snap_points(coords, threshold=20)
+    assert snapped[:3, 0].tolist() == [102, 102, 102]
+    assert snapped[3, 0] == 300
+
+
+@pytest.mark.parametrize('n', [300, 100000])
+def test_no_point_moves_further_than_the_threshold(n):
+    coords = np.random.default_rng(0).uniform([0, 0], [1500, 1000], (n, 2))
+    snapped = snap_points(coords, threshold=20)
+    assert np.abs(snapped - coords).max() <= 20
+    assert len(np.unique(snapped[:, 0])) > 1500 / 20 / 2  # No collapse into a few lines
+
+
+def test_evenly_spaced_chain_is_left_alone():
+    chain = np.column_stack([np.arange(50) * 15.0, np.arange(50) * 40.0])
+    assert np.array_equal(snap_direction(chain, 90, 20), chain)
+
+
+def test_wall_along_the_direction_is_straightened():
+    coords = np.array([[0, 0], [26, 500]], dtype=float)  # Ends further apart than the threshold
+    snapped = snap_direction(coords, 90, 20, edges=[[0, 1]])
+    assert snapped[:, 0] == pytest.approx([13, 13])
+
+
+def test_wall_merge_that_moves_too_far_is_dropped():
+    coords = np.array([[0, 0], [50, 500]], dtype=float)
+    snapped = snap_direction(coords, 90, 20, edges=[[0, 1]], tolerance=10)
+    assert np.array_equal(snapped, coords)
+
+
+def test_off_axis_angles_need_edges():
+    with pytest.raises(ValueError):
+        snap_points(np.zeros((2, 2)), 20, angles=[45.0])
+
+
+def test_dominant_angles_length_weighted():
+    coords = np.array([[0, 0], [1000, 0], [0, 0], [1000, 1000], [0, 0], [0, 10]], dtype=float)
+    edges = [[0, 1], [2, 3], [4, 5]]
+    angles = dominant_angles(coords, edges)
+    assert len(angles) == 2
+    assert angles[0] == pytest.approx(45) and angles[1] == pytest.approx(0)
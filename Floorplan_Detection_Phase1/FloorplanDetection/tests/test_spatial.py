@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+import pytest
+
+from FloorplanDetection.graph import WallGraph
+from FloorplanDetection.spatial import SpatialIndex
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return {i: (float(x), float(y)) for i, (x, y) in enumerate(rng.uniform(-500, 1500, (400, 2)))}
+
+
+def brute_force(points, x, y):
+    return sorted((math.hypot(px - x, py - y), point_id) for point_id, (px, py) in points.items())
+
+
+def index_of(points, cell_size=30):
+    index = SpatialIndex(cell_size)
+    index.insert_many(list(points), list(points.values()))
+    return index
+
+
+@pytest.mark.parametrize('query', [(0, 0), (700, 300), (5000, -3000), (-499, 1499)])
+def test_k_nearest_matches_brute_force(points, query):
+    index = index_of(points)
+    expected = brute_force(points, *query)
+    assert [point_id for point_id, _ in index.k_nearest(*query, 5)] == [point_id for _, point_id in expected[:5]]
+    assert index.nearest(*query) == (expected[0][1], pytest.approx(expected[0][0]))
+
+
+def test_max_distance(points):
+    index = index_of(points)
+    assert index.nearest(5000, 5000, max_distance=10) is None
+    hits = index.k_nearest(700, 300, 50, max_distance=40)
+    assert all(distance <= 40 for _, distance in hits)
+    assert len(hits) == sum(distance <= 40 for distance, _ in brute_force(points, 700, 300))
+
+
+def test_radius_and_rect_queries(points):
+    index = index_of(points)
+    assert index.within_radius(700, 300, 120) == sorted(
+        point_id for distance, point_id in brute_force(points, 700, 300) if distance <= 120)
+    assert index.within_rect(800, 400, 100, 0) == sorted(
+        point_id for point_id, (x, y) in points.items() if 100 <= x <= 800 and 0 <= y <= 400)
+    assert index.within_rect(-10000, -10000, 10000, 10000) == sorted(points)
+
+
+def test_move_and_remove(points):
+    index = index_of(points)
+    index.move(0, 10000, 10000)
+    assert index.nearest(9990, 9990)[0] == 0
+    index.remove(0)
+    assert 0 not in index and len(index) == len(points) - 1
+    index.discard(0)
+    with pytest.raises(KeyError):
+        index.move(0, 1, 1)
+
+
+def test_from_graph_skips_removed_nodes():
+    graph = WallGraph()
+    graph.add_nodes([[0, 0], [10, 0], [20, 0]])
+    graph.remove_nodes([1])
+    index = SpatialIndex.from_graph(graph, 30)
+    assert index.within_radius(10, 0, 15) == [0, 2]
+    assert index.nearest(11, 0) == (2, 9.0)
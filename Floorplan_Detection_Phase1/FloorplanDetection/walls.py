@@ -0,0 +1,84 @@
+"""
+Wall detections (yolov9 bounding boxes) to a wall graph, without any GUI.
+
+    boxes (xmin, ymin, xmax, ymax)
+        ==> wall endpoints (2 per box, on the centre line of the box)
+        ==> endpoints within `eps` of each other clustered into one corner (grid hash, same clusters as DBSCAN min_samples=1)
+        ==> graph: corners are nodes (cluster centroid), every box is an edge between its two corners (WallGraph)
+
+The backend (/floorplan/graph) and visualise_yolov9_walls.py use these steps with calculate_eps (2% of the
+image diagonal). The Tk editor (Floorplan_Corrector_GUI.py) differs: it clusters the raw box corners
+(xmin, ymin) / (xmax, ymax) with a fixed eps of 30px, so its graph is not the same as the backend's.
+"""
+
+import csv
+import io
+
+import numpy as np
+
+from .clustering import cluster_points
+from .graph import WallGraph
+
+WALL_CLASS = 'wall'
+
+
+def calculate_eps(image_size, scale_factor=0.02):
+    """
+    Cluster radius relative to the image diagonal, so it works for any image resolution.
+    """
+    width, height = image_size
+    return scale_factor * float(np.sqrt(width ** 2 + height ** 2))
+
+
+def wall_endpoints(xmin, ymin, xmax, ymax):
+    """
+    Endpoints of the wall inside a bounding box: top/bottom centre for vertical (or square) boxes,
+    left/right centre for horizontal ones.
+    """
+    width = abs(xmax - xmin)
+    height = abs(ymax - ymin)
+    if height >= width:  # Vertical or square bounding box
+        return (xmin + width / 2, ymin), (xmin + width / 2, ymax)
+    return (xmin, ymin + height / 2), (xmax, ymin + height / 2)  # Horizontal box
+
+
+def read_detections(csv_text, class_name=WALL_CLASS):
+    """
+    [(xmin, ymin, xmax, ymax)] from a yolov9 inference results csv. Rows of other classes are skipped when
+    the csv has a 'name' column.
+    """
+    reader = csv.DictReader(io.StringIO(csv_text))
+    missing = {'xmin', 'ymin', 'xmax', 'ymax'} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+    boxes = []
+    for line_no, row in enumerate(reader, start=2):
+        if class_name and row.get('name') not in (None, '', class_name):
+            continue
+        try:
+            boxes.append(tuple(float(row[name]) for name in ('xmin', 'ymin', 'xmax', 'ymax')))
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid bounding box on line {line_no}')
+    return boxes
+
+
+def build_wall_graph(boxes, eps):
+    """
+    WallGraph of the boxes: one node per endpoint cluster (at its centroid), one edge per box. Node ids
+    follow the order the clusters first appear in.
+    """
+    points = np.array([point for box in boxes for point in wall_endpoints(*box)], dtype=float).reshape(-1, 2)
+    node_ids, centres = cluster_points(points, eps)  # Labels are already in order of first appearance
+
+    graph = WallGraph(node_capacity=len(centres), edge_capacity=len(boxes))
+    graph.add_nodes(centres)
+    graph.add_edges(node_ids.reshape(-1, 2))  # Walls shorter than eps (both ends in one corner) are skipped
+    return graph
+
+
+def detections_to_graph(boxes, eps):
+    """
+    Wall graph of the boxes as {'nodes': {id: {'coord': [x, y]}}, 'edges': [[id, id]]}, same layout as
+    the json the Tk editor saves.
+    """
+    return build_wall_graph(boxes, eps).to_dict()
@@ -0,0 +1,99 @@
+"""
+Admission control for the build service.
+
+    FairQueue   : the job queue. Bounded in total (MAX_PENDING_JOBS) and per tenant
+                  (MAX_PENDING_PER_TENANT), a full queue raises QueueFull which the API turns into
+                  429 + Retry-After. Workers take jobs round robin over tenants, so a tenant with many
+                  queued deploys can't starve the others.
+    Slots       : caps how many jobs are in a stage at once, npm builds (MAX_CONCURRENT_BUILDS) are
+                  CPU/memory heavy while uploads (MAX_CONCURRENT_UPLOADS) mostly wait on the network,
+                  so each gets its own limit.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+import config
+import metrics
+
+
+class QueueFull(Exception):
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FairQueue:
+    def __init__(self, max_pending=None, max_per_tenant=None):
+        self.max_pending = config.MAX_PENDING_JOBS if max_pending is None else max_pending
+        self.max_per_tenant = config.MAX_PENDING_PER_TENANT if max_per_tenant is None else max_per_tenant
+        self._queues = collections.OrderedDict()  # Tenant -> deque of items, in round robin order
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def put(self, tenant, item):
+        with self._cond:
+            if self._size >= self.max_pending:
+                raise QueueFull('Build queue is full, try again later.')
+            queue = self._queues.get(tenant)
+            if queue is not None and len(queue) >= self.max_per_tenant:
+                raise QueueFull(f'Too many queued deploys for {tenant}, try again later.')
+            if queue is None:
+                queue = self._queues[tenant] = collections.deque()
+            queue.append(item)
+            self._size += 1
+            self._cond.notify()
+
+    def get(self):
+        """
+        Next item of the tenant whose turn it is, blocks while the queue is empty.
+        """
+        with self._cond:
+            while self._size == 0:
+                self._cond.wait()
+            tenant, queue = self._queues.popitem(last=False)
+            item = queue.popleft()
+            self._size -= 1
+            if queue:
+                self._queues[tenant] = queue  # Back of the line until every other tenant had a turn
+            return item
+
+    def qsize(self):
+        with self._cond:
+            return self._size
+
+
+class Slots:
+    """
+    with build_slots.acquire(job): ...  # Waits for a free slot, the wait is recorded as job.stages['buildWait']
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def acquire(self, job=None):
+        start = time.perf_counter()
+        self._semaphore.acquire()
+        waited = time.perf_counter() - start
+        metrics.STAGE_SECONDS.observe(waited, stage=f'{self.name}Wait')
+        if job is not None:
+            job.stages[f'{self.name}Wait'] = round(waited, 3)
+        with self._lock:
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._semaphore.release()
+
+
+build_slots = Slots('build', config.MAX_CONCURRENT_BUILDS)
+upload_slots = Slots('upload', config.MAX_CONCURRENT_UPLOADS)
@@ -1,56 +1,388 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import subprocess
-import boto3
+import tempfile
+import time
+import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import build_cache
+import compression
+import config
+import floorplan_api
+import graph_store
+import manifest
+import metrics
+import shared_assets
+import tenant_config
+import versions
+from admission import QueueFull, build_slots, upload_slots
+from events import UploadProgress, format_sse
+from storage import get_default_storage
+from jobs import JobQueue
+from workspace import Workspace, cleanup_stale
 
 app = Flask(__name__)
 CORS(app)
 
-def run_build(project_name):
+app.register_blueprint(floorplan_api.blueprint) # POST /floorplan/graph(/batch), see floorplan_api.py
+app.register_blueprint(graph_store.blueprint) # /graphs/<id>, revisions + patches for the editors, see graph_store.py
+
+if config.SERVE_SITES: # Local origin for the deployed tenants, see static_server.py
+    import static_server
+    app.config['USE_X_SENDFILE'] = config.SITES_X_SENDFILE
+    app.register_blueprint(static_server.blueprint)
+
+cleanup_stale() # Workspaces of server processes that are gone (crash, restart), live ones are left alone
+
+# Builds and uploads run on these workers, never on the request thread
+job_queue = JobQueue(num_workers=config.BUILD_WORKERS, history=config.JOB_HISTORY,
+                     max_pending=config.MAX_PENDING_JOBS, max_per_tenant=config.MAX_PENDING_PER_TENANT)
+
+metrics.Gauge('deploy_queue_depth', 'Jobs waiting for a worker.', job_queue.pending)
+metrics.Gauge('deploy_active_workers', 'Workers running a job.', lambda: job_queue.active)
+metrics.Gauge('deploy_active_slots', 'Jobs holding a build / upload slot.',
+              lambda: {('build',): build_slots.active, ('upload',): upload_slots.active}, labels=('stage',))
+
+BUILD_PARAM_RE = re.compile(r'^VITE_[A-Z0-9_]+$') # Only variables vite exposes to the app can change a build
+PROJECT_NAME_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$') # One bucket prefix, "_..." prefixes are reserved (_shared)
+RESERVED_PROJECT_NAMES = {'jobs', 'metrics', 'graphs', 'projects', 'deploy', 'floorplan'} # API routes, SERVE_SITES mounts the tenants next to them
+
+def run_build(project_name, build_params=None, out_dir=None, on_output=None):
     try:
         print("start")
-        subprocess.call("build.sh")
-        
+        env = dict(os.environ, **(build_params or {})) # VITE_* variables are baked into the bundle by vite
+        out_dir = out_dir or config.DIST_FOLDER # Each job passes its own workspace so builds don't overwrite each other
+        command = ['bash', config.BUILD_SCRIPT, out_dir, config.WEB_APP_DIR]
+        # Relay build output line by line as it is printed (stderr merged into stdout)
+        with subprocess.Popen(command, cwd=config.BACKEND_DIR, env=env, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, text=True, errors='replace') as process:
+            for line in process.stdout:
+                if on_output:
+                    on_output(line.rstrip('\n'))
+                else:
+                    print(line, end='')
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
         # subprocess.run(['vite', 'build'], check=True, cwd='../multi-tenant-web-app/') # Tried this for windows, didn't work
         print("end")
-        # return True
-    except subprocess.CalledProcessError as e:
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f'Build failed: {str(e)}')
         return False
 
-def sync_to_s3(project_name):
+def sync_to_s3(project_name, storage=None, dist_folder=None, emit=None, copy_from=None, tenant_settings=None):
+    """
+    Versioned upload of dist for the project: fingerprinted bundles go to the shared asset store once, the
+    tenant files go to a new immutable version prefix (see versions.py) and the tenant's index.html is
+    switched to it once everything is uploaded. Files the live version already has with the same hash are
+    copied server side instead of uploaded again, so are files `copy_from` (the version prefix of a tenant
+    already deployed from the same build) has. `emit(type, data)` receives upload progress.
+    `tenant_settings` (model urls, viewer settings, ...) is written into config.json and index.html of this
+    tenant only.
+    """
     try:
-        s3 = boto3.client('s3')
-        dist_folder = '../multi-tenant-web-app/dist'
-        bucket_name = 'visualisation.propall' # Name of the bucket manually created in s3, we can automate it using awspipelines later
-        s3_location = f'{project_name}'
-
-        for root, dirs, files in os.walk(dist_folder):
-            for file in files:
-                s3.upload_file(
-                    os.path.join(root, file),
-                    bucket_name,
-                    os.path.join(s3_location, os.path.relpath(os.path.join(root, file), dist_folder))
-                )
+        storage = storage or get_default_storage() # Bucket from config, pass LocalStorage to deploy offline
+        dist_folder = dist_folder or config.DIST_FOLDER
+        version = versions.new_version_id()
+        s3_location = versions.version_prefix(project_name, version)
 
-        return True
+        local_files = manifest.build_manifest(dist_folder)
+
+        with tempfile.TemporaryDirectory() as staging_dir:
+            shared, shared_report = shared_assets.publish_shared_assets(
+                storage, dist_folder, local_files, os.path.join(staging_dir, 'shared'), emit)
+            tenant_files = shared_assets.stage_tenant_files(
+                dist_folder, local_files, shared, os.path.join(staging_dir, 'html'))
+            tenant_config.apply(tenant_files, tenant_config.for_tenant(project_name, tenant_settings),
+                                os.path.join(staging_dir, 'config'))
+            # gzip/brotli variants and ContentType/CacheControl of every object
+            uploads = compression.prepare(tenant_files, os.path.join(staging_dir, 'compressed'))
+            tenant_manifest = compression.manifest_of(uploads)
+
+            # A version prefix is never written twice, what the live version has is copied over
+            sources = []
+            live = versions.current_version(storage, project_name)
+            if live:
+                sources.append(versions.version_prefix(project_name, live))
+            if copy_from:
+                sources.append(copy_from)
+            pairs = []
+            to_upload = set(tenant_manifest)
+            for source in sources:
+                source_files = manifest.load_manifest(storage, source)
+                for path in sorted(to_upload):
+                    if source_files.get(path, {}).get('sha256') == tenant_manifest[path]['sha256']:
+                        pairs.append((f'{source}/{path}', f'{s3_location}/{path}'))
+                        to_upload.discard(path)
+            copied = copy_objects(storage, pairs)
+
+            items = [(uploads[path][0], f'{s3_location}/{path}', uploads[path][2]) for path in sorted(to_upload)]
+            report = storage.upload_files(items, UploadProgress(emit, 'tenant', items) if emit else None)
+            for failed in report.errors:
+                print(f'Upload of {failed.key} failed: {failed.error}')
+            if report.errors:
+                return False
+
+            manifest.save_manifest(storage, s3_location, tenant_manifest)
+            index_html = None
+            if 'index.html' in tenant_files:
+                with open(tenant_files['index.html'][0], encoding='utf-8') as f:
+                    index_html = f.read()
+        if index_html is None:
+            raise RuntimeError('Build has no index.html')
+        # Visitors switch to the new version here, in one write
+        expired = versions.publish(storage, project_name, version, index_html, tenant_manifest)
+
+        result = report.to_dict()
+        result.update({
+            'version': version,
+            'prefix': s3_location,
+            'previousVersion': live,
+            'unchanged': len(tenant_manifest) - len(to_upload),
+            'copied': copied,
+            'expiredVersions': expired,
+            'shared': {'files': len(shared), 'uploaded': len(shared_report.files), 'bytes': shared_report.total_bytes},
+        })
+        return result
     except Exception as e:
         print(f'Sync to S3 failed: {str(e)}')
         return False
 
+def copy_objects(storage, pairs):
+    """
+    Server side copy of (src_key, dst_key) pairs in parallel, returns no. of objects copied.
+    """
+    if not pairs:
+        return 0
+    with ThreadPoolExecutor(max_workers=config.UPLOAD_CONCURRENCY) as pool:
+        for future in [pool.submit(storage.copy, src, dst) for src, dst in pairs]:
+            future.result()
+    return len(pairs)
+
+def build_or_reuse(job):
+    """
+    Build the frontend into the job's own workspace, or reuse a cached build of the same inputs.
+    Returns (dist folder, build key, cache hit).
+    """
+    build_params = job.params.get('buildParams')
+    with job.stage('hash'):
+        key = build_cache.build_key(build_params)
+        dist_folder = build_cache.lookup(key)
+    cache_hit = dist_folder is not None
+    metrics.CACHE_LOOKUPS.inc(cache='build', result='hit' if cache_hit else 'miss')
+    if not cache_hit:
+        with build_slots.acquire(job), job.stage('build'), Workspace(job.id) as ws:
+            if not run_build(job.project_name, build_params, out_dir=ws.dist,
+                             on_output=lambda line: job.emit('log', {'line': line})):
+                raise RuntimeError('Build failed.')
+            ws.check_quota()
+            dist_folder = build_cache.store(key, ws.dist, move=True)
+    return dist_folder, key, cache_hit
+
+def build_and_upload_job(job):
+    """
+    Runs on a job queue worker: build (or reuse a cached build), then upload dist to the project's s3 prefix.
+    """
+    dist_folder, key, cache_hit = build_or_reuse(job)
+    with upload_slots.acquire(job), job.stage('upload'):
+        upload_report = sync_to_s3(job.project_name, dist_folder=dist_folder, emit=job.emit,
+                                   tenant_settings=job.params.get('config'))
+        if not upload_report:
+            raise RuntimeError('Sync to S3 failed.')
+    return {
+        'message': 'Build and upload successful!',
+        'buildKey': key,
+        'buildCache': 'hit' if cache_hit else 'miss',
+        'upload': upload_report,
+    }
+
+def batch_deploy_job(job):
+    """
+    Runs on a job queue worker: one build for all tenants of the batch. The first tenant is uploaded on
+    its own, the others then go out concurrently and copy whatever the first one already has server side.
+    """
+    tenants = job.params['tenants']
+    configs = job.params.get('configs', {})
+    dist_folder, key, cache_hit = build_or_reuse(job)
+
+    def deploy(tenant, copy_from=None):
+        start = time.perf_counter()
+        upload_report = sync_to_s3(tenant, dist_folder=dist_folder, emit=job.emit, copy_from=copy_from,
+                                   tenant_settings=configs.get(tenant))
+        seconds = round(time.perf_counter() - start, 3)
+        job.emit('tenant', {'tenant': tenant, 'ok': bool(upload_report), 'seconds': seconds})
+        if not upload_report:
+            return {'ok': False, 'seconds': seconds, 'error': 'Sync to S3 failed.'}
+        return {'ok': True, 'seconds': seconds, 'upload': upload_report}
+
+    results = {}
+    with upload_slots.acquire(job), job.stage('upload'):
+        seed = tenants[0]
+        results[seed] = deploy(seed)
+        copy_from = results[seed]['upload']['prefix'] if results[seed]['ok'] else None
+        with ThreadPoolExecutor(max_workers=config.BATCH_TENANT_CONCURRENCY) as pool:
+            futures = {tenant: pool.submit(deploy, tenant, copy_from) for tenant in tenants[1:]}
+            for tenant, future in futures.items():
+                results[tenant] = future.result()
+
+    failed = sorted(tenant for tenant, result in results.items() if not result['ok'])
+    job.result = {
+        'buildKey': key,
+        'buildCache': 'hit' if cache_hit else 'miss',
+        'tenants': results,
+        'succeeded': len(tenants) - len(failed),
+        'failed': failed,
+        'uploadSeconds': job.stages.get('upload'),
+        'totalSeconds': round(sum(job.stages.values()), 3),
+    }
+    if failed:
+        raise RuntimeError(f'Deploy failed for {len(failed)} of {len(tenants)} tenants: {", ".join(failed)}')
+    return job.result
+
+def validate_build_params(data):
+    build_params = data.get('buildParams') or {}
+    if not isinstance(build_params, dict) or not all(
+            BUILD_PARAM_RE.match(str(name)) and isinstance(value, str) for name, value in build_params.items()):
+        return None
+    return build_params
+
+def project_name_error(name):
+    if not isinstance(name, str) or not PROJECT_NAME_RE.match(name):
+        return 'Project names may only contain letters, digits, ".", "_" and "-"'
+    if name in RESERVED_PROJECT_NAMES:
+        return 'Project name is reserved for the API'
+    return None
+
+def queue_full(e):
+    response = jsonify({'error': str(e), 'retryAfter': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
 @app.route('/build', methods=['POST'])
 def build_and_upload():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     project_name = data.get('projectName')
 
     if not project_name:
         return jsonify({'error': 'Project name is required'}), 400
+    error = project_name_error(project_name)
+    if error:
+        return jsonify({'error': error}), 400
+
+    build_params = validate_build_params(data)
+    if build_params is None:
+        return jsonify({'error': 'buildParams must map VITE_* names to strings'}), 400
+    settings = data.get('config')
+    error = tenant_config.validate(settings)
+    if error:
+        return jsonify({'error': error}), 400
+
+    # A double submit or another operator deploying the same project, build params and config joins the running
+    # job. The sources are hashed once, by the job (build_or_reuse), a queued job builds whatever they are then
+    dedupe_key = (project_name, json.dumps(build_params, sort_keys=True), json.dumps(settings, sort_keys=True))
+    try:
+        job, created = job_queue.submit_once(dedupe_key, project_name, build_and_upload_job,
+                                             {'buildParams': build_params, 'config': settings})
+    except QueueFull as e:
+        return queue_full(e)
+    message = 'Build queued.' if created else 'Build already in progress, attached to it.'
+    return jsonify({'message': message, 'jobId': job.id, 'attached': not created, 'status': f'/jobs/{job.id}'}), 202
+
+@app.route('/deploy/batch', methods=['POST'])
+def deploy_batch():
+    """
+    {"tenants": ["kerala-villa", {"name": "spanish-villa", "config": {...}}, ...], "buildParams": {...}}:
+    build once and deploy the result to every tenant (with its own config). GET /jobs/<jobId> has a
+    result per tenant and the batch's timings.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('tenants')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'tenants must be a non-empty list of project names'}), 400
+    tenants, configs = [], {}
+    for entry in entries:
+        name, settings = (entry.get('name'), entry.get('config')) if isinstance(entry, dict) else (entry, None)
+        error = project_name_error(name) or tenant_config.validate(settings)
+        if error:
+            return jsonify({'error': f'{name}: {error}'}), 400
+        if name not in configs:
+            tenants.append(name)
+            configs[name] = settings
+
+    build_params = validate_build_params(data)
+    if build_params is None:
+        return jsonify({'error': 'buildParams must map VITE_* names to strings'}), 400
+
+    dedupe_key = ('batch', json.dumps(configs, sort_keys=True), json.dumps(build_params, sort_keys=True))
+    try:
+        job, created = job_queue.submit_once(dedupe_key, ', '.join(tenants), batch_deploy_job,
+                                             {'buildParams': build_params, 'tenants': tenants, 'configs': configs},
+                                             tenant=tenants[0]) # Queued with the seed tenant's jobs, batches don't share one lane
+    except QueueFull as e:
+        return queue_full(e)
+    message = 'Batch deploy queued.' if created else 'Batch deploy already in progress, attached to it.'
+    return jsonify({'message': message, 'jobId': job.id, 'attached': not created, 'status': f'/jobs/{job.id}'}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Server-Sent Events: build output lines ('log'), upload progress ('upload'), stage timings ('stage'),
+    state changes ('state') and the final job status ('done'). Reconnecting clients resume from Last-Event-ID.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', request.args.get('lastEventId', 0)))
+    except ValueError:
+        last_id = 0
+
+    def stream():
+        for event in job.events.follow(last_id):
+            yield format_sse(event)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/projects/<project_name>/versions', methods=['GET'])
+def list_versions(project_name):
+    if not PROJECT_NAME_RE.match(project_name):
+        return jsonify({'error': 'Invalid projectName'}), 400
+    storage = get_default_storage()
+    return jsonify({'projectName': project_name,
+                    'current': versions.current_version(storage, project_name),
+                    'versions': versions.load_versions(storage, project_name)}), 200
+
+@app.route('/projects/<project_name>/rollback', methods=['POST'])
+def rollback(project_name):
+    """
+    Point the tenant back at an earlier deploy, {"version": ...} or the one before the live one by default.
+    """
+    if not PROJECT_NAME_RE.match(project_name):
+        return jsonify({'error': 'Invalid projectName'}), 400
+    version = (request.get_json(silent=True) or {}).get('version')
+    if version is not None and not (isinstance(version, str) and versions.VERSION_RE.match(version)):
+        return jsonify({'error': 'Invalid version'}), 400
+    try:
+        version = versions.rollback(get_default_storage(), project_name, version)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'message': f'{project_name} now serves version {version}.', 'version': version}), 200
 
-    if run_build(project_name) and sync_to_s3(project_name):
-        return jsonify({'message': 'Build and upload successful!'}), 200
-    else:
-        return jsonify({'error': 'Build and upload failed.'}), 500
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     app.run(port=5000, debug=True)
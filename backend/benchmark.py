@@ -0,0 +1,141 @@
+"""
+Storage and deploy throughput benchmark.
+
+Generates synthetic dist trees (no. of files x file size, vite-like: fingerprinted bundles in assets/ plus
+tenant files and index.html) and, for every storage backend and concurrency level, measures:
+    upload      storage.upload_files of the raw tree (storage throughput only)
+    deploy      sync_to_s3 of the tree, what a deploy job does: manifests, compression, shared assets,
+                version prefix and the index.html switch
+
+Every run goes to its own prefix (its shared assets too, the real shared store is never touched) which is
+deleted afterwards.
+
+Usage:
+    python benchmark.py                                      <=== local backend only, default grid
+    python benchmark.py --backends local s3 --files 100 1000 --sizes 4096 1048576 --concurrency 1 8 32
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+import shared_assets
+import storage as storage_backends
+
+BENCH_PREFIX = '_benchmark'
+
+
+def make_tree(root, n_files, file_size):
+    """
+    Synthetic dist tree of `n_files` files of `file_size` bytes (random hex, compresses like minified code):
+    every other one a fingerprinted bundle (assets/chunk-<i>-<hash>.js), the others tenant files
+    (data/<i>.json), plus an index.html. Returns [(local_path, relative path)].
+    """
+    files = []
+    for i in range(n_files):
+        if i % 2:
+            rel_path = f'data/{i // 100}/{i}.json'
+        else:
+            rel_path = f'assets/chunk-{i}-{uuid.uuid4().hex[:8]}.js'
+        path = os.path.join(root, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(os.urandom(file_size // 2 + 1).hex()[:file_size])
+        files.append((path, rel_path))
+    scripts = ''.join(f'<script src="./{rel_path}"></script>' for _, rel_path in files if rel_path.startswith('assets/'))
+    index = os.path.join(root, 'index.html')
+    with open(index, 'w') as f:
+        f.write(f'<!doctype html><html><head>{scripts}</head><body></body></html>')
+    files.append((index, 'index.html'))
+    return files
+
+
+def _cleanup(store, prefix):
+    store.delete_keys(store.list_objects(prefix))
+
+
+def upload_once(store, files):
+    prefix = f'{BENCH_PREFIX}/{uuid.uuid4().hex}'
+    items = [(path, f'{prefix}/{rel_path}', None) for path, rel_path in files]
+    start = time.perf_counter()
+    report = store.upload_files(items)
+    upload_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    listed = store.list_objects(prefix)
+    list_seconds = time.perf_counter() - start
+
+    store.delete_keys(listed)
+    return {
+        'seconds': upload_seconds,
+        'files_per_second': len(items) / upload_seconds,
+        'mb_per_second': report.total_bytes / upload_seconds / 1e6,
+        'list_seconds': list_seconds,
+        'errors': len(report.errors),
+    }
+
+
+def deploy_once(store, tree, n_files):
+    """
+    sync_to_s3 of `tree` to a throwaway tenant, shared assets go to a prefix of this run as well.
+    """
+    from app import sync_to_s3  # Flask app and job queue, only needed here
+    prefix = f'{BENCH_PREFIX}/{uuid.uuid4().hex}'
+    shared_prefix = shared_assets.SHARED_PREFIX
+    shared_assets.SHARED_PREFIX = f'{prefix}/_shared'
+    try:
+        start = time.perf_counter()
+        result = sync_to_s3(f'{prefix}/site', storage=store, dist_folder=tree)
+        seconds = time.perf_counter() - start
+    finally:
+        shared_assets.SHARED_PREFIX = shared_prefix
+        _cleanup(store, prefix)
+    return {
+        'seconds': seconds,
+        'files_per_second': n_files / seconds,
+        'errors': 0 if result else 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark upload and deploy throughput of the storage backends.')
+    parser.add_argument('--backends', nargs='+', default=['local'], choices=['local', 's3'])
+    parser.add_argument('--files', nargs='+', type=int, default=[100, 1000], help='No. of files per tree')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[4 * 1024, 256 * 1024], help='Bytes per file')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--local-root', default=None, help='Folder for the local backend (default: temp dir)')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='deploy-bench-')
+    local_root = args.local_root or os.path.join(scratch, 'bucket')
+    print(f"{'backend':<8}{'files':>8}{'size':>10}{'conc':>6}{'upload s':>10}{'files/s':>10}{'MB/s':>10}"
+          f"{'list s':>9}{'deploy s':>10}{'files/s':>10}{'errors':>8}")
+    try:
+        for n_files in args.files:
+            for file_size in args.sizes:
+                tree = os.path.join(scratch, f'tree-{n_files}-{file_size}')
+                files = make_tree(tree, n_files, file_size)
+                for backend in args.backends:
+                    for concurrency in args.concurrency:
+                        if backend == 'local':
+                            store = storage_backends.LocalStorage(local_root, concurrency=concurrency)
+                        else:
+                            store = storage_backends.create_storage('s3', concurrency=concurrency)
+                        try:
+                            upload = upload_once(store, files)
+                            deploy = deploy_once(store, tree, len(files))
+                        finally:
+                            store.close()
+                        print(f"{backend:<8}{n_files:>8}{file_size:>10}{concurrency:>6}{upload['seconds']:>10.3f}"
+                              f"{upload['files_per_second']:>10.1f}{upload['mb_per_second']:>10.2f}"
+                              f"{upload['list_seconds']:>9.3f}{deploy['seconds']:>10.3f}"
+                              f"{deploy['files_per_second']:>10.1f}{upload['errors'] + deploy['errors']:>8}")
+                shutil.rmtree(tree, ignore_errors=True)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
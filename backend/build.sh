@@ -1,7 +1,11 @@
 #!/bin/bash
 
+# Usage: build.sh <out dir> [<web app dir>], every build job passes its own out dir so builds can run in parallel
+OUT_DIR="${1:-dist}"
+WEB_APP_DIR="${2:-../multi-tenant-web-app}" # config.WEB_APP_DIR, passed by run_build
+
 # Change to the directory where your project is located
-cd ../multi-tenant-web-app/
+cd "$WEB_APP_DIR" || exit 1
 
-# Run npm run build
-npm vite build
\ No newline at end of file
+# Run vite build into the job's out dir
+npx vite build --outDir "$OUT_DIR" --emptyOutDir
@@ -0,0 +1,96 @@
+"""
+Local cache of build outputs keyed on a hash of the build inputs.
+
+The key covers everything vite reads (src/, public/, index.html, package.json, package-lock.json,
+vite.config.js) plus the build parameters passed to the build as environment variables. The project
+name is not a build input, so tenants deployed from the same commit share one cache entry and only the
+first one actually runs vite.
+
+Layout: <BUILD_CACHE_DIR>/<key>/ holds a copy of dist. Entries are created with an atomic rename, the
+least recently used ones are removed once there are more than BUILD_CACHE_ENTRIES.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import config
+
+BUILD_INPUTS = ['src', 'public', 'index.html', 'package.json', 'package-lock.json', 'vite.config.js']
+
+
+def _input_files(web_app_dir):
+    for name in BUILD_INPUTS:
+        path = os.path.join(web_app_dir, name)
+        if os.path.isfile(path):
+            yield name, path
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    file_path = os.path.join(root, file)
+                    yield os.path.relpath(file_path, web_app_dir).replace(os.sep, '/'), file_path
+
+
+def build_key(build_params=None, web_app_dir=None):
+    """
+    sha256 over the relative path and content of every build input and the build parameters.
+    """
+    digest = hashlib.sha256()
+    for rel_path, path in _input_files(web_app_dir or config.WEB_APP_DIR):
+        digest.update(rel_path.encode() + b'\0')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest.update(b'\0')
+    digest.update(json.dumps(build_params or {}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def lookup(key):
+    """
+    dist folder cached under `key`, or None.
+    """
+    path = os.path.join(config.BUILD_CACHE_DIR, key)
+    if not os.path.isdir(path):
+        return None
+    os.utime(path)  # Mark as recently used
+    return path
+
+
+def store(key, dist_folder, move=False):
+    """
+    Copy (or move, for a job's throwaway workspace) a fresh build into the cache and return the cached
+    path. If another job stored the same key first, its copy is kept.
+    """
+    path = os.path.join(config.BUILD_CACHE_DIR, key)
+    tmp = os.path.join(config.BUILD_CACHE_DIR, f'.{key}.{uuid.uuid4().hex}.tmp')
+    os.makedirs(config.BUILD_CACHE_DIR, exist_ok=True)
+    if move:
+        shutil.move(dist_folder, tmp)
+    else:
+        shutil.copytree(dist_folder, tmp)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+    evict()
+    return path
+
+
+def evict(max_entries=None):
+    """
+    Remove the least recently used entries above `max_entries`.
+    """
+    max_entries = config.BUILD_CACHE_ENTRIES if max_entries is None else max_entries
+    try:
+        names = [name for name in os.listdir(config.BUILD_CACHE_DIR) if not name.startswith('.')]
+    except FileNotFoundError:
+        return
+    paths = sorted((os.path.join(config.BUILD_CACHE_DIR, name) for name in names), key=os.path.getmtime, reverse=True)
+    for path in paths[max_entries:]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,138 @@
+"""
+Upload metadata and pre-compressed variants of build files.
+
+Every uploaded object gets an accurate ContentType and a CacheControl:
+    fingerprinted bundles (assets/<name>-<hash>.<ext>) : public, max-age=31536000, immutable
+    html pages                                         : no-cache (always revalidated, so a deploy is visible at once)
+    everything else                                    : DEFAULT_CACHE_CONTROL
+
+Text assets are gzip'ed (s3 can't negotiate encodings, and every browser accepts gzip) and uploaded
+with ContentEncoding: gzip under their own key. When the brotli module is installed a brotli variant is
+uploaded next to it as <key>.br for origins that can negotiate (see the local static server).
+Compression runs in a process pool so big bundles are compressed on all cores.
+"""
+
+import gzip
+import mimetypes
+import os
+import threading
+
+import config
+import manifest
+import pools
+import shared_assets
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip only without it
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+NO_CACHE = 'no-cache'
+
+CONTENT_TYPES = {
+    '.js': 'text/javascript',
+    '.mjs': 'text/javascript',
+    '.css': 'text/css',
+    '.html': 'text/html',
+    '.json': 'application/json',
+    '.map': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.txt': 'text/plain',
+    '.webmanifest': 'application/manifest+json',
+    '.wasm': 'application/wasm',
+    '.gltf': 'model/gltf+json',
+    '.glb': 'model/gltf-binary',
+    '.woff2': 'font/woff2',
+}
+COMPRESSIBLE = {'.js', '.mjs', '.css', '.html', '.json', '.map', '.svg', '.txt', '.webmanifest', '.wasm', '.gltf'}
+MIN_COMPRESS_SIZE = 1024  # Smaller files aren't worth a Content-Encoding
+MIN_SAVING = 0.1  # Keep a variant only if it is at least 10% smaller
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def cache_control(path):
+    if shared_assets.is_fingerprinted(path):
+        return IMMUTABLE
+    if path.endswith('.html'):
+        return NO_CACHE
+    return config.DEFAULT_CACHE_CONTROL
+
+
+def is_compressible(path, size):
+    return size >= MIN_COMPRESS_SIZE and os.path.splitext(path)[1].lower() in COMPRESSIBLE
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pools.process_pool(config.COMPRESS_WORKERS)
+        return _pool
+
+
+def _compress(source, dest_base):
+    """
+    Runs in the process pool: write <dest_base>.gz (and .br) and return {encoding: (path, size, etag)}
+    for the variants that are worth keeping.
+    """
+    with open(source, 'rb') as f:
+        data = f.read()
+    variants = {}
+    encoders = [('gzip', '.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append(('br', '.br', lambda d: brotli.compress(d, quality=11)))
+    for encoding, ext, encode in encoders:
+        body = encode(data)
+        if len(body) > len(data) * (1 - MIN_SAVING):
+            continue
+        dest = dest_base + ext
+        with open(dest, 'wb') as f:
+            f.write(body)
+        variants[encoding] = (dest, len(body), manifest.hash_file(dest)[2])
+    return variants
+
+
+def prepare(files, staging_dir):
+    """
+    Turn {path: (source, manifest entry)} into the objects to upload,
+    {key path: (upload source, manifest entry, extra_args)}. Compressed variants are written to
+    `staging_dir`; their manifest entries keep the sha256 of the original file, so they are re-uploaded
+    exactly when the original changes.
+    """
+    uploads = {}
+    futures = {}
+    for path, (source, entry) in files.items():
+        extra_args = {'ContentType': content_type(path), 'CacheControl': cache_control(path)}
+        if is_compressible(path, entry['size']):
+            dest_base = os.path.join(staging_dir, *path.split('/'))
+            os.makedirs(os.path.dirname(dest_base), exist_ok=True)
+            futures[path] = _get_pool().submit(_compress, source, dest_base)
+        uploads[path] = (source, entry, extra_args)
+
+    for path, future in futures.items():
+        variants = future.result()
+        source, entry, extra_args = uploads[path]
+        if 'gzip' in variants:
+            dest, size, etag = variants['gzip']
+            uploads[path] = (dest, dict(entry, size=size, etag=etag, encoding='gzip'),
+                             dict(extra_args, ContentEncoding='gzip'))
+        if 'br' in variants:
+            dest, size, etag = variants['br']
+            uploads[f'{path}.br'] = (dest, dict(entry, size=size, etag=etag, encoding='br'),
+                                     dict(extra_args, ContentEncoding='br'))
+    return uploads
+
+
+def manifest_of(uploads):
+    return {path: entry for path, (source, entry, extra_args) in uploads.items()}
+
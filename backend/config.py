@@ -0,0 +1,81 @@
+"""
+Constants for the build/deploy backend.
+
+Every value can be overridden with an environment variable of the same name, so the same code runs
+on a laptop (python app.py) and on the deploy box without edits.
+"""
+
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+########## Paths ##########
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+WEB_APP_DIR = os.path.abspath(os.environ.get('WEB_APP_DIR', os.path.join(BACKEND_DIR, '..', 'multi-tenant-web-app')))
+DIST_FOLDER = os.path.join(WEB_APP_DIR, 'dist')
+BUILD_SCRIPT = os.path.join(BACKEND_DIR, 'build.sh')
+FLOORPLAN_LIB_DIR = os.path.abspath(os.environ.get('FLOORPLAN_LIB_DIR', os.path.join(BACKEND_DIR, '..', 'Floorplan_Detection_Phase1')))  # Holds the FloorplanDetection package
+
+########## Storage ##########
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 's3')  # 's3' or 'local' (folder on disk with the bucket's key layout)
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'visualisation.propall')  # Name of the bucket manually created in s3
+LOCAL_STORAGE_DIR = os.path.abspath(os.environ.get('LOCAL_STORAGE_DIR', os.path.join(BACKEND_DIR, '.local-bucket')))
+
+########## Job queue ##########
+BUILD_WORKERS = _env_int('BUILD_WORKERS', 2)  # No. of build+upload jobs that run at the same time
+JOB_HISTORY = _env_int('JOB_HISTORY', 500)  # No. of finished jobs kept around for GET /jobs/<id>
+MAX_PENDING_JOBS = _env_int('MAX_PENDING_JOBS', 20)  # Queued jobs before /build answers 429
+MAX_PENDING_PER_TENANT = _env_int('MAX_PENDING_PER_TENANT', 3)  # Queued jobs per project before its requests get 429
+MAX_CONCURRENT_BUILDS = _env_int('MAX_CONCURRENT_BUILDS', BUILD_WORKERS)  # npm builds running at the same time
+MAX_CONCURRENT_UPLOADS = _env_int('MAX_CONCURRENT_UPLOADS', BUILD_WORKERS)  # Jobs uploading at the same time
+JOB_EVENT_BUFFER = _env_int('JOB_EVENT_BUFFER', 2000)  # Events (log lines, progress) kept per job for GET /jobs/<id>/events
+
+########## Uploads ##########
+UPLOAD_CONCURRENCY = _env_int('UPLOAD_CONCURRENCY', 16)  # Max. parallel PUT/part requests across all jobs
+S3_MAX_POOL_CONNECTIONS = _env_int('S3_MAX_POOL_CONNECTIONS', UPLOAD_CONCURRENCY + 4)  # Keep-alive connections in the shared client
+MULTIPART_THRESHOLD = _env_int('MULTIPART_THRESHOLD', 8 * 1024 * 1024)  # Files at least this big are uploaded in parts
+MULTIPART_CHUNKSIZE = _env_int('MULTIPART_CHUNKSIZE', 8 * 1024 * 1024)  # Size of each part
+MULTIPART_CONCURRENCY = _env_int('MULTIPART_CONCURRENCY', 4)  # Parts of one file uploaded at the same time
+MULTIPART_PART_RETRIES = _env_int('MULTIPART_PART_RETRIES', 3)  # Retries of a part that failed or came back with a wrong etag
+MULTIPART_STATE_DIR = os.path.abspath(os.environ.get('MULTIPART_STATE_DIR', os.path.join(BACKEND_DIR, '.multipart-state')))  # Progress of unfinished multipart uploads
+
+########## Shared assets ##########
+SHARED_ASSETS_PREFIX = os.environ.get('SHARED_ASSETS_PREFIX', '_shared')  # Bucket prefix holding fingerprinted bundles of all tenants
+SHARED_ASSETS_URL = os.environ.get('SHARED_ASSETS_URL', f'/{SHARED_ASSETS_PREFIX}')  # URL tenant pages load them from (bucket website root or a CDN)
+
+########## Build cache ##########
+BUILD_CACHE_DIR = os.path.abspath(os.environ.get('BUILD_CACHE_DIR', os.path.join(BACKEND_DIR, '.build-cache')))
+BUILD_CACHE_ENTRIES = _env_int('BUILD_CACHE_ENTRIES', 20)  # No. of cached dist folders kept (least recently used are removed)
+
+########## Build workspaces ##########
+WORKSPACE_DIR = os.path.abspath(os.environ.get('WORKSPACE_DIR', os.path.join(BACKEND_DIR, '.workspaces')))  # One out dir per build job
+WORKSPACE_QUOTA_BYTES = _env_int('WORKSPACE_QUOTA_BYTES', 2 * 1024 ** 3)  # Disk all workspaces together may use
+WORKSPACE_MAX_AGE = _env_int('WORKSPACE_MAX_AGE', 6 * 3600)  # Seconds after which a leftover workspace without an owner (older layout) counts as stale
+
+########## Compression / cache headers ##########
+COMPRESS_WORKERS = _env_int('COMPRESS_WORKERS', os.cpu_count() or 2)  # Processes gzip/brotli'ing assets before upload
+DEFAULT_CACHE_CONTROL = os.environ.get('DEFAULT_CACHE_CONTROL', 'public, max-age=300')  # Files that are neither fingerprinted nor html
+
+########## Local static server ##########
+SERVE_SITES = os.environ.get('SERVE_SITES', '0') == '1'  # Also serve deployed tenants from app.py (see static_server.py)
+SITE_ROOT = os.path.abspath(os.environ.get('SITE_ROOT', LOCAL_STORAGE_DIR))  # Folder with the bucket layout to serve
+SITES_X_SENDFILE = os.environ.get('SITES_X_SENDFILE', '0') == '1'  # Let nginx/apache send files (X-Sendfile)
+
+########## Versioned deploys ##########
+DEPLOY_KEEP_VERSIONS = _env_int('DEPLOY_KEEP_VERSIONS', 5)  # Versions per tenant kept for rollback, older ones are deleted after a deploy
+
+########## Batch deploys ##########
+BATCH_TENANT_CONCURRENCY = _env_int('BATCH_TENANT_CONCURRENCY', 8)  # Tenants of a batch uploaded at the same time
+
+########## Floorplan processing ##########
+FLOORPLAN_WORKERS = _env_int('FLOORPLAN_WORKERS', os.cpu_count() or 2)  # Processes turning wall detections into graphs
+FLOORPLAN_MAX_BATCH = _env_int('FLOORPLAN_MAX_BATCH', 50)  # Max. floorplans per POST /floorplan/graph/batch
+
+########## Graph store ##########
+GRAPH_PREFIX = os.environ.get('GRAPH_PREFIX', '_graphs')  # Storage prefix the editors' wall graphs are saved under
+GRAPH_PATCH_HISTORY = _env_int('GRAPH_PATCH_HISTORY', 500)  # Patches kept per graph for GET /graphs/<id>/patches
+GRAPH_MAX_OPS = _env_int('GRAPH_MAX_OPS', 10000)  # Max. ops in one PATCH
+GRAPH_CACHE_SIZE = _env_int('GRAPH_CACHE_SIZE', 200)  # Graphs kept in memory (least recently used go), the others are re-read from storage
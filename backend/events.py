@@ -0,0 +1,109 @@
+"""
+Live event stream of a job (GET /jobs/<id>/events, Server-Sent Events).
+
+Each job has an EventLog: a ring buffer of the last JOB_EVENT_BUFFER events (build output lines,
+upload progress, stage timings, state changes) with increasing ids. Readers follow the log from an id
+(SSE Last-Event-ID) and block on a condition until new events arrive, so a long build with a big log
+costs a fixed amount of memory no matter how many lines it prints. A reader that falls more than the
+buffer behind gets a 'gap' event telling it how many events it missed.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+import config
+
+
+class EventLog:
+    def __init__(self, maxlen=None):
+        self._events = collections.deque(maxlen=maxlen or config.JOB_EVENT_BUFFER)
+        self._next_id = 1
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def emit(self, event_type, data):
+        with self._cond:
+            if self._closed:
+                return
+            self._events.append((self._next_id, event_type, data))
+            self._next_id += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def follow(self, last_id=0, heartbeat=15):
+        """
+        Yield (id, type, data) for every event after `last_id` until the log is closed. Yields None
+        every `heartbeat` seconds without events, so the caller can keep the connection alive.
+        """
+        while True:
+            with self._cond:
+                if self._next_id - 1 <= last_id and not self._closed:
+                    self._cond.wait(heartbeat)
+                pending = [event for event in self._events if event[0] > last_id]
+                closed = self._closed and (not pending or pending[-1][0] == self._next_id - 1)
+            if pending and pending[0][0] > last_id + 1:
+                yield (None, 'gap', {'missed': pending[0][0] - last_id - 1})
+            for event in pending:
+                yield event
+                last_id = event[0]
+            if closed:
+                return
+            if not pending:
+                yield None
+
+
+def format_sse(event):
+    """
+    One event in text/event-stream format (None -> heartbeat comment).
+    """
+    if event is None:
+        return ': keep-alive\n\n'
+    event_id, event_type, data = event
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class UploadProgress:
+    """
+    Progress callback for storage.upload_files(): counts bytes and finished files and emits an
+    'upload' event at most every `interval` seconds (and always when the last file is done).
+    """
+
+    def __init__(self, emit, phase, items, interval=0.25):
+        self.emit = emit
+        self.phase = phase
+        self.total_files = len(items)
+        self.total_bytes = sum(os.path.getsize(local_path) for local_path, key, extra_args in items)
+        self.files_done = 0
+        self.bytes_done = 0
+        self.interval = interval
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, key, bytes_transferred, done=False):
+        with self._lock:
+            self.bytes_done += bytes_transferred
+            if done:
+                self.files_done += 1
+            now = time.monotonic()
+            if not (done and self.files_done == self.total_files) and now - self._last_emit < self.interval:
+                return
+            self._last_emit = now
+            data = {
+                'phase': self.phase,
+                'key': key,
+                'filesDone': self.files_done,
+                'filesTotal': self.total_files,
+                'bytesDone': self.bytes_done,
+                'bytesTotal': self.total_bytes,
+            }
+        self.emit('upload', data)
@@ -0,0 +1,199 @@
+"""
+Floorplan processing API: yolov9 wall detections (csv) to a wall graph (json).
+
+The post processing lives in the FloorplanDetection library (Floorplan_Detection_Phase1/), this module
+only parses requests and runs it in a process pool (FLOORPLAN_WORKERS processes), so clustering big
+floorplans neither blocks the Flask threads nor is limited by the GIL.
+
+    POST /floorplan/graph        multipart: csv=<file>, image=<file> (optional), eps, scaleFactor
+                                 or json: {"csv": "<csv text>", "imageSize": [w, h], "eps": ..., "scaleFactor": ...}
+    POST /floorplan/graph/batch  json: {"items": [{"id": ..., "csv": "...", "imageSize": [w, h], "eps": ...}, ...]}
+
+The cluster radius is `eps` when given, otherwise scaleFactor (default 0.02) x the image diagonal, the
+image (or imageSize) is only needed for that and is never decoded, just its header is read.
+"""
+
+import base64
+import concurrent.futures
+import concurrent.futures.process
+import struct
+import sys
+import threading
+
+from flask import Blueprint, jsonify, request
+
+import config
+import pools
+
+sys.path.insert(0, config.FLOORPLAN_LIB_DIR)  # FloorplanDetection, imported in the pool processes only (numpy)
+
+blueprint = Blueprint('floorplan', __name__)
+
+DEFAULT_SCALE_FACTOR = 0.02
+MAX_CSV_BYTES = 5 * 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pools.process_pool(config.FLOORPLAN_WORKERS)
+        return _pool
+
+
+def _worker_error(e):
+    """
+    (message, status) for an exception from the pool that isn't a bad request. A crashed worker breaks the
+    whole pool, the next request starts a new one.
+    """
+    global _pool
+    if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+        with _pool_lock:
+            _pool = None
+        return 'Floorplan worker crashed, try again', 503
+    return f'Processing failed: {e.__class__.__name__}: {e}', 500
+
+
+def image_size(data):
+    """
+    (width, height) from the header of a png or jpeg, None for anything else.
+    """
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # No length
+                i += 2
+                continue
+            length = struct.unpack('>H', data[i + 2:i + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):  # Start of frame
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            i += 2 + length
+    return None
+
+
+def process(csv_text, size=None, eps=None, scale_factor=DEFAULT_SCALE_FACTOR):
+    """
+    Runs in the process pool: csv text to {'nodes', 'edges', 'eps', 'walls'}.
+    """
+    from FloorplanDetection import calculate_eps, detections_to_graph, read_detections
+    boxes = read_detections(csv_text)
+    if eps is None:
+        eps = calculate_eps(size, scale_factor)
+    graph = detections_to_graph(boxes, eps)
+    graph.update(eps=eps, walls=len(boxes))
+    return graph
+
+
+def _number(value, name):
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if number <= 0:
+        raise ValueError(f'{name} must be positive')
+    return number
+
+
+def parse_item(csv_text, image=None, size=None, eps=None, scale_factor=None):
+    """
+    Validate one request item, returns the arguments for process().
+    """
+    if not isinstance(csv_text, str) or not csv_text.strip():
+        raise ValueError('csv is required')
+    if len(csv_text) > MAX_CSV_BYTES:
+        raise ValueError(f'csv must be smaller than {MAX_CSV_BYTES} bytes')
+    eps = _number(eps, 'eps')
+    scale_factor = _number(scale_factor, 'scaleFactor') or DEFAULT_SCALE_FACTOR
+    if image is not None:
+        size = image_size(image)
+        if size is None:
+            raise ValueError('image must be a png or jpeg')
+    if size is not None:
+        if not (isinstance(size, (list, tuple)) and len(size) == 2 and all(_number(v, 'imageSize') for v in size)):
+            raise ValueError('imageSize must be [width, height]')
+        size = (float(size[0]), float(size[1]))
+    if eps is None and size is None:
+        raise ValueError('eps or an image (imageSize) is required')
+    return csv_text, size, eps, scale_factor
+
+
+def _parse_json_item(item):
+    if not isinstance(item, dict):
+        raise ValueError('items must be json objects')
+    image = item.get('image')
+    if image is not None:
+        try:
+            image = base64.b64decode(image, validate=True)
+        except (TypeError, ValueError):
+            raise ValueError('image must be base64')
+    return parse_item(item.get('csv'), image, item.get('imageSize'), item.get('eps'), item.get('scaleFactor'))
+
+
+@blueprint.route('/floorplan/graph', methods=['POST'])
+def floorplan_graph():
+    try:
+        if request.files or request.form:
+            csv_file = request.files.get('csv')
+            image_file = request.files.get('image')
+            args = parse_item(csv_file.read().decode('utf-8-sig') if csv_file else None,
+                              image_file.read() if image_file else None, None,
+                              request.form.get('eps'), request.form.get('scaleFactor'))
+        else:
+            args = _parse_json_item(request.get_json(silent=True) or {})
+        graph = _get_pool().submit(process, *args).result()
+    except UnicodeDecodeError:
+        return jsonify({'error': 'csv must be utf-8'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        message, status = _worker_error(e)
+        return jsonify({'error': message}), status
+    return jsonify(graph), 200
+
+
+@blueprint.route('/floorplan/graph/batch', methods=['POST'])
+def floorplan_graph_batch():
+    """
+    Every item is processed in parallel, results come back in request order with their id. A bad item
+    fails on its own ({"ok": false, "error": ...}), the others are still processed.
+    """
+    items = (request.get_json(silent=True) or {}).get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > config.FLOORPLAN_MAX_BATCH:
+        return jsonify({'error': f'At most {config.FLOORPLAN_MAX_BATCH} items per batch'}), 400
+
+    pending = []
+    for index, item in enumerate(items):
+        item_id = item.get('id', index) if isinstance(item, dict) else index
+        try:
+            pending.append((item_id, _get_pool().submit(process, *_parse_json_item(item)), None))
+        except ValueError as e:
+            pending.append((item_id, None, str(e)))
+        except Exception as e:
+            pending.append((item_id, None, _worker_error(e)[0]))
+
+    results = []
+    for item_id, future, error in pending:
+        if future is not None:
+            try:
+                results.append({'id': item_id, 'ok': True, 'graph': future.result()})
+                continue
+            except ValueError as e:
+                error = str(e)
+            except Exception as e:  # Worker failure, only this item fails
+                error = _worker_error(e)[0]
+        results.append({'id': item_id, 'ok': False, 'error': error})
+    return jsonify({'results': results, 'failed': sum(not result['ok'] for result in results)}), 200
@@ -0,0 +1,344 @@
+"""
+Wall graph store with revisions and patches, for the canvas editors.
+
+A graph is the json the Tk editor saves, {"nodes": {id: {"coord": [x, y]}}, "edges": [[id, id]]} (node ids
+are strings, edges undirected). Every change bumps the graph's revision, editors send and receive the
+change as a list of compact ops instead of the whole graph:
+
+    ["add", id, x, y]      ["move", id, x, y]      ["remove", id]  (and its edges)
+    ["link", a, b]         ["unlink", a, b]
+
+    PUT   /graphs/<id>                      whole graph, creates or replaces it
+    GET   /graphs/<id>                      whole graph + revision, ETag / If-None-Match (304)
+    PATCH /graphs/<id> {"baseRevision": n, "ops": [...]}
+                                            applies all ops or none, 409 + current revision when the graph
+                                            changed since n (fetch the patches and rebase)
+    GET   /graphs/<id>/patches?since=n      ops after revision n, the whole graph if n is too old
+
+Graphs are written to the deploy storage (<GRAPH_PREFIX>/<id>.json) after every change and read from it on
+first use. Memory only holds the GRAPH_CACHE_SIZE most recently used graphs with their last
+GRAPH_PATCH_HISTORY patches, a graph read back after it was dropped answers old `since` with the whole graph.
+"""
+
+import collections
+import contextlib
+import json
+import re
+import threading
+
+from flask import Blueprint, Response, jsonify, request
+
+import config
+from storage import get_default_storage
+
+blueprint = Blueprint('graphs', __name__)
+
+GRAPH_ID_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$')
+
+
+class PatchError(ValueError):
+    pass
+
+
+class Graph:
+    def __init__(self, graph_id, nodes=None, edges=None, revision=0):
+        self.id = graph_id
+        self.nodes = {}  # Node id -> [x, y]
+        self.adjacency = {}  # Node id -> set of neighbour ids
+        self.revision = revision
+        self.patches = collections.deque(maxlen=config.GRAPH_PATCH_HISTORY)  # (revision, ops)
+        self.lock = threading.Lock()
+        self.evicted = False  # Dropped from the GraphStore, writers must fetch the graph again
+        for node, attrs in (nodes or {}).items():
+            self._add(str(node), *_coord(attrs.get('coord') if isinstance(attrs, dict) else None))
+        for edge in edges or []:
+            if not (isinstance(edge, (list, tuple)) and len(edge) == 2):
+                raise PatchError('edges must be [id, id] pairs')
+            self._link(str(edge[0]), str(edge[1]))
+
+    @property
+    def etag(self):
+        return f'"{self.id}-{self.revision}"'
+
+    def to_dict(self):
+        edges = sorted({tuple(sorted((a, b))) for a, neighbours in self.adjacency.items() for b in neighbours})
+        return {
+            'nodes': {node: {'coord': coord} for node, coord in self.nodes.items()},
+            'edges': [list(edge) for edge in edges],
+        }
+
+    def _need(self, node):
+        if node not in self.nodes:
+            raise PatchError(f'Unknown node: {node}')
+
+    def _add(self, node, x, y):
+        if node in self.nodes:
+            raise PatchError(f'Node exists: {node}')
+        self.nodes[node] = [x, y]
+        self.adjacency[node] = set()
+
+    def _link(self, a, b):
+        self._need(a)
+        self._need(b)
+        if a == b:
+            raise PatchError(f'Cannot link node {a} to itself')
+        self.adjacency[a].add(b)
+        self.adjacency[b].add(a)
+
+    def _apply(self, op):
+        """
+        Apply one op, returns (the op with string node ids, the ops that undo it).
+        """
+        if not isinstance(op, list) or not op or not isinstance(op[0], str):
+            raise PatchError(f'Invalid op: {op!r}')
+        name, args = op[0], op[1:]
+        arity = {'add': 3, 'move': 3, 'remove': 1, 'link': 2, 'unlink': 2}
+        if name not in arity:
+            raise PatchError(f'Unknown op: {name}')
+        if len(args) != arity[name]:
+            raise PatchError(f'{name} takes {arity[name]} arguments')
+        node = str(args[0])
+        if name == 'add':
+            x, y = _coord(args[1:])
+            self._add(node, x, y)
+            return ['add', node, x, y], [['remove', node]]
+        if name == 'move':
+            self._need(node)
+            old = self.nodes[node]
+            x, y = _coord(args[1:])
+            self.nodes[node] = [x, y]
+            return ['move', node, x, y], [['move', node, *old]]
+        if name == 'remove':
+            self._need(node)
+            undo = [['add', node, *self.nodes[node]]] + [['link', node, other] for other in self.adjacency[node]]
+            for other in self.adjacency.pop(node):
+                self.adjacency[other].discard(node)
+            del self.nodes[node]
+            return ['remove', node], undo
+        other = str(args[1])
+        if name == 'link':
+            linked = other in self.adjacency.get(node, ())
+            self._link(node, other)
+            return ['link', node, other], [] if linked else [['unlink', node, other]]
+        self._need(node)
+        self._need(other)
+        if other not in self.adjacency[node]:
+            return ['unlink', node, other], []
+        self.adjacency[node].discard(other)
+        self.adjacency[other].discard(node)
+        return ['unlink', node, other], [['link', node, other]]
+
+    def apply(self, ops):
+        """
+        Apply all `ops` or, when one of them is invalid, none of them (raises PatchError).
+        """
+        applied, undo = [], []
+        try:
+            for op in ops:
+                normalized, inverse = self._apply(op)
+                applied.append(normalized)
+                undo.append(inverse)
+        except PatchError:
+            for inverse in reversed(undo):
+                for op in inverse:
+                    self._apply(op)
+            raise
+        self.revision += 1
+        self.patches.append((self.revision, applied))
+
+    def ops_since(self, revision):
+        """
+        Ops from `revision` to the current one, None when they are no longer kept.
+        """
+        if revision == self.revision:
+            return []
+        if not self.patches or revision < self.patches[0][0] - 1 or revision > self.revision:
+            return None
+        return [op for rev, ops in self.patches if rev > revision for op in ops]
+
+
+def _coord(values):
+    if not (isinstance(values, (list, tuple)) and len(values) == 2 and
+            all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)):
+        raise PatchError('coord must be [x, y] numbers')
+    return float(values[0]), float(values[1])
+
+
+class GraphStore:
+    def __init__(self, storage=None, max_graphs=None):
+        self._storage = storage
+        self._graphs = collections.OrderedDict()  # Least recently used first
+        self._max_graphs = config.GRAPH_CACHE_SIZE if max_graphs is None else max_graphs
+        self._lock = threading.Lock()
+
+    @property
+    def storage(self):
+        return self._storage or get_default_storage()
+
+    def _key(self, graph_id):
+        return f'{config.GRAPH_PREFIX}/{graph_id}.json'
+
+    def get(self, graph_id):
+        """
+        Graph from memory or storage, None if it doesn't exist.
+        """
+        with self._lock:
+            graph = self._graphs.get(graph_id)
+            if graph is None:
+                data = self.storage.get_bytes(self._key(graph_id))
+                if data is None:
+                    return None
+                saved = json.loads(data)
+                graph = Graph(graph_id, saved.get('nodes'), saved.get('edges'), saved.get('revision', 0))
+            self._remember(graph)
+            return graph
+
+    @contextlib.contextmanager
+    def locked(self, graph_id):
+        """
+        with graph_store.locked(graph_id) as graph: the current graph (None if it doesn't exist) with its lock
+        held, for changes. A graph evicted while waiting for the lock is fetched again.
+        """
+        while True:
+            graph = self.get(graph_id)
+            if graph is None:
+                yield None
+                return
+            with graph.lock:
+                if not graph.evicted:
+                    yield graph
+                    return
+
+    def _remember(self, graph):
+        """
+        Make `graph` the most recently used one and drop the least recently used graphs over the limit. Only
+        graphs nobody holds the lock of are dropped, every change is saved before its lock is released.
+        """
+        previous = self._graphs.get(graph.id)
+        if previous is not None and previous is not graph:
+            previous.evicted = True
+        self._graphs[graph.id] = graph
+        self._graphs.move_to_end(graph.id)
+        for graph_id in list(self._graphs)[:-1]:
+            if len(self._graphs) <= self._max_graphs:
+                break
+            candidate = self._graphs[graph_id]
+            if candidate.lock.acquire(blocking=False):
+                del self._graphs[graph_id]
+                candidate.evicted = True
+                candidate.lock.release()
+
+    def __len__(self):
+        return len(self._graphs)
+
+    def save(self, graph):
+        body = dict(graph.to_dict(), revision=graph.revision)
+        self.storage.put_bytes(self._key(graph.id), json.dumps(body).encode(),
+                               {'ContentType': 'application/json', 'CacheControl': 'no-cache'})
+
+    def replace(self, graph_id, data):
+        graph = Graph(graph_id, data.get('nodes'), data.get('edges'))
+        current = self.get(graph_id)
+        if current is None:
+            graph.revision = 1
+            self.save(graph)
+            with self._lock:
+                self._remember(graph)
+            return graph
+        with current.lock:
+            graph.revision = current.revision + 1
+            current.revision = graph.revision  # Patches still holding the old graph now conflict
+            self.save(graph)
+            with self._lock:
+                self._remember(graph)
+        return graph
+
+
+graph_store = GraphStore()
+
+
+def _etag_matches(graph):
+    header = request.headers.get('If-None-Match', '')
+    return header.strip() == '*' or graph.etag in [tag.strip() for tag in header.split(',')]
+
+
+def _not_modified(graph):
+    response = Response(status=304)
+    response.headers['ETag'] = graph.etag
+    return response
+
+
+def _with_etag(response, graph):
+    response.headers['ETag'] = graph.etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@blueprint.route('/graphs/<graph_id>', methods=['PUT'])
+def put_graph(graph_id):
+    if not GRAPH_ID_RE.match(graph_id):
+        return jsonify({'error': 'Invalid graph id'}), 400
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a graph {"nodes": {...}, "edges": [...]}'}), 400
+    try:
+        graph = graph_store.replace(graph_id, data)
+    except PatchError as e:
+        return jsonify({'error': str(e)}), 400
+    return _with_etag(jsonify({'revision': graph.revision}), graph), 200
+
+
+@blueprint.route('/graphs/<graph_id>', methods=['GET'])
+def get_graph(graph_id):
+    graph = graph_store.get(graph_id) if GRAPH_ID_RE.match(graph_id) else None
+    if graph is None:
+        return jsonify({'error': 'Graph not found'}), 404
+    with graph.lock:
+        if _etag_matches(graph):
+            return _not_modified(graph)
+        body = dict(graph.to_dict(), revision=graph.revision)
+        return _with_etag(jsonify(body), graph), 200
+
+
+@blueprint.route('/graphs/<graph_id>', methods=['PATCH'])
+def patch_graph(graph_id):
+    if not GRAPH_ID_RE.match(graph_id):
+        return jsonify({'error': 'Graph not found'}), 404
+    data = request.get_json(silent=True) or {}
+    ops, base = data.get('ops'), data.get('baseRevision')
+    if not isinstance(ops, list) or not isinstance(base, int) or isinstance(base, bool):
+        return jsonify({'error': 'Body must be {"baseRevision": n, "ops": [...]}'}), 400
+    if len(ops) > config.GRAPH_MAX_OPS:
+        return jsonify({'error': f'At most {config.GRAPH_MAX_OPS} ops per patch'}), 400
+    with graph_store.locked(graph_id) as graph:
+        if graph is None:
+            return jsonify({'error': 'Graph not found'}), 404
+        if base != graph.revision:
+            return _with_etag(jsonify({'error': 'Graph changed, fetch the patches and retry',
+                                       'revision': graph.revision}), graph), 409
+        try:
+            graph.apply(ops)
+        except PatchError as e:
+            return jsonify({'error': str(e)}), 400
+        graph_store.save(graph)
+        return _with_etag(jsonify({'revision': graph.revision}), graph), 200
+
+
+@blueprint.route('/graphs/<graph_id>/patches', methods=['GET'])
+def graph_patches(graph_id):
+    graph = graph_store.get(graph_id) if GRAPH_ID_RE.match(graph_id) else None
+    if graph is None:
+        return jsonify({'error': 'Graph not found'}), 404
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'error': 'since must be a revision number'}), 400
+    with graph.lock:
+        if _etag_matches(graph):
+            return _not_modified(graph)
+        ops = graph.ops_since(since)
+        if ops is None:  # Too old, start over from the whole graph
+            body = {'revision': graph.revision, 'graph': graph.to_dict()}
+        else:
+            body = {'revision': graph.revision, 'ops': ops}
+        return _with_etag(jsonify(body), graph), 200
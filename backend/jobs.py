@@ -0,0 +1,199 @@
+"""
+Background job queue for the build service.
+
+POST /build only creates a Job and puts it on the queue, a fixed pool of worker threads picks jobs
+off the queue and runs build + upload. The request thread returns the job id straight away and the
+client polls GET /jobs/<id> for state, stage timings and errors.
+
+Requests with the same key (project + build input hash) while a job for it is queued or running are
+attached to that job instead of starting another one (single flight), every caller gets the same job id.
+New jobs are admitted through admission.FairQueue (bounded, round robin over tenants).
+"""
+
+import collections
+import contextlib
+import threading
+import time
+import traceback
+import uuid
+
+import metrics
+from admission import FairQueue, QueueFull
+from events import EventLog
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class Job:
+    """
+    One build+upload run for a project. The worker fills in timings, result and error as it goes.
+    """
+
+    def __init__(self, project_name, target, params=None):
+        self.id = uuid.uuid4().hex
+        self.project_name = project_name
+        self.target = target  # fn(job) doing the actual work
+        self.params = params or {}  # Extra request parameters for `target`
+        self.key = None  # Single flight key, see JobQueue.submit_once()
+        self.waiters = 1  # No. of requests sharing this job
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {}  # Stage name -> duration in seconds
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.events = EventLog()  # Live build output / progress, see GET /jobs/<id>/events
+
+    def emit(self, event_type, data):
+        self.events.emit(event_type, data)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a stage of the job, e.g. `with job.stage('build'): ...`
+        """
+        start = time.perf_counter()
+        self.emit('stage', {'stage': name, 'state': 'started'})
+        try:
+            yield
+        except Exception:
+            metrics.STAGE_ERRORS.inc(stage=name)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            metrics.STAGE_SECONDS.observe(seconds, stage=name)
+            self.stages[name] = round(seconds, 3)
+            self.emit('stage', {'stage': name, 'state': 'finished', 'seconds': self.stages[name]})
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            'id': self.id,
+            'projectName': self.project_name,
+            'state': self.state,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'queuedSeconds': round((self.started_at or now) - self.created_at, 3),
+            'runSeconds': round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            'waiters': self.waiters,
+            'stages': dict(self.stages),
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """
+    Admission controlled queue (see admission.FairQueue) served by `num_workers` daemon threads.
+    Finished jobs are kept (up to `history`) so their status can still be looked up after they are done.
+    """
+
+    def __init__(self, num_workers=2, history=500, max_pending=None, max_per_tenant=None):
+        self._queue = FairQueue(max_pending, max_per_tenant)
+        self._jobs = {}
+        self._inflight = {}  # Single flight key -> queued/running job
+        self._finished = collections.deque()
+        self._history = history
+        self._lock = threading.Lock()
+        self._num_workers = num_workers
+        self._avg_run_seconds = None  # Moving average, for Retry-After
+        self.active = 0  # Workers running a job right now
+        self._workers = []  # Started with the first job, importing app.py (e.g. in a pool process) starts no threads
+
+    def _start_workers(self):
+        for i in range(self._num_workers):
+            worker = threading.Thread(target=self._work, name=f'build-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _enqueue(self, job, tenant):
+        if not self._workers:
+            self._start_workers()
+        try:
+            self._queue.put(tenant or job.project_name, job)
+        except QueueFull as e:
+            e.retry_after = self.retry_after()
+            raise
+
+    def retry_after(self):
+        """
+        Seconds until a queue slot is likely free: one average job per worker round ahead of the caller.
+        """
+        avg = self._avg_run_seconds or 30
+        rounds = self._queue.qsize() // max(self._num_workers, 1) + 1
+        return int(min(max(avg * rounds, 1), 600))
+
+    def submit(self, project_name, target, params=None, tenant=None):
+        """
+        Queue a new job, raises admission.QueueFull when the queue (or the tenant's share) is full.
+        """
+        job = Job(project_name, target, params)
+        with self._lock:
+            self._enqueue(job, tenant)
+            self._jobs[job.id] = job
+        return job
+
+    def submit_once(self, key, project_name, target, params=None, tenant=None):
+        """
+        Like submit(), but if a job with the same `key` is still queued or running, attach to it.
+        Returns (job, created).
+        """
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                job.waiters += 1
+                return job, False
+            job = Job(project_name, target, params)
+            job.key = key
+            self._enqueue(job, tenant)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self.active += 1
+            job.state = RUNNING
+            job.started_at = time.time()
+            job.emit('state', {'state': RUNNING})
+            try:
+                job.result = job.target(job)
+                job.state = SUCCEEDED
+            except Exception as e:
+                job.error = str(e) or e.__class__.__name__
+                job.state = FAILED
+                traceback.print_exc()
+            finally:
+                job.finished_at = time.time()
+                metrics.JOBS.inc(state=job.state)
+                job.emit('done', job.to_dict())
+                job.events.close()
+                job.done.set()
+                self._retire(job)
+
+    def _retire(self, job):
+        with self._lock:
+            self.active -= 1
+            run_seconds = job.finished_at - job.started_at
+            self._avg_run_seconds = run_seconds if self._avg_run_seconds is None else \
+                0.8 * self._avg_run_seconds + 0.2 * run_seconds
+            if job.key is not None and self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            self._finished.append(job.id)
+            while len(self._finished) > self._history:
+                self._jobs.pop(self._finished.popleft(), None)
@@ -0,0 +1,196 @@
+"""
+Load test of the build/deploy API without npm or AWS.
+
+run_build is replaced with a fake that sleeps and writes a synthetic dist tree, s3 with a LocalStorage that
+waits a configurable latency per request (and can fail a share of them). Every concurrency level then
+fires --requests POST /build requests from that many client threads, each client waits for its job to
+finish, and the script prints end to end (request -> job done) latency percentiles, throughput and
+error rate. Queue rejections (429) are counted separately from failures.
+
+Usage:
+    python loadtest.py                                          <=== default grid
+    python loadtest.py --concurrency 1 8 32 --requests 200 --build-seconds 0.5 --files 200 --latency-ms 20
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of `values`, None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def make_fake_build(build_seconds, n_files, file_size):
+    """
+    Stand-in for app.run_build: sleep, then write index.html, a fingerprinted bundle (depends on the
+    build params, like a real build) and `n_files` public files of `file_size` bytes.
+    """
+    def run_build(project_name, build_params=None, out_dir=None, on_output=None):
+        time.sleep(build_seconds)
+        fingerprint = hashlib.sha256(json.dumps(build_params or {}, sort_keys=True).encode()).hexdigest()[:8]
+        os.makedirs(os.path.join(out_dir, 'assets'), exist_ok=True)
+        os.makedirs(os.path.join(out_dir, 'models'), exist_ok=True)
+        with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+            f.write(f'<!doctype html><html><head><script type="module" src="./assets/index-{fingerprint}.js">'
+                    f'</script></head><body><div id="root"></div></body></html>')
+        with open(os.path.join(out_dir, 'assets', f'index-{fingerprint}.js'), 'w') as f:
+            f.write(f'console.log({json.dumps(build_params or {})});\n' * 200)
+        for i in range(n_files):
+            with open(os.path.join(out_dir, 'models', f'model-{i}.bin'), 'wb') as f:
+                f.write(os.urandom(file_size))
+        if on_output:
+            on_output(f'fake build of {project_name} done')
+        return True
+    return run_build
+
+
+def make_latency_storage(root, latency, error_rate):
+    import storage
+
+    class LatencyStorage(storage.LocalStorage):
+        """
+        LocalStorage where every request takes `latency` seconds longer and fails with `error_rate`.
+        """
+
+        def _request(self):
+            time.sleep(latency)
+            if error_rate and random.random() < error_rate:
+                raise IOError('Injected storage error')
+
+        def _put_file(self, local_path, key, extra_args, stats, progress):
+            try:
+                self._request()
+            except IOError as e:
+                stats.error = str(e)
+                stats.started = stats.finished = time.perf_counter()
+                if progress:
+                    progress(key, 0, done=True)
+                return
+            super()._put_file(local_path, key, extra_args, stats, progress)
+
+    for name in ('get_bytes', 'put_bytes', 'list_objects', 'delete_keys', 'copy', 'create_multipart_upload',
+                 'upload_part', 'list_parts', 'complete_multipart_upload'):
+        def wrapper(self, *args, _name=name, **kwargs):
+            self._request()
+            return getattr(storage.LocalStorage, _name)(self, *args, **kwargs)
+        setattr(LatencyStorage, name, wrapper)
+    return LatencyStorage(root)
+
+
+def run_level(client, job_queue, concurrency, n_requests, distinct_builds, timeout):
+    """
+    `n_requests` deploys from `concurrency` client threads. Returns the stats of the level.
+    """
+    latencies, lock = [], threading.Lock()
+    counts = {'ok': 0, 'failed': 0, 'rejected': 0, 'errors': 0}
+    next_request = iter(range(n_requests))
+
+    def client_loop():
+        while True:
+            with lock:
+                i = next(next_request, None)
+            if i is None:
+                return
+            body = {'projectName': f'loadtest-{i}', 'buildParams': {'VITE_BUILD': str(i % distinct_builds)}}
+            start = time.perf_counter()
+            response = client.post('/build', json=body)
+            outcome = 'errors'
+            if response.status_code == 429:
+                outcome = 'rejected'
+            elif response.status_code == 202:
+                job = job_queue.get(response.get_json()['jobId'])
+                if job.done.wait(timeout):
+                    outcome = 'ok' if job.state == 'succeeded' else 'failed'
+            seconds = time.perf_counter() - start
+            with lock:
+                counts[outcome] += 1
+                if outcome == 'ok':
+                    latencies.append(seconds)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'throughput': counts['ok'] / elapsed,
+        'error_rate': (counts['failed'] + counts['errors']) / n_requests,
+        **counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test POST /build with a fake builder and object store.')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=50, help='Requests per concurrency level')
+    parser.add_argument('--build-seconds', type=float, default=0.2, help='Duration of a fake build')
+    parser.add_argument('--files', type=int, default=20, help='Files in the synthetic dist tree')
+    parser.add_argument('--file-size', type=int, default=16 * 1024, help='Bytes per synthetic file')
+    parser.add_argument('--distinct-builds', type=int, default=4, help='Distinct buildParams (the rest are cache hits)')
+    parser.add_argument('--latency-ms', type=float, default=10, help='Added latency per storage request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of storage requests that fail')
+    parser.add_argument('--workers', type=int, default=None, help='BUILD_WORKERS of the server (default: config)')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds to wait for a job')
+    args = parser.parse_args()
+
+    # Everything the server writes goes to a scratch folder, config reads these when it is imported
+    scratch = tempfile.mkdtemp(prefix='deploy-loadtest-')
+    web_app = os.path.join(scratch, 'web-app')
+    os.makedirs(os.path.join(web_app, 'src'))
+    with open(os.path.join(web_app, 'src', 'main.js'), 'w') as f:
+        f.write('// load test\n')
+    os.environ.update({
+        'STORAGE_BACKEND': 'local',
+        'LOCAL_STORAGE_DIR': os.path.join(scratch, 'bucket'),
+        'WEB_APP_DIR': web_app,
+        'BUILD_CACHE_DIR': os.path.join(scratch, 'build-cache'),
+        'WORKSPACE_DIR': os.path.join(scratch, 'workspaces'),
+        'MULTIPART_STATE_DIR': os.path.join(scratch, 'multipart-state'),
+    })
+    if args.workers:
+        os.environ['BUILD_WORKERS'] = str(args.workers)
+    os.environ.setdefault('MAX_PENDING_JOBS', str(max(args.requests, 20)))
+    os.environ.setdefault('MAX_PENDING_PER_TENANT', str(max(args.requests, 3)))
+
+    import app
+    import storage
+    app.run_build = make_fake_build(args.build_seconds, args.files, args.file_size)
+    storage._default_storage = make_latency_storage(os.path.join(scratch, 'bucket'), args.latency_ms / 1000,
+                                                    args.error_rate)
+    client = app.app.test_client()
+
+    print(f"{'conc':>6}{'requests':>10}{'ok':>6}{'429':>6}{'failed':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}"
+          f"{'deploys/s':>11}{'error %':>9}")
+    try:
+        for concurrency in args.concurrency:
+            result = run_level(client, app.job_queue, concurrency, args.requests, args.distinct_builds, args.timeout)
+            p = {name: f'{result[name]:.3f}' if result[name] is not None else '-' for name in ('p50', 'p95', 'p99')}
+            print(f"{concurrency:>6}{args.requests:>10}{result['ok']:>6}{result['rejected']:>6}"
+                  f"{result['failed'] + result['errors']:>8}{p['p50']:>9}{p['p95']:>9}{p['p99']:>9}"
+                  f"{result['throughput']:>11.2f}{result['error_rate'] * 100:>9.1f}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Deploy manifest for incremental uploads.
+
+Every deployed version (<tenant>/_v/<version>/, see versions.py) and the shared asset store hold a small
+json object (<prefix>/.deploy-manifest.json) mapping each file's path (relative to dist) to its sha256,
+size and the ETag s3 gave it. A redeploy hashes the local dist and compares it against the manifest of
+the live version: files with the same sha256 are copied server side into the new version, only new or
+changed files are uploaded. Versions are immutable, so nothing is deleted in place; old versions go with
+the retention policy of versions.py. The manifest is written last, a version without one is never
+published.
+"""
+
+import hashlib
+import json
+import os
+
+import config
+
+MANIFEST_NAME = '.deploy-manifest.json'
+MANIFEST_VERSION = 1
+READ_CHUNK = 1024 * 1024
+
+
+def manifest_key(prefix):
+    return f'{prefix}/{MANIFEST_NAME}'
+
+
+def hash_file(path, multipart_threshold=None, multipart_chunksize=None):
+    """
+    Returns (sha256, size, etag) of a file in one pass. The etag is the one s3 assigns: md5 of the body
+    for single-part uploads, md5 of the part md5s plus '-<no. of parts>' for multipart uploads.
+    """
+    multipart_threshold = multipart_threshold or config.MULTIPART_THRESHOLD
+    multipart_chunksize = multipart_chunksize or config.MULTIPART_CHUNKSIZE
+
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    part_md5 = hashlib.md5()
+    part_digests = []
+    part_filled = 0
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            sha256.update(chunk)
+            md5.update(chunk)
+            # Split the chunk on part boundaries for the multipart etag
+            while chunk:
+                take = chunk[:multipart_chunksize - part_filled]
+                part_md5.update(take)
+                part_filled += len(take)
+                chunk = chunk[len(take):]
+                if part_filled == multipart_chunksize:
+                    part_digests.append(part_md5.digest())
+                    part_md5 = hashlib.md5()
+                    part_filled = 0
+
+    if size < multipart_threshold:
+        etag = md5.hexdigest()
+    else:
+        if part_filled:
+            part_digests.append(part_md5.digest())
+        etag = f'{hashlib.md5(b"".join(part_digests)).hexdigest()}-{len(part_digests)}'
+    return sha256.hexdigest(), size, etag
+
+
+def build_manifest(dist_folder):
+    """
+    Manifest of a local build output: {relative path: {'sha256', 'size', 'etag'}}
+    """
+    files = {}
+    for root, dirs, names in os.walk(dist_folder):
+        for name in names:
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, dist_folder).replace(os.sep, '/')
+            sha256, size, etag = hash_file(path)
+            files[rel_path] = {'sha256': sha256, 'size': size, 'etag': etag}
+    return files
+
+
+def load_manifest(storage, prefix):
+    """
+    Manifest stored under the prefix, {} when the prefix was never deployed (or the manifest is unreadable).
+    """
+    data = storage.get_bytes(manifest_key(prefix))
+    if not data:
+        return {}
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+
+def save_manifest(storage, prefix, files):
+    body = json.dumps({'version': MANIFEST_VERSION, 'files': files}, sort_keys=True).encode()
+    storage.put_bytes(manifest_key(prefix), body, {'ContentType': 'application/json', 'CacheControl': 'no-cache'})
+
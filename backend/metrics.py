@@ -0,0 +1,180 @@
+"""
+In-process metrics for GET /metrics (Prometheus text format, version 0.0.4).
+
+Counters and histograms are plain numbers behind one lock per metric, updating them is a dict lookup
+and an add, cheap enough for the per-file upload path. Gauges that mirror state kept elsewhere (queue
+depth, busy workers) are read through a callback when /metrics is scraped instead of being updated.
+
+    STAGE_SECONDS{stage}        : histogram of every job.stage() ('hash', 'build', 'upload', ...)
+    STAGE_ERRORS{stage}         : stages that raised
+    UPLOAD_BYTES / UPLOAD_FILES : what upload_files() sent, by storage backend
+    UPLOAD_FILE_SECONDS         : per-file upload latency
+    CACHE_LOOKUPS{cache,result} : build cache and shared asset store hits/misses, the ratio is exported too
+"""
+
+import bisect
+import threading
+
+# Seconds, from a cached asset upload to a cold npm build
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}' for key, value in values]
+
+
+class Gauge(_Metric):
+    """
+    Read at scrape time: `fn()` returns a number, or {label values tuple: number} for a labelled gauge.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, fn, labels=()):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def _samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # Label values -> [count per bucket (non cumulative) + overflow, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def _samples(self):
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = [('le', _format_value(float(bound)))]
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(round(total, 6))}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+def render():
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = Histogram('deploy_stage_duration_seconds', 'Duration of job stages (hash, build, upload, ...).',
+                          labels=('stage',))
+STAGE_ERRORS = Counter('deploy_stage_errors_total', 'Job stages that failed.', labels=('stage',))
+JOBS = Counter('deploy_jobs_total', 'Finished jobs by final state.', labels=('state',))
+UPLOAD_BYTES = Counter('deploy_upload_bytes_total', 'Bytes uploaded to storage.', labels=('backend',))
+UPLOAD_FILES = Counter('deploy_upload_files_total', 'Files uploaded to storage.', labels=('backend', 'result'))
+UPLOAD_FILE_SECONDS = Histogram('deploy_upload_file_seconds', 'Upload latency of a single file.', labels=('backend',))
+CACHE_LOOKUPS = Counter('deploy_cache_lookups_total', 'Build cache and shared asset store lookups.',
+                        labels=('cache', 'result'))
+
+
+def _cache_hit_ratio():
+    with CACHE_LOOKUPS._lock:
+        values = dict(CACHE_LOOKUPS._values)
+    ratios = {}
+    for cache in {cache for cache, _ in values}:
+        hits, misses = values.get((cache, 'hit'), 0), values.get((cache, 'miss'), 0)
+        ratios[(cache,)] = round(hits / (hits + misses), 4) if hits + misses else 0
+    return ratios
+
+
+Gauge('deploy_cache_hit_ratio', 'Hits / lookups of the build cache and the shared asset store.', _cache_hit_ratio,
+      labels=('cache',))
+
+
+def observe_upload(report, backend):
+    """
+    Count the files of an UploadReport (see uploader.py).
+    """
+    for stats in report.files:
+        if stats.error:
+            UPLOAD_FILES.inc(backend=backend, result='error')
+            continue
+        UPLOAD_FILES.inc(backend=backend, result='ok')
+        UPLOAD_BYTES.inc(stats.size, backend=backend)
+        UPLOAD_FILE_SECONDS.observe(stats.seconds, backend=backend)
@@ -0,0 +1,225 @@
+"""
+Resumable multipart uploads for big files (.glb models, textures).
+
+Files of at least MULTIPART_THRESHOLD bytes are uploaded in MULTIPART_CHUNKSIZE parts, MULTIPART_CONCURRENCY
+parts at a time. After every finished part the upload's state (upload id + part etags) is written to
+MULTIPART_STATE_DIR, keyed on the file's content, so when a job is retried after a network error or a
+restart the parts s3 already has are skipped and only the rest goes out again.
+
+Every part is sent with its md5 (Content-MD5, s3 rejects a part whose body doesn't match) and the etag
+s3 answers with has to be that md5, the completed object's etag has to be the multipart etag of the
+local file (see manifest.hash_file). A part that fails either check is sent again, up to
+MULTIPART_PART_RETRIES times.
+
+A retried deploy uploads to a new version prefix (see versions.py): an upload resumed for a different
+key is completed at its original key and then copied server side.
+
+A state file belongs to one running upload at a time: when the same file is uploaded twice at once (the
+same build deployed to two tenants, two /build calls), the second upload gets a state file of its own
+(<...>.1.json, <...>.2.json) instead of resuming the first one's live upload.
+
+The storage backend provides the s3 multipart calls (create_multipart_upload, upload_part, list_parts,
+complete_multipart_upload, abort_multipart_upload), S3Storage and LocalStorage both do.
+"""
+
+import base64
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+
+import config
+import manifest
+import uploader
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def multipart_etag(part_md5s):
+    """
+    etag s3 assigns to a completed multipart upload: md5 of the part md5s + '-<no. of parts>'.
+    """
+    return f'{hashlib.md5(b"".join(part_md5s)).hexdigest()}-{len(part_md5s)}'
+
+
+_active_paths = set()  # State files owned by a running upload of this process
+_active_lock = threading.Lock()
+
+
+class UploadState:
+    """
+    Persisted progress of one multipart upload, <MULTIPART_STATE_DIR>/<storage id>-<sha256>-<part size>.json
+    (.<n>.json for uploads of the same file running at the same time). Call release() when done.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, storage_id, sha256, size, part_size):
+        """
+        Claim the first state file of the file no running upload owns, and load it.
+        """
+        base = os.path.join(config.MULTIPART_STATE_DIR,
+                            f'{hashlib.sha256(storage_id.encode()).hexdigest()[:16]}-{sha256}-{part_size}')
+        with _active_lock:
+            slot = 0
+            while (path := f'{base}.{slot}.json' if slot else f'{base}.json') in _active_paths:
+                slot += 1
+            _active_paths.add(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            data = None
+        if not data or data.get('size') != size:
+            data = {'size': size, 'partSize': part_size, 'key': None, 'uploadId': None, 'parts': {}}
+        return cls(path, data)
+
+    @property
+    def parts(self):
+        return {int(number): etag for number, etag in self.data['parts'].items()}
+
+    def started(self, key, upload_id):
+        self.data.update(key=key, uploadId=upload_id, parts={})
+        self.save()
+
+    def part_done(self, number, etag):
+        with self._lock:
+            self.data['parts'][str(number)] = etag
+            self.save()
+
+    def save(self):
+        os.makedirs(config.MULTIPART_STATE_DIR, exist_ok=True)
+        tmp = f'{self.path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def release(self):
+        with _active_lock:
+            _active_paths.discard(self.path)
+
+
+def _read_part(local_path, number, part_size):
+    with open(local_path, 'rb') as f:
+        f.seek((number - 1) * part_size)
+        return f.read(part_size)
+
+
+def _send_part(storage, key, upload_id, local_path, number, part_size):
+    """
+    Upload one part and check the etag s3 answers with against its md5. Returns the etag.
+    """
+    data = _read_part(local_path, number, part_size)
+    digest = hashlib.md5(data).digest()
+    last_error = None
+    for attempt in range(config.MULTIPART_PART_RETRIES + 1):
+        if attempt:
+            time.sleep(min(2 ** attempt * 0.1, 5))
+        try:
+            etag = storage.upload_part(key, upload_id, number, data, base64.b64encode(digest).decode())
+        except Exception as e:
+            last_error = e
+            continue
+        if etag == digest.hex():
+            return etag
+        last_error = ChecksumMismatch(f'Part {number} of {key}: etag {etag}, expected {digest.hex()}')
+    raise last_error
+
+
+def upload_file(storage, local_path, key, extra_args=None, stats=None, progress=None):
+    """
+    Upload one big file as a resumable multipart upload, returns the etag of the object.
+    `stats` (uploader.FileStats) gets the timings, `progress(key, bytes, done=False)` the bytes sent.
+    """
+    part_size = config.MULTIPART_CHUNKSIZE
+    sha256, size, expected_etag = manifest.hash_file(local_path, config.MULTIPART_THRESHOLD, part_size)
+    state = UploadState.load(storage.storage_id, sha256, size, part_size)
+    try:
+        return _upload(storage, state, local_path, key, extra_args, stats, progress, part_size, size, expected_etag)
+    finally:
+        state.release()
+
+
+def _upload(storage, state, local_path, key, extra_args, stats, progress, part_size, size, expected_etag):
+    """
+    upload_file() with the state file claimed.
+    """
+    n_parts = max(1, -(-size // part_size))
+    if stats is not None:
+        stats.started = time.perf_counter()
+
+    # Parts of an earlier attempt count only if the store still has them with the same etag
+    done = {}
+    if state.data['uploadId']:
+        remote = storage.list_parts(state.data['key'], state.data['uploadId'])
+        if remote is None:
+            state.data['uploadId'] = None  # Completed, aborted or expired in the meantime
+        else:
+            done = {number: etag for number, etag in state.parts.items() if remote.get(number) == etag}
+    if not state.data['uploadId']:
+        state.started(key, storage.create_multipart_upload(key, extra_args))
+    upload_key, upload_id = state.data['key'], state.data['uploadId']
+    if done and progress:
+        progress(key, sum(min(part_size, size - (number - 1) * part_size) for number in done))
+
+    def send(number):
+        etag = _send_part(storage, upload_key, upload_id, local_path, number, part_size)
+        state.part_done(number, etag)
+        if progress:
+            progress(key, min(part_size, size - (number - 1) * part_size))
+        return etag
+
+    todo = [number for number in range(1, n_parts + 1) if number not in done]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=config.MULTIPART_CONCURRENCY) as pool:
+        for number, etag in zip(todo, pool.map(send, todo)):
+            done[number] = etag
+
+    etag = storage.complete_multipart_upload(upload_key, upload_id, sorted(done.items()))
+    state.remove()
+    if etag != expected_etag:
+        storage.delete_keys([upload_key])
+        raise ChecksumMismatch(f'{key}: etag {etag} after upload, expected {expected_etag}')
+    if upload_key != key:
+        storage.copy(upload_key, key, extra_args)
+        storage.delete_keys([upload_key])
+    if stats is not None:
+        stats.finished = time.perf_counter()
+    if progress:
+        progress(key, 0, done=True)
+    return etag
+
+
+def upload_files(storage, items, report, progress=None):
+    """
+    upload_file() for each of the (local_path, key, extra_args) `items`, one file after the other (the parts
+    of a file go out in parallel). Adds a FileStats per file to `report`, failures are recorded on it.
+    """
+    for local_path, key, extra_args in items:
+        stats = uploader.FileStats(key, os.path.getsize(local_path))
+        report.files.append(stats)
+        try:
+            upload_file(storage, local_path, key, extra_args, stats, progress)
+        except Exception as e:
+            stats.error = str(e) or e.__class__.__name__
+            stats.finished = time.perf_counter()
+            if progress:
+                progress(key, 0, done=True)
+    return report
+
+
+def is_large(local_path):
+    return os.path.getsize(local_path) >= config.MULTIPART_THRESHOLD
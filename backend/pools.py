@@ -0,0 +1,31 @@
+"""
+Process pools for the CPU bound work (compression, floorplan clustering).
+
+The server is multi threaded (Flask, the job workers, boto3 and the uploader's TransferManager), forking
+it copies locks other threads hold into the child, where nobody ever releases them. Pools therefore start
+their processes from a forkserver: a single threaded process started once, that imports the main module
+(app.py) once and forks the pool processes from there. Pools are shut down at exit, before the interpreter
+tears down the modules they use.
+
+    pool = pools.process_pool(max_workers=4)
+"""
+
+import atexit
+import concurrent.futures
+import multiprocessing
+import weakref
+
+_context = multiprocessing.get_context('forkserver')
+_pools = weakref.WeakSet()
+
+
+def process_pool(max_workers):
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=_context)
+    _pools.add(pool)
+    return pool
+
+
+@atexit.register
+def shutdown():
+    for pool in list(_pools):
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,104 @@
+"""
+Content-addressed asset store shared by all tenants.
+
+vite fingerprints its bundles (assets/index-CPhCYaEi.js), so a file with the same name has the same
+content no matter which tenant built it. Those files are uploaded once under SHARED_ASSETS_PREFIX and
+each tenant's index.html is rewritten to point there, only the tenant specific files (index.html,
+public/ files, ...) go under the tenant prefix.
+
+The shared prefix keeps its own manifest (same format as the tenant ones), so a bundle already in the
+store is never uploaded again. If a name is ever reused for different content, that file just stays
+tenant local.
+"""
+
+import os
+import re
+import threading
+
+import compression
+import config
+import manifest
+import metrics
+from events import UploadProgress
+
+SHARED_PREFIX = config.SHARED_ASSETS_PREFIX
+FINGERPRINT_RE = re.compile(r'^assets/[^/]+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')  # vite's [name]-[hash].[ext]
+ASSET_REF_RE = re.compile(r'''(["'(=])(?:\./|/)?(assets/[^"'()\s>]+)''')  # src="./assets/..", href=/assets/.., url(assets/..)
+
+_manifest_lock = threading.Lock()  # Jobs in this process merge into the shared manifest one at a time
+
+
+def is_fingerprinted(path):
+    return FINGERPRINT_RE.match(path) is not None
+
+
+def publish_shared_assets(storage, dist_folder, local_files, staging_dir, emit=None):
+    """
+    Upload the fingerprinted files of a build that the shared store doesn't have yet (compressed, with
+    cache headers, see compression.py). Returns (paths served from the shared store, UploadReport of the
+    new ones). `emit(type, data)` receives upload progress events.
+    """
+    candidates = {path: entry for path, entry in local_files.items() if is_fingerprinted(path)}
+
+    known = manifest.load_manifest(storage, SHARED_PREFIX)
+    shared, missing = set(), {}
+    for path, entry in candidates.items():
+        if path not in known:
+            missing[path] = (os.path.join(dist_folder, *path.split('/')), entry)
+            shared.add(path)
+            metrics.CACHE_LOOKUPS.inc(cache='assets', result='miss')
+        elif known[path]['sha256'] == entry['sha256']:
+            shared.add(path)
+            metrics.CACHE_LOOKUPS.inc(cache='assets', result='hit')
+
+    uploads = compression.prepare(missing, staging_dir)
+    items = [(source, f'{SHARED_PREFIX}/{path}', extra_args) for path, (source, entry, extra_args) in uploads.items()]
+    report = storage.upload_files(items, UploadProgress(emit, 'shared', items) if emit else None)
+    if report.errors:
+        raise RuntimeError(f'Upload of {len(report.errors)} shared assets failed, first: {report.errors[0].error}')
+
+    if uploads:
+        with _manifest_lock:
+            # Re-read so bundles published by other jobs in the meantime aren't dropped
+            known = manifest.load_manifest(storage, SHARED_PREFIX)
+            known.update(compression.manifest_of(uploads))
+            manifest.save_manifest(storage, SHARED_PREFIX, known)
+
+    return shared, report
+
+
+def rewrite_html(html, shared):
+    """
+    Point references to assets/<file> at the shared store for every file in `shared`.
+    """
+    def replace(match):
+        quote, path = match.groups()
+        if path not in shared:
+            return match.group(0)
+        return f'{quote}{config.SHARED_ASSETS_URL}/{path}'
+    return ASSET_REF_RE.sub(replace, html)
+
+
+def stage_tenant_files(dist_folder, local_files, shared, staging_dir):
+    """
+    Files that go under the tenant prefix as {relative path: (local source path, manifest entry)}.
+    html files referencing shared assets are rewritten into `staging_dir` and re-hashed.
+    """
+    tenant_files = {}
+    for path, entry in local_files.items():
+        if path in shared:
+            continue
+        source = os.path.join(dist_folder, *path.split('/'))
+        if path.endswith('.html') and shared:
+            with open(source, encoding='utf-8') as f:
+                html = f.read()
+            rewritten = rewrite_html(html, shared)
+            if rewritten != html:
+                source = os.path.join(staging_dir, *path.split('/'))
+                os.makedirs(os.path.dirname(source), exist_ok=True)
+                with open(source, 'w', encoding='utf-8') as f:
+                    f.write(rewritten)
+                sha256, size, etag = manifest.hash_file(source)
+                entry = {'sha256': sha256, 'size': size, 'etag': etag}
+        tenant_files[path] = (source, entry)
+    return tenant_files
@@ -0,0 +1,141 @@
+"""
+Local multi-tenant static file server.
+
+Serves the bucket layout (<tenant>/index.html, <tenant>/..., _shared/assets/...) from a folder, either
+the local storage backend (STORAGE_BACKEND=local deploys there) or any folder with the same layout such
+as a build output, like the s3 website endpoint does:
+    * <tenant>/ serves <tenant>/index.html, <tenant> redirects to <tenant>/
+    * ContentType / ContentEncoding / CacheControl the object was uploaded with (inferred for plain folders)
+    * ETag + If-None-Match (304) and byte ranges (206) for big .glb/.png files
+    * precompressed variants: <key>.br when the client accepts br, <key>.gz for plain folders, and gzip
+      objects are decoded on the fly for the rare client that doesn't accept gzip
+    * files are handed to the WSGI server's file_wrapper (sendfile on gunicorn/uwsgi), set
+      SITES_X_SENDFILE=1 behind nginx/apache to hand them off with X-Sendfile instead
+
+Run standalone (sites at the root, as on s3):
+    python static_server.py --root .local-bucket --port 8080
+or SERVE_SITES=1 python app.py mounts it next to the build API.
+"""
+
+import argparse
+import gzip
+import os
+
+from flask import Blueprint, Flask, Response, abort, redirect, request, send_file
+
+import compression
+import config
+from storage import LocalStorage
+
+blueprint = Blueprint('sites', __name__)
+
+STREAM_CHUNK = 64 * 1024
+
+_stores = {}
+
+
+def _store(root):
+    if root not in _stores:
+        _stores[root] = LocalStorage(root)
+    return _stores[root]
+
+
+def accepted_encodings(header):
+    """
+    Content codings with q > 0 in an Accept-Encoding header.
+    """
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    if '*' in accepted:
+        accepted.update({'gzip', 'br'})
+    return accepted
+
+
+def _decoded(path, encoding):
+    """
+    Stream a gzip object decoded, for clients that don't accept gzip.
+    """
+    def stream():
+        with gzip.open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK), b''):
+                yield chunk
+    if encoding != 'gzip':
+        abort(406)
+    return Response(stream())
+
+
+@blueprint.route('/', defaults={'key': ''})
+@blueprint.route('/<path:key>')
+def serve(key):
+    root = config.SITE_ROOT
+    if any(part.startswith('.') for part in key.split('/')):
+        abort(404)  # Manifests, metadata and temp files aren't public
+    if key == '' or key.endswith('/'):
+        key += 'index.html'
+
+    store = _store(root)
+    try:
+        path = store.path_for(key)
+    except ValueError:
+        abort(404)
+    if os.path.isdir(path):
+        return redirect(request.path + '/', 302)
+    if not os.path.isfile(path):
+        abort(404)
+
+    meta = store.metadata(key)
+    stored_encoding = meta.get('ContentEncoding')
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+
+    serve_path, encoding = path, stored_encoding
+    if 'br' in accepted and os.path.isfile(path + '.br'):
+        serve_path, encoding = path + '.br', 'br'
+    elif stored_encoding is None and 'gzip' in accepted and os.path.isfile(path + '.gz'):
+        serve_path, encoding = path + '.gz', 'gzip'
+
+    tenant_path = key.split('/', 1)[1] if '/' in key else key
+    mimetype = meta.get('ContentType') or compression.content_type(key)
+    cache_control = meta.get('CacheControl') or compression.cache_control(tenant_path)
+
+    if encoding and encoding not in accepted:
+        response = _decoded(serve_path, encoding)
+        response.mimetype = mimetype
+    else:
+        stat = os.stat(serve_path)
+        etag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}' + (f'-{encoding}' if encoding else '')
+        # conditional=True answers If-None-Match with 304 and Range with 206
+        response = send_file(serve_path, mimetype=mimetype, conditional=True, etag=etag)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def create_app(root=None):
+    app = Flask(__name__)
+    if root:
+        config.SITE_ROOT = os.path.abspath(root)
+    app.config['USE_X_SENDFILE'] = config.SITES_X_SENDFILE
+    app.register_blueprint(blueprint)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve deployed tenants from a local folder.')
+    parser.add_argument('--root', default=None, help='Folder with the bucket layout (default: SITE_ROOT)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    create_app(args.root).run(host=args.host, port=args.port, threaded=True)
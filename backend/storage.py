@@ -0,0 +1,399 @@
+"""
+Object stores a deploy can be written to.
+
+S3Storage is the real bucket, LocalStorage keeps the same key layout in a folder on disk so deploys can
+be exercised and benchmarked offline (STORAGE_BACKEND=local). Both implement Storage:
+
+    upload_files(items)   : parallel upload of (local_path, key, extra_args) tuples, returns an UploadReport
+                            (optional progress(key, bytes, done=False) callback)
+    get_bytes(key)        : object body or None if the key doesn't exist
+    put_bytes(key, data)  : small single-request write (manifests, pointers)
+    list_objects(prefix)  : {key: etag} of every object under the prefix
+    delete_keys(keys)     : batched delete, returns no. of keys deleted
+    copy(src, dst)        : server side copy, no bytes go through this machine on s3
+
+Files of at least MULTIPART_THRESHOLD bytes are uploaded with multipart.upload_files() (resumable, checksummed
+parts) on top of the multipart calls: create_multipart_upload, upload_part, list_parts,
+complete_multipart_upload, abort_multipart_upload.
+"""
+
+import base64
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import config
+import manifest
+import metrics
+import multipart
+import uploader
+
+DELETE_BATCH_SIZE = 1000  # Max. keys per s3 delete_objects call
+METADATA_ARGS = ('ContentType', 'ContentEncoding', 'CacheControl')  # extra_args LocalStorage keeps per object
+
+
+def batched(keys, size=DELETE_BATCH_SIZE):
+    keys = list(keys)
+    for i in range(0, len(keys), size):
+        yield keys[i:i + size]
+
+
+class Storage:
+    name = None
+    storage_id = None  # Identifies the bucket/folder, multipart upload state is kept per storage
+
+    def upload_files(self, items, progress=None):
+        items = list(items)
+        small = [item for item in items if not multipart.is_large(item[0])]
+        report = self._upload_files(small, progress)
+        multipart.upload_files(self, [item for item in items if multipart.is_large(item[0])], report, progress)
+        report.finished = time.perf_counter()
+        metrics.observe_upload(report, self.name)
+        return report
+
+    def _upload_files(self, items, progress=None):
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release what the storage holds on its own (an S3Storage's own TransferManager).
+        """
+
+    def get_bytes(self, key):
+        raise NotImplementedError
+
+    def put_bytes(self, key, data, extra_args=None):
+        raise NotImplementedError
+
+    def list_objects(self, prefix):
+        raise NotImplementedError
+
+    def delete_keys(self, keys):
+        raise NotImplementedError
+
+    def copy(self, src_key, dst_key, extra_args=None):
+        raise NotImplementedError
+
+    def create_multipart_upload(self, key, extra_args=None):
+        raise NotImplementedError
+
+    def upload_part(self, key, upload_id, part_number, data, content_md5):
+        raise NotImplementedError
+
+    def list_parts(self, key, upload_id):
+        """
+        {part number: etag} of an upload in progress, None if the upload doesn't exist (anymore).
+        """
+        raise NotImplementedError
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        raise NotImplementedError
+
+    def abort_multipart_upload(self, key, upload_id):
+        raise NotImplementedError
+
+
+class S3Storage(Storage):
+    name = 's3'
+
+    def __init__(self, bucket=None, client=None, concurrency=None):
+        self.bucket = bucket or config.BUCKET_NAME
+        self.storage_id = f's3://{self.bucket}'
+        self.client = client or uploader.get_s3_client()
+        # Own TransferManager only when a concurrency is asked for (benchmarks), jobs share the default one
+        self.manager = uploader.create_transfer_manager(concurrency, self.client) if concurrency else None
+
+    def _upload_files(self, items, progress=None):
+        return uploader.upload_files(items, self.bucket, progress, self.manager)
+
+    def close(self):
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+
+    def get_bytes(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def put_bytes(self, key, data, extra_args=None):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **(extra_args or {}))
+
+    def list_objects(self, prefix):
+        objects = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f'{prefix}/'):
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = obj['ETag'].strip('"')
+        return objects
+
+    def delete_keys(self, keys):
+        deleted = 0
+        for batch in batched(keys):
+            response = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+            errors = response.get('Errors', [])
+            if errors:
+                raise RuntimeError(f"Delete failed for {len(errors)} keys, first: {errors[0]}")
+            deleted += len(batch)
+        return deleted
+
+    def copy(self, src_key, dst_key, extra_args=None):
+        # Managed copy, switches to multipart copy for big objects. Without extra_args the source's
+        # metadata (ContentType, ContentEncoding, CacheControl) is kept
+        self.client.copy({'Bucket': self.bucket, 'Key': src_key}, self.bucket, dst_key,
+                         ExtraArgs=dict(extra_args, MetadataDirective='REPLACE') if extra_args else None)
+
+    def create_multipart_upload(self, key, extra_args=None):
+        return self.client.create_multipart_upload(Bucket=self.bucket, Key=key, **(extra_args or {}))['UploadId']
+
+    def upload_part(self, key, upload_id, part_number, data, content_md5):
+        # s3 answers BadDigest instead of storing a part whose body doesn't match content_md5
+        response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                           Body=data, ContentMD5=content_md5)
+        return response['ETag'].strip('"')
+
+    def list_parts(self, key, upload_id):
+        parts = {}
+        paginator = self.client.get_paginator('list_parts')
+        try:
+            for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+                for part in page.get('Parts', []):
+                    parts[part['PartNumber']] = part['ETag'].strip('"')
+        except self.client.exceptions.NoSuchUpload:
+            return None
+        return parts
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        response = self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': f'"{etag}"'} for number, etag in parts]},
+        )
+        return response['ETag'].strip('"')
+
+    def abort_multipart_upload(self, key, upload_id):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+
+class LocalStorage(Storage):
+    """
+    Bucket stand-in backed by a local folder, key 'a/b.js' is stored at <root>/a/b.js. Object metadata
+    (ContentType, ContentEncoding, CacheControl) is kept as json under <root>/.meta/, so the local static
+    server can serve objects with the same headers s3 would.
+    """
+
+    name = 'local'
+    META_DIR = '.meta'
+    MULTIPART_DIR = '.multipart'  # <upload id>/upload.json + one file per part, until completed
+
+    def __init__(self, root, concurrency=None):
+        self.root = os.path.abspath(root)
+        self.storage_id = f'file://{self.root}'
+        self.concurrency = concurrency or config.UPLOAD_CONCURRENCY
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key):
+        path = os.path.abspath(os.path.join(self.root, *key.split('/')))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f'Key escapes storage root: {key}')
+        return path
+
+    def _meta_path(self, key):
+        return self.path_for(f'{self.META_DIR}/{key}.json')
+
+    def _write_meta(self, key, extra_args):
+        path = self._meta_path(key)
+        if not extra_args:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        data = json.dumps({name: value for name, value in extra_args.items() if name in METADATA_ARGS}).encode()
+        self._write_bytes(path, data)
+
+    def metadata(self, key):
+        """
+        Metadata the object was uploaded with, {} if none.
+        """
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, dest, fill):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f'{dest}.{os.getpid()}.{time.monotonic_ns()}.tmp'
+        fill(tmp)
+        os.replace(tmp, dest)  # Readers never see a half-written object
+
+    def _write_bytes(self, dest, data):
+        def fill(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(data)
+        self._write(dest, fill)
+
+    def _put_file(self, local_path, key, extra_args, stats, progress):
+        stats.started = time.perf_counter()
+        try:
+            self._write(self.path_for(key), lambda tmp: shutil.copyfile(local_path, tmp))
+            self._write_meta(key, extra_args)
+        except Exception as e:
+            stats.error = str(e)
+        stats.finished = time.perf_counter()
+        if progress:
+            progress(key, 0 if stats.error else stats.size, done=True)
+
+    def _upload_files(self, items, progress=None):
+        report = uploader.UploadReport()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for local_path, key, extra_args in items:
+                stats = uploader.FileStats(key, os.path.getsize(local_path))
+                report.files.append(stats)
+                pool.submit(self._put_file, local_path, key, extra_args, stats, progress)
+        report.finished = time.perf_counter()
+        return report
+
+    def get_bytes(self, key):
+        try:
+            with open(self.path_for(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_bytes(self, key, data, extra_args=None):
+        self._write_bytes(self.path_for(key), data)
+        self._write_meta(key, extra_args)
+
+    def list_objects(self, prefix):
+        objects = {}
+        for root, dirs, files in os.walk(self.path_for(prefix)):
+            for file in files:
+                if file.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, file)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                objects[key] = manifest.hash_file(path)[2]  # Same etag s3 would report
+        return objects
+
+    def _prune(self, path):
+        # Drop folders a delete left empty, like a prefix disappears on s3 with its last object
+        parent = os.path.dirname(path)
+        while parent != self.root and parent.startswith(self.root + os.sep):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                return
+            parent = os.path.dirname(parent)
+
+    def delete_keys(self, keys):
+        deleted = 0
+        for key in keys:
+            path = self.path_for(key)
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            self._prune(path)
+            self._write_meta(key, None)
+            self._prune(self._meta_path(key))
+        return deleted
+
+    def copy(self, src_key, dst_key, extra_args=None):
+        src = self.path_for(src_key)
+        self._write(self.path_for(dst_key), lambda tmp: shutil.copyfile(src, tmp))
+        self._write_meta(dst_key, extra_args or self.metadata(src_key))
+
+    def _upload_dir(self, upload_id):
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise ValueError(f'Invalid upload id: {upload_id}')
+        return os.path.join(self.root, self.MULTIPART_DIR, upload_id)
+
+    def create_multipart_upload(self, key, extra_args=None):
+        self.path_for(key)
+        upload_id = uuid.uuid4().hex
+        upload_dir = self._upload_dir(upload_id)
+        os.makedirs(upload_dir)
+        self._write_bytes(os.path.join(upload_dir, 'upload.json'), json.dumps({'key': key, 'extraArgs': extra_args}).encode())
+        return upload_id
+
+    def _upload_info(self, key, upload_id):
+        try:
+            with open(os.path.join(self._upload_dir(upload_id), 'upload.json')) as f:
+                info = json.load(f)
+        except FileNotFoundError:
+            return None
+        return info if info['key'] == key else None
+
+    def upload_part(self, key, upload_id, part_number, data, content_md5):
+        if self._upload_info(key, upload_id) is None:
+            raise KeyError(f'No such upload: {upload_id}')
+        digest = hashlib.md5(data).digest()
+        if base64.b64encode(digest).decode() != content_md5:
+            raise multipart.ChecksumMismatch(f'Part {part_number} of {key} does not match its Content-MD5')
+        self._write_bytes(os.path.join(self._upload_dir(upload_id), f'{part_number}.part'), data)
+        return digest.hex()
+
+    def list_parts(self, key, upload_id):
+        if self._upload_info(key, upload_id) is None:
+            return None
+        parts = {}
+        for name in os.listdir(self._upload_dir(upload_id)):
+            if name.endswith('.part'):
+                with open(os.path.join(self._upload_dir(upload_id), name), 'rb') as f:
+                    parts[int(name[:-5])] = hashlib.md5(f.read()).hexdigest()
+        return parts
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        info = self._upload_info(key, upload_id)
+        if info is None:
+            raise KeyError(f'No such upload: {upload_id}')
+        upload_dir = self._upload_dir(upload_id)
+        digests = []
+
+        def fill(tmp):
+            with open(tmp, 'wb') as out:
+                for number, etag in parts:
+                    with open(os.path.join(upload_dir, f'{number}.part'), 'rb') as f:
+                        data = f.read()
+                    if hashlib.md5(data).hexdigest() != etag:
+                        raise multipart.ChecksumMismatch(f'Part {number} of {key} does not match etag {etag}')
+                    digests.append(bytes.fromhex(etag))
+                    out.write(data)
+        self._write(self.path_for(key), fill)
+        self._write_meta(key, info['extraArgs'])
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return multipart.multipart_etag(digests)
+
+    def abort_multipart_upload(self, key, upload_id):
+        if self._upload_info(key, upload_id) is not None:
+            shutil.rmtree(self._upload_dir(upload_id), ignore_errors=True)
+
+
+_default_storage = None
+
+
+def create_storage(backend=None, concurrency=None):
+    backend = backend or config.STORAGE_BACKEND
+    if backend == 's3':
+        return S3Storage(config.BUCKET_NAME, concurrency=concurrency)
+    if backend == 'local':
+        return LocalStorage(config.LOCAL_STORAGE_DIR, concurrency=concurrency)
+    raise ValueError(f'Unknown storage backend: {backend}')
+
+
+def get_default_storage():
+    """
+    Storage deploys go to unless a caller passes its own (STORAGE_BACKEND from config).
+    """
+    global _default_storage
+    if _default_storage is None:
+        _default_storage = create_storage()
+    return _default_storage
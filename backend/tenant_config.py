@@ -0,0 +1,82 @@
+"""
+Deploy-time tenant configuration.
+
+One generic build serves every tenant, what differs per tenant (project name, model urls, viewer
+settings, ...) is written at deploy time into two small files instead of being baked in by vite:
+    * config.json next to index.html, for fetch('./config.json')
+    * an inline <script>window.__TENANT_CONFIG__ = {...}</script> in index.html, so the app has its
+      config on first paint without an extra request
+
+With the rest of the build unchanged, a redeploy with a new config uploads just these two files.
+"""
+
+import json
+import os
+
+import manifest
+
+CONFIG_FILE = 'config.json'
+GLOBAL_NAME = 'window.__TENANT_CONFIG__'
+MAX_CONFIG_BYTES = 64 * 1024
+_SCRIPT_ESCAPES = str.maketrans({'<': '\\u003c', '>': '\\u003e', '&': '\\u0026'})
+
+
+def validate(tenant_config):
+    """
+    Error message for an invalid config from a request, None if it is fine.
+    """
+    if tenant_config is None:
+        return None
+    if not isinstance(tenant_config, dict):
+        return 'config must be a json object'
+    if len(json.dumps(tenant_config)) > MAX_CONFIG_BYTES:
+        return f'config must be smaller than {MAX_CONFIG_BYTES} bytes'
+    if 'modelUrls' in tenant_config and not (
+            isinstance(tenant_config['modelUrls'], list) and all(isinstance(url, str) for url in tenant_config['modelUrls'])):
+        return 'config.modelUrls must be a list of urls'
+    if 'viewer' in tenant_config and not isinstance(tenant_config['viewer'], dict):
+        return 'config.viewer must be a json object'
+    return None
+
+
+def for_tenant(project_name, tenant_config=None):
+    return dict(tenant_config or {}, projectName=project_name)
+
+
+def inject_html(html, tenant_config):
+    """
+    Put the config script in front of the first script of the page (or at the end of <head>).
+    """
+    # "</script", "<!--" or "<script" in a value would change how the html parser reads the script element,
+    # \u003c etc. mean the same thing to js and leave no markup characters in it (json.dumps escapes U+2028/9)
+    payload = json.dumps(tenant_config, sort_keys=True).translate(_SCRIPT_ESCAPES)
+    script = f'<script>{GLOBAL_NAME} = {payload};</script>'
+    lower = html.lower()
+    for marker in ('<script', '</head>'):
+        index = lower.find(marker)
+        if index != -1:
+            return html[:index] + script + html[index:]
+    return script + html
+
+
+def _staged(staging_dir, path, data):
+    dest = os.path.join(staging_dir, *path.split('/'))
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest, 'wb') as f:
+        f.write(data)
+    sha256, size, etag = manifest.hash_file(dest)
+    return dest, {'sha256': sha256, 'size': size, 'etag': etag}
+
+
+def apply(tenant_files, tenant_config, staging_dir):
+    """
+    Add config.json to and inject the config into index.html of `tenant_files`
+    ({path: (source, manifest entry)}, see shared_assets.stage_tenant_files), in place.
+    """
+    tenant_files[CONFIG_FILE] = _staged(staging_dir, CONFIG_FILE, json.dumps(tenant_config, sort_keys=True).encode())
+    if 'index.html' in tenant_files:
+        source, entry = tenant_files['index.html']
+        with open(source, encoding='utf-8') as f:
+            html = f.read()
+        tenant_files['index.html'] = _staged(staging_dir, 'index.html', inject_html(html, tenant_config).encode('utf-8'))
+    return tenant_files
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)  # Modules import each other flat, as when app.py runs from backend/
+
+# config reads these at import, nothing may touch s3 or the real folders
+_scratch = tempfile.mkdtemp(prefix='backend-tests-')
+for name in ('LOCAL_STORAGE_DIR', 'MULTIPART_STATE_DIR', 'BUILD_CACHE_DIR', 'WORKSPACE_DIR'):
+    os.environ[name] = os.path.join(_scratch, name.lower())
+os.environ['STORAGE_BACKEND'] = 'local'
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from admission import FairQueue, QueueFull, Slots
+
+
+def test_round_robin_over_tenants():
+    queue = FairQueue(max_pending=10, max_per_tenant=5)
+    for item in ('a1', 'a2', 'a3'):
+        queue.put('a', item)
+    queue.put('b', 'b1')
+    queue.put('c', 'c1')
+    queue.put('b', 'b2')
+    assert [queue.get() for _ in range(6)] == ['a1', 'b1', 'c1', 'a2', 'b2', 'a3']
+    assert queue.qsize() == 0
+
+
+def test_limits():
+    queue = FairQueue(max_pending=3, max_per_tenant=2)
+    queue.put('a', 1)
+    queue.put('a', 2)
+    with pytest.raises(QueueFull, match='for a'):
+        queue.put('a', 3)
+    queue.put('b', 4)
+    with pytest.raises(QueueFull, match='queue is full'):
+        queue.put('c', 5)
+    assert queue.get() == 1
+    queue.put('a', 3)  # A slot of its own share was freed
+
+
+def test_get_blocks_until_put():
+    queue = FairQueue(max_pending=1, max_per_tenant=1)
+    got = []
+    reader = threading.Thread(target=lambda: got.append(queue.get()))
+    reader.start()
+    time.sleep(0.05)
+    assert not got
+    queue.put('a', 'job')
+    reader.join(5)
+    assert got == ['job']
+
+
+def test_slots_cap_concurrency():
+    slots = Slots('test', 2)
+    peak = []
+    lock = threading.Lock()
+
+    def run():
+        with slots.acquire():
+            with lock:
+                peak.append(slots.active)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=run) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert max(peak) <= 2 and slots.active == 0
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+import app
+import build_cache
+from jobs import JobQueue
+
+
+@pytest.fixture
+def client(monkeypatch):
+    release = threading.Event()
+    ran = []
+
+    def job_target(job):
+        ran.append(job.project_name)
+        release.wait(5)
+        return {}
+
+    monkeypatch.setattr(app, 'build_and_upload_job', job_target)
+    monkeypatch.setattr(app, 'batch_deploy_job', job_target)
+    yield app.app.test_client()
+    release.set()
+
+
+def test_build_dedupes_without_hashing_sources(client, monkeypatch):
+    def no_hashing(*args, **kwargs):
+        raise AssertionError('sources hashed on the request thread')
+
+    monkeypatch.setattr(build_cache, 'build_key', no_hashing)
+    body = {'projectName': 'dedupe-villa', 'buildParams': {'VITE_TITLE': 'a'}}
+    first = client.post('/build', json=body)
+    second = client.post('/build', json=body)
+    other = client.post('/build', json=dict(body, buildParams={'VITE_TITLE': 'b'}))
+    assert first.status_code == second.status_code == other.status_code == 202
+    assert second.get_json()['attached'] and second.get_json()['jobId'] == first.get_json()['jobId']
+    assert not other.get_json()['attached']
+
+
+def test_batches_are_queued_with_their_seed_tenant(client, monkeypatch):
+    monkeypatch.setattr(app, 'job_queue', JobQueue(num_workers=0, max_per_tenant=1))
+
+    def batch(tenants, title):
+        return client.post('/deploy/batch', json={'tenants': tenants, 'buildParams': {'VITE_TITLE': title}})
+
+    assert batch(['a-villa', 'b-villa'], 'one').status_code == 202
+    full = batch(['a-villa', 'c-villa'], 'two')
+    assert full.status_code == 429 and 'Retry-After' in full.headers
+    assert batch(['b-villa', 'a-villa'], 'three').status_code == 202  # Another caller's batch isn't starved
+    assert client.post('/build', json={'projectName': 'a-villa'}).status_code == 429
+
+
+def test_project_names_can_not_shadow_the_api(client):
+    for name in ('jobs', 'metrics', '_shared', '../villa'):
+        response = client.post('/build', json={'projectName': name})
+        assert response.status_code == 400, name
+    assert client.post('/build', json={'projectName': 'villa.v2'}).status_code == 202
@@ -0,0 +1,56 @@
+import os
+import time
+
+import pytest
+
+import build_cache
+import config
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'BUILD_CACHE_DIR', str(tmp_path / 'cache'))
+    root = tmp_path / 'web-app'
+    (root / 'src').mkdir(parents=True)
+    (root / 'src' / 'main.js').write_text('console.log(1)')
+    (root / 'index.html').write_text('<html></html>')
+    (root / 'node_modules').mkdir()
+    return root
+
+
+def test_key_covers_inputs_and_params(web_app):
+    key = build_cache.build_key({'VITE_TITLE': 'a'}, str(web_app))
+    assert build_cache.build_key({'VITE_TITLE': 'a'}, str(web_app)) == key
+    assert build_cache.build_key({'VITE_TITLE': 'b'}, str(web_app)) != key
+    (web_app / 'node_modules' / 'three.js').write_text('not an input')
+    assert build_cache.build_key({'VITE_TITLE': 'a'}, str(web_app)) == key
+    (web_app / 'src' / 'main.js').write_text('console.log(2)')
+    assert build_cache.build_key({'VITE_TITLE': 'a'}, str(web_app)) != key
+
+
+def test_store_lookup_and_evict(web_app, tmp_path):
+    assert build_cache.lookup('a') is None
+    for key in ('a', 'b', 'c'):
+        dist = tmp_path / f'dist-{key}'
+        dist.mkdir()
+        (dist / 'index.html').write_text(key)
+        path = build_cache.store(key, str(dist), move=key == 'c')
+        time.sleep(0.01)
+    assert not os.path.exists(tmp_path / 'dist-c') and os.path.exists(tmp_path / 'dist-a')
+    with open(os.path.join(path, 'index.html')) as f:
+        assert f.read() == 'c'
+    build_cache.lookup('a')  # Now the most recently used
+    build_cache.evict(max_entries=2)
+    assert build_cache.lookup('b') is None
+    assert build_cache.lookup('a') and build_cache.lookup('c')
+
+
+def test_store_keeps_the_first_copy(web_app, tmp_path):
+    for content in ('first', 'second'):
+        dist = tmp_path / content
+        dist.mkdir()
+        (dist / 'index.html').write_text(content)
+        path = build_cache.store('key', str(dist))
+    with open(os.path.join(path, 'index.html')) as f:
+        assert f.read() == 'first'
+    assert os.listdir(config.BUILD_CACHE_DIR) == ['key']
@@ -0,0 +1,45 @@
+import gzip
+import os
+
+import compression
+import config
+
+
+def write(root, path, data):
+    dest = os.path.join(root, *path.split('/'))
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest, 'wb') as f:
+        f.write(data)
+    return dest, {'sha256': path, 'size': len(data), 'etag': 'etag'}
+
+
+def test_headers():
+    assert compression.content_type('assets/index-CPhCYaEi.js') == 'text/javascript'
+    assert compression.content_type('models/villa.glb') == 'model/gltf-binary'
+    assert compression.content_type('unknown.blob') == 'application/octet-stream'
+    assert compression.cache_control('assets/index-CPhCYaEi.js') == compression.IMMUTABLE
+    assert compression.cache_control('index.html') == compression.NO_CACHE
+    assert compression.cache_control('favicon.ico') == config.DEFAULT_CACHE_CONTROL
+
+
+def test_prepare_compresses_text_assets(tmp_path):
+    dist = str(tmp_path / 'dist')
+    bundle = b'export const walls = [];\n' * 200
+    files = {
+        'assets/index-CPhCYaEi.js': write(dist, 'assets/index-CPhCYaEi.js', bundle),
+        'small.css': write(dist, 'small.css', b'body{}'),
+        'random.json': write(dist, 'random.json', os.urandom(4096)),  # Doesn't get smaller
+        'logo.png': write(dist, 'logo.png', b'\x89PNG' * 1000),
+    }
+    uploads = compression.prepare(files, str(tmp_path / 'stage'))
+
+    source, entry, extra_args = uploads['assets/index-CPhCYaEi.js']
+    with open(source, 'rb') as f:
+        assert gzip.decompress(f.read()) == bundle
+    assert extra_args == {'ContentType': 'text/javascript', 'CacheControl': compression.IMMUTABLE, 'ContentEncoding': 'gzip'}
+    assert entry['encoding'] == 'gzip' and entry['size'] == os.path.getsize(source) < len(bundle)
+    assert entry['sha256'] == 'assets/index-CPhCYaEi.js'  # Still the hash of the original
+    for path in ('small.css', 'random.json', 'logo.png'):
+        assert uploads[path][0] == files[path][0] and 'ContentEncoding' not in uploads[path][2]
+    assert ('assets/index-CPhCYaEi.js.br' in uploads) == (compression.brotli is not None)
+    assert compression.manifest_of(uploads)['logo.png'] == files['logo.png'][1]
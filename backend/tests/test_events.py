@@ -0,0 +1,50 @@
+import threading
+
+from events import EventLog, UploadProgress, format_sse
+
+
+def test_follow_from_an_id():
+    log = EventLog(maxlen=10)
+    for i in range(3):
+        log.emit('log', {'line': i})
+    log.close()
+    assert [event[0] for event in log.follow()] == [1, 2, 3]
+    assert list(log.follow(last_id=2)) == [(3, 'log', {'line': 2})]
+    log.emit('log', {'line': 3})  # Ignored once closed
+    assert list(log.follow(last_id=3)) == []
+
+
+def test_slow_reader_gets_a_gap():
+    log = EventLog(maxlen=2)
+    for i in range(5):
+        log.emit('log', {'line': i})
+    log.close()
+    assert list(log.follow()) == [(None, 'gap', {'missed': 3}), (4, 'log', {'line': 3}), (5, 'log', {'line': 4})]
+
+
+def test_follow_waits_for_events_and_heartbeats():
+    log = EventLog(maxlen=10)
+    events = log.follow(heartbeat=0.01)
+    assert next(events) is None
+    threading.Timer(0.05, lambda: (log.emit('state', {'state': 'running'}), log.close())).start()
+    assert [event for event in events if event is not None] == [(1, 'state', {'state': 'running'})]
+
+
+def test_format_sse():
+    assert format_sse((7, 'log', {'line': 'vite v5'})) == 'id: 7\nevent: log\ndata: {"line": "vite v5"}\n\n'
+    assert format_sse((None, 'gap', {'missed': 1})) == 'event: gap\ndata: {"missed": 1}\n\n'
+    assert format_sse(None) == ': keep-alive\n\n'
+
+
+def test_upload_progress_is_throttled(tmp_path):
+    items = []
+    for name in ('a.js', 'b.js', 'c.js'):
+        path = tmp_path / name
+        path.write_bytes(b'x' * 10)
+        items.append((str(path), name, {}))
+    emitted = []
+    progress = UploadProgress(lambda event_type, data: emitted.append(data), 'tenant', items, interval=60)
+    for local_path, key, extra_args in items:
+        progress(key, 10, done=True)
+    assert [data['filesDone'] for data in emitted] == [1, 3]  # The first one and the last one
+    assert emitted[-1]['bytesDone'] == emitted[-1]['bytesTotal'] == 30
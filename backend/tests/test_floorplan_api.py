@@ -0,0 +1,79 @@
+import base64
+import io
+import struct
+
+import pytest
+from flask import Flask
+
+import floorplan_api
+
+CSV = 'xmin,ymin,xmax,ymax,confidence,class,name\n' \
+      '0,0,10,200,0.9,0,wall\n' \
+      '0,195,300,205,0.9,0,wall\n' \
+      '40,40,60,60,0.8,1,door\n'
+
+
+def png_header(width, height):
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', width, height) + b'\x08\x02\0\0\0'
+
+
+def jpeg_header(width, height):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\0' + b'\0' * 9
+    sof0 = b'\xff\xc0' + struct.pack('>HBHH', 11, 8, height, width) + b'\x01\x01\x11\x00'
+    return b'\xff\xd8' + app0 + sof0 + b'\xff\xd9'
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(floorplan_api.blueprint)
+    return app.test_client()
+
+
+def test_image_size():
+    assert floorplan_api.image_size(png_header(1920, 1080)) == (1920, 1080)
+    assert floorplan_api.image_size(jpeg_header(800, 600)) == (800, 600)
+    assert floorplan_api.image_size(b'GIF89a') is None
+
+
+def test_parse_item():
+    assert floorplan_api.parse_item(CSV, eps='12') == (CSV, None, 12.0, floorplan_api.DEFAULT_SCALE_FACTOR)
+    assert floorplan_api.parse_item(CSV, image=png_header(300, 400))[1] == (300.0, 400.0)
+    for kwargs, message in [({}, 'eps or an image'), ({'eps': '-1'}, 'positive'), ({'eps': 'x'}, 'number'),
+                            ({'image': b'GIF89a'}, 'png or jpeg'), ({'size': [300]}, 'imageSize')]:
+        with pytest.raises(ValueError, match=message):
+            floorplan_api.parse_item(CSV, **kwargs)
+    with pytest.raises(ValueError, match='csv is required'):
+        floorplan_api.parse_item(' ', eps=10)
+
+
+def test_graph(client):
+    response = client.post('/floorplan/graph', json={'csv': CSV, 'eps': 20})
+    graph = response.get_json()
+    assert response.status_code == 200, graph
+    assert graph['walls'] == 2 and graph['eps'] == 20 and len(graph['edges']) == 2 and len(graph['nodes']) == 3
+    response = client.post('/floorplan/graph', json={'csv': 'x,y\n1,2\n', 'eps': 20})
+    assert response.status_code == 400 and 'missing columns' in response.get_json()['error']
+
+
+def test_graph_from_an_upload(client):
+    response = client.post('/floorplan/graph', data={
+        'csv': (io.BytesIO(CSV.encode()), 'walls.csv'),
+        'image': (io.BytesIO(png_header(600, 800)), 'plan.png'),
+    })
+    assert response.status_code == 200 and response.get_json()['eps'] == pytest.approx(20)
+
+
+def test_batch_items_fail_on_their_own(client):
+    items = [
+        {'id': 'ok', 'csv': CSV, 'imageSize': [600, 800]},
+        {'id': 'bad', 'csv': CSV},
+        {'id': 'image', 'csv': CSV, 'image': base64.b64encode(png_header(300, 400)).decode()},
+        'not an object',
+    ]
+    response = client.post('/floorplan/graph/batch', json={'items': items})
+    body = response.get_json()
+    assert response.status_code == 200 and body['failed'] == 2
+    assert [(result['id'], result['ok']) for result in body['results']] == [('ok', True), ('bad', False), ('image', True), (3, False)]
+    assert body['results'][2]['graph']['eps'] == pytest.approx(10)
+    assert client.post('/floorplan/graph/batch', json={'items': []}).status_code == 400
@@ -0,0 +1,73 @@
+import pytest
+from flask import Flask
+
+import graph_store
+from storage import LocalStorage
+
+GRAPH = {'nodes': {'a': {'coord': [0, 0]}, 'b': {'coord': [10, 0]}}, 'edges': [['a', 'b']]}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = graph_store.GraphStore(LocalStorage(str(tmp_path)), max_graphs=2)
+    monkeypatch.setattr(graph_store, 'graph_store', store)
+    return store
+
+
+@pytest.fixture
+def client(store):
+    app = Flask(__name__)
+    app.register_blueprint(graph_store.blueprint)
+    return app.test_client()
+
+
+def test_put_get_and_etag(client):
+    assert client.put('/graphs/plan', json=GRAPH).get_json() == {'revision': 1}
+    response = client.get('/graphs/plan')
+    assert response.get_json() == dict(GRAPH, revision=1)
+    assert client.get('/graphs/plan', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/graphs/missing').status_code == 404
+
+
+def test_patch_bumps_revision_and_conflicts_on_stale_base(client):
+    client.put('/graphs/plan', json=GRAPH)
+    ops = [['add', 'c', 10, 10], ['link', 'b', 'c'], ['unlink', 'a', 'b']]
+    assert client.patch('/graphs/plan', json={'baseRevision': 1, 'ops': ops}).get_json() == {'revision': 2}
+    stale = client.patch('/graphs/plan', json={'baseRevision': 1, 'ops': [['remove', 'a']]})
+    assert stale.status_code == 409 and stale.get_json()['revision'] == 2
+    assert client.get('/graphs/plan/patches?since=1').get_json() == {'revision': 2, 'ops': ops}
+    assert client.get('/graphs/plan').get_json()['edges'] == [['b', 'c']]
+
+
+def test_invalid_patch_applies_nothing(client):
+    client.put('/graphs/plan', json=GRAPH)
+    response = client.patch('/graphs/plan', json={'baseRevision': 1, 'ops': [['remove', 'a'], ['move', 'x', 1, 1]]})
+    assert response.status_code == 400
+    assert client.get('/graphs/plan').get_json() == dict(GRAPH, revision=1)
+
+
+@pytest.mark.parametrize('base', [True, False, '1', None])
+def test_base_revision_must_be_an_integer(client, base):
+    client.put('/graphs/plan', json=GRAPH)
+    assert client.patch('/graphs/plan', json={'baseRevision': base, 'ops': []}).status_code == 400
+
+
+def test_least_recently_used_graphs_are_dropped_and_reloaded(client, store):
+    for graph_id in ('one', 'two', 'three'):
+        client.put(f'/graphs/{graph_id}', json=GRAPH)
+    assert len(store) == 2
+    client.patch('/graphs/one', json={'baseRevision': 1, 'ops': [['move', 'a', 5, 5]]})  # Read back from storage
+    assert len(store) == 2
+    assert client.get('/graphs/one').get_json()['nodes']['a'] == {'coord': [5.0, 5.0]}
+    assert client.get('/graphs/one/patches?since=0').get_json()['revision'] == 2
+
+
+def test_graphs_in_use_are_not_dropped(client, store):
+    client.put('/graphs/one', json=GRAPH)
+    held = store.get('one')
+    with held.lock:
+        client.put('/graphs/two', json=GRAPH)
+        client.put('/graphs/three', json=GRAPH)
+    assert not held.evicted
+    with store.locked('one') as graph:
+        assert graph is held
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from admission import QueueFull
+from jobs import FAILED, QUEUED, SUCCEEDED, JobQueue
+
+
+def test_jobs_run_in_the_background():
+    queue = JobQueue(num_workers=1)
+
+    def build(job):
+        with job.stage('build'):
+            return {'project': job.project_name, **job.params}
+
+    job = queue.submit('villa', build, params={'sha': 'abc'})
+    assert job.done.wait(5)
+    assert job.state == SUCCEEDED and job.result == {'project': 'villa', 'sha': 'abc'}
+    assert 'build' in job.stages and queue.get(job.id) is job
+    assert [event[1] for event in job.events.follow()][-1] == 'done'
+
+
+def test_failed_jobs_keep_their_error():
+    def broken(job):
+        raise RuntimeError('npm run build exited with 1')
+
+    job = JobQueue(num_workers=1).submit('villa', broken)
+    assert job.done.wait(5)
+    assert job.state == FAILED and job.error == 'npm run build exited with 1'
+
+
+def test_history_is_bounded():
+    queue = JobQueue(num_workers=1, history=2, max_per_tenant=4)
+    jobs = [queue.submit('villa', lambda job: None) for _ in range(4)]
+    for job in jobs:
+        assert job.done.wait(5)
+    assert [queue.get(job.id) for job in jobs] == [None, None] + jobs[2:]
+
+
+def test_submit_once_attaches_while_in_flight():
+    release = threading.Event()
+    queue = JobQueue(num_workers=1)
+
+    def build(job):
+        release.wait(5)
+
+    first, created = queue.submit_once(('villa', 'abc'), 'villa', build)
+    second, attached = queue.submit_once(('villa', 'abc'), 'villa', build)
+    other, _ = queue.submit_once(('villa', 'def'), 'villa', build)
+    assert created and not attached and second is first and first.waiters == 2
+    assert other is not first
+    release.set()
+    assert first.done.wait(5) and other.done.wait(5)
+    again, created = queue.submit_once(('villa', 'abc'), 'villa', build)  # Finished jobs aren't reused
+    assert created and again is not first
+
+
+def test_full_queue_raises_with_retry_after():
+    queue = JobQueue(num_workers=0, max_pending=2, max_per_tenant=2)
+    queue.submit('villa', lambda job: None)
+    job = queue.submit('loft', lambda job: None)
+    assert job.state == QUEUED and queue.pending() == 2
+    with pytest.raises(QueueFull) as excinfo:
+        queue.submit('house', lambda job: None)
+    assert excinfo.value.retry_after >= 1
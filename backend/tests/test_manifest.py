@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+import manifest
+from storage import LocalStorage
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_single_part_etag_is_the_md5(tmp_path):
+    data = b'<html></html>'
+    sha256, size, etag = manifest.hash_file(write(str(tmp_path / 'index.html'), data), multipart_threshold=1024)
+    assert (sha256, size, etag) == (hashlib.sha256(data).hexdigest(), len(data), hashlib.md5(data).hexdigest())
+
+
+def test_multipart_etag(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, 'READ_CHUNK', 7)  # Read chunks that straddle the part boundaries
+    data = os.urandom(2500)
+    path = write(str(tmp_path / 'model.glb'), data)
+    parts = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+    expected = hashlib.md5(b''.join(hashlib.md5(part).digest() for part in parts)).hexdigest() + '-3'
+    assert manifest.hash_file(path, multipart_threshold=1000, multipart_chunksize=1000)[2] == expected
+    exact = write(str(tmp_path / 'exact.glb'), data[:2000])  # No empty trailing part
+    assert manifest.hash_file(exact, multipart_threshold=1000, multipart_chunksize=1000)[2].endswith('-2')
+
+
+def test_build_manifest_and_round_trip(tmp_path):
+    dist = tmp_path / 'dist'
+    write(str(dist / 'index.html'), b'<html></html>')
+    write(str(dist / 'assets' / 'index-abcdefgh.js'), b'console.log(1)')
+    files = manifest.build_manifest(str(dist))
+    assert sorted(files) == ['assets/index-abcdefgh.js', 'index.html']
+    assert files['index.html']['sha256'] == hashlib.sha256(b'<html></html>').hexdigest()
+
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    assert manifest.load_manifest(storage, 'villa') == {}
+    manifest.save_manifest(storage, 'villa', files)
+    assert manifest.load_manifest(storage, 'villa') == files
+    storage.put_bytes(manifest.manifest_key('villa'), b'{"version": 0, "files": {"a": {}}}')
+    assert manifest.load_manifest(storage, 'villa') == {}  # Unknown format, deploy everything
@@ -0,0 +1,59 @@
+import pytest
+
+import metrics
+import uploader
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, '_registry', [])
+
+
+def test_counter_and_gauge(registry):
+    counter = metrics.Counter('test_total', 'Test counter.', labels=('state',))
+    counter.inc(state='ok')
+    counter.inc(2, state='ok')
+    counter.inc(state='say "hi"\n')
+    metrics.Gauge('test_depth', 'Test gauge.', lambda: 1.5)
+    assert counter.value(state='ok') == 3
+    assert metrics.render().splitlines() == [
+        '# HELP test_total Test counter.',
+        '# TYPE test_total counter',
+        'test_total{state="ok"} 3',
+        'test_total{state="say \\"hi\\"\\n"} 1',
+        '# HELP test_depth Test gauge.',
+        '# TYPE test_depth gauge',
+        'test_depth 1.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = metrics.Histogram('test_seconds', 'Test histogram.', buckets=(1, 0.1))
+    for value in (0.05, 0.1, 0.5, 7):
+        histogram.observe(value)
+    assert metrics.render().splitlines()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        'test_seconds_sum 7.65',
+        'test_seconds_count 4',
+    ]
+
+
+def test_observe_upload():
+    report = uploader.UploadReport()
+    ok, failed = uploader.FileStats('a.js', 100), uploader.FileStats('b.js', 50)
+    ok.started, ok.finished = 0.0, 0.2
+    failed.error = 'AccessDenied'
+    report.files = [ok, failed]
+    before = metrics.UPLOAD_BYTES.value(backend='test'), metrics.UPLOAD_FILES.value(backend='test', result='error')
+    metrics.observe_upload(report, 'test')
+    assert metrics.UPLOAD_BYTES.value(backend='test') == before[0] + 100
+    assert metrics.UPLOAD_FILES.value(backend='test', result='error') == before[1] + 1
+
+
+def test_metrics_endpoint():
+    import app
+    response = app.app.test_client().get('/metrics')
+    assert response.status_code == 200 and response.content_type == metrics.CONTENT_TYPE
+    assert '# TYPE deploy_stage_duration_seconds histogram' in response.get_data(as_text=True)
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+import config
+import manifest
+import multipart
+from storage import LocalStorage
+
+PART = 1000
+
+
+class FlakyStorage(LocalStorage):
+    """
+    LocalStorage that records the parts it is sent and fails the ones in `fail` (once each).
+    """
+
+    def __init__(self, root, fail=(), corrupt=()):
+        super().__init__(root)
+        self.sent = []
+        self.fail = set(fail)
+        self.corrupt = set(corrupt)
+
+    def upload_part(self, key, upload_id, part_number, data, content_md5):
+        self.sent.append(part_number)
+        if part_number in self.fail:
+            self.fail.discard(part_number)
+            raise ConnectionError('connection reset')
+        if part_number in self.corrupt:
+            self.corrupt.discard(part_number)
+            data = data[::-1]  # Body mangled on the way, Content-MD5 no longer matches
+        return super().upload_part(key, upload_id, part_number, data, content_md5)
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'MULTIPART_THRESHOLD', PART)
+    monkeypatch.setattr(config, 'MULTIPART_CHUNKSIZE', PART)
+    monkeypatch.setattr(config, 'MULTIPART_CONCURRENCY', 1)
+    monkeypatch.setattr(config, 'MULTIPART_PART_RETRIES', 1)
+    monkeypatch.setattr(config, 'MULTIPART_STATE_DIR', str(tmp_path / 'state'))
+    path = tmp_path / 'villa.glb'
+    path.write_bytes(os.urandom(4 * PART + 10))
+    return str(path)
+
+
+def test_upload_matches_the_local_etag(model, tmp_path):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    etag = multipart.upload_file(storage, model, 'villa/villa.glb', {'ContentType': 'model/gltf-binary'})
+    assert etag == manifest.hash_file(model)[2] and etag.endswith('-5')
+    with open(model, 'rb') as f:
+        assert storage.get_bytes('villa/villa.glb') == f.read()
+    assert storage.metadata('villa/villa.glb') == {'ContentType': 'model/gltf-binary'}
+    assert not os.listdir(config.MULTIPART_STATE_DIR)
+
+
+def test_resume_sends_only_the_missing_parts(model, tmp_path, monkeypatch):
+    storage = FlakyStorage(str(tmp_path / 'bucket'), fail=[3])
+    monkeypatch.setattr(config, 'MULTIPART_PART_RETRIES', 0)
+    with pytest.raises(ConnectionError):
+        multipart.upload_file(storage, model, 'villa/_v/1/villa.glb')
+    uploaded = set(storage.sent) - {3}
+    assert {1, 2} <= uploaded
+
+    storage.sent = []
+    multipart.upload_file(storage, model, 'villa/_v/2/villa.glb')  # The retried deploy has a new version
+    assert sorted(storage.sent) == sorted({1, 2, 3, 4, 5} - uploaded)
+    with open(model, 'rb') as f:
+        assert storage.get_bytes('villa/_v/2/villa.glb') == f.read()
+    assert storage.get_bytes('villa/_v/1/villa.glb') is None
+
+
+def test_content_md5_mismatch_is_retried(model, tmp_path):
+    storage = FlakyStorage(str(tmp_path / 'bucket'), corrupt=[2])
+    multipart.upload_file(storage, model, 'villa/villa.glb')
+    assert storage.sent == [1, 2, 2, 3, 4, 5]
+
+
+def test_wrong_etags_fail_the_upload(model, tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    monkeypatch.setattr(storage, 'upload_part', lambda *args: 'not-the-md5')
+    with pytest.raises(multipart.ChecksumMismatch):
+        multipart.upload_file(storage, model, 'villa/villa.glb')
+
+
+def test_concurrent_uploads_get_their_own_state(model, tmp_path):
+    sha256, size, etag = manifest.hash_file(model)
+    first = multipart.UploadState.load('bucket', sha256, size, PART)
+    second = multipart.UploadState.load('bucket', sha256, size, PART)
+    assert first.path != second.path and second.path.endswith('.1.json')
+    first.release()
+    second.release()
+    assert multipart.UploadState.load('bucket', sha256, size, PART).path == first.path
@@ -0,0 +1,66 @@
+import os
+
+import config
+import manifest
+import shared_assets
+from storage import LocalStorage
+
+
+def make_dist(root, bundle=b'console.log("villa")'):
+    files = {
+        'index.html': b'<script type="module" src="/assets/index-CPhCYaEi.js"></script><link href="./favicon.ico">',
+        'assets/index-CPhCYaEi.js': bundle,
+        'favicon.ico': b'ico',
+    }
+    for path, data in files.items():
+        dest = os.path.join(root, *path.split('/'))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, 'wb') as f:
+            f.write(data)
+    return manifest.build_manifest(root)
+
+
+def test_is_fingerprinted():
+    assert shared_assets.is_fingerprinted('assets/index-CPhCYaEi.js')
+    assert shared_assets.is_fingerprinted('assets/vendor.three-B1_x-9aQ.css')
+    assert not shared_assets.is_fingerprinted('assets/logo.png')
+    assert not shared_assets.is_fingerprinted('index-CPhCYaEi.js')
+
+
+def test_rewrite_html():
+    html = '<script src="./assets/index-CPhCYaEi.js"></script><a href=/assets/other-DDDDDDDD.js>' \
+           '<style>body{background:url(assets/bg-EEEEEEEE.png)}</style>'
+    rewritten = shared_assets.rewrite_html(html, {'assets/index-CPhCYaEi.js', 'assets/bg-EEEEEEEE.png'})
+    assert f'src="{config.SHARED_ASSETS_URL}/assets/index-CPhCYaEi.js"' in rewritten
+    assert f'url({config.SHARED_ASSETS_URL}/assets/bg-EEEEEEEE.png)' in rewritten
+    assert 'href=/assets/other-DDDDDDDD.js' in rewritten
+
+
+def test_bundles_are_published_once(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    dist = str(tmp_path / 'dist')
+    files = make_dist(dist)
+    shared, report = shared_assets.publish_shared_assets(storage, dist, files, str(tmp_path / 'stage1'))
+    assert shared == {'assets/index-CPhCYaEi.js'} and len(report.files) == 1
+    assert storage.get_bytes(f'{shared_assets.SHARED_PREFIX}/assets/index-CPhCYaEi.js') == b'console.log("villa")'
+
+    shared, report = shared_assets.publish_shared_assets(storage, dist, files, str(tmp_path / 'stage2'))
+    assert shared == {'assets/index-CPhCYaEi.js'} and not report.files
+
+    tenant_files = shared_assets.stage_tenant_files(dist, files, shared, str(tmp_path / 'stage2'))
+    assert sorted(tenant_files) == ['favicon.ico', 'index.html']
+    source, entry = tenant_files['index.html']
+    with open(source) as f:
+        assert f'{config.SHARED_ASSETS_URL}/assets/index-CPhCYaEi.js' in f.read()
+    assert entry['sha256'] != files['index.html']['sha256']
+
+
+def test_reused_name_with_other_content_stays_tenant_local(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    first = str(tmp_path / 'first')
+    shared_assets.publish_shared_assets(storage, first, make_dist(first), str(tmp_path / 'stage1'))
+    second = str(tmp_path / 'second')
+    files = make_dist(second, bundle=b'console.log("loft")')
+    shared, report = shared_assets.publish_shared_assets(storage, second, files, str(tmp_path / 'stage2'))
+    assert not shared and not report.files
+    assert 'assets/index-CPhCYaEi.js' in shared_assets.stage_tenant_files(second, files, shared, str(tmp_path / 'stage2'))
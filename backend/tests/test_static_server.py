@@ -0,0 +1,74 @@
+import gzip
+
+import pytest
+
+import config
+import static_server
+from storage import LocalStorage
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'SITE_ROOT', str(tmp_path / 'bucket'))
+    monkeypatch.setattr(static_server, '_stores', {})
+    store = LocalStorage(config.SITE_ROOT)
+    store.put_bytes('villa/index.html', b'<html>villa</html>', {'ContentType': 'text/html', 'CacheControl': 'no-cache'})
+    store.put_bytes('villa/models/villa.glb', bytes(range(256)) * 4)
+    store.put_bytes('villa/.deploy-manifest.json', b'{}')
+    bundle = b'export default 1;\n' * 100
+    store.put_bytes('_shared/assets/index-CPhCYaEi.js', gzip.compress(bundle),
+                    {'ContentType': 'text/javascript', 'ContentEncoding': 'gzip'})
+    store.put_bytes('_shared/assets/index-CPhCYaEi.js.br', b'brotli body')
+    app = static_server.create_app()
+    app.testing = True
+    client = app.test_client()
+    client.bundle = bundle
+    return client
+
+
+def test_tenant_index_and_redirect(client):
+    response = client.get('/villa')
+    assert response.status_code == 302 and response.headers['Location'].endswith('/villa/')
+    response = client.get('/villa/')
+    assert response.data == b'<html>villa</html>' and response.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/villa/.deploy-manifest.json').status_code == 404
+    assert client.get('/villa/missing.js').status_code == 404
+
+
+def test_etag_and_304(client):
+    response = client.get('/villa/index.html')
+    etag = response.headers['ETag']
+    assert client.get('/villa/index.html', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_range(client):
+    response = client.get('/villa/models/villa.glb', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206 and response.data == bytes(range(10, 20))
+    assert response.headers['Content-Range'] == 'bytes 10-19/1024'
+    assert response.headers['Content-Type'] == 'model/gltf-binary'
+
+
+def test_precompressed_variants(client):
+    path = '/_shared/assets/index-CPhCYaEi.js'
+    response = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br' and response.data == b'brotli body'
+    response = client.get(path, headers={'Accept-Encoding': 'gzip, br;q=0'})
+    assert response.headers['Content-Encoding'] == 'gzip' and gzip.decompress(response.data) == client.bundle
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    response = client.get(path, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers and response.data == client.bundle
+
+
+def test_plain_folder_gz_variant(client):
+    LocalStorage(config.SITE_ROOT).put_bytes('loft/app.css.gz', gzip.compress(b'body{}'))
+    LocalStorage(config.SITE_ROOT).put_bytes('loft/app.css', b'body{}')
+    response = client.get('/loft/app.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip' and gzip.decompress(response.data) == b'body{}'
+    assert client.get('/loft/app.css').data == b'body{}'
+
+
+def test_accepted_encodings():
+    assert static_server.accepted_encodings('gzip, deflate, br;q=0') == {'gzip', 'deflate'}
+    assert static_server.accepted_encodings('*;q=0.5') == {'*', 'gzip', 'br'}
+    assert static_server.accepted_encodings('') == set()
@@ -0,0 +1,38 @@
+import pytest
+
+from storage import LocalStorage, batched
+
+
+def test_upload_and_metadata(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'bucket'), concurrency=2)
+    local = tmp_path / 'index.html'
+    local.write_bytes(b'<html></html>')
+    uploaded = []
+    report = storage.upload_files([(str(local), 'villa/index.html', {'ContentType': 'text/html', 'ACL': 'private'})],
+                                  lambda key, size, done=False: uploaded.append(key))
+    assert not report.errors and report.total_bytes == 13 and uploaded == ['villa/index.html']
+    assert storage.get_bytes('villa/index.html') == b'<html></html>'
+    assert storage.metadata('villa/index.html') == {'ContentType': 'text/html'}
+    assert storage.get_bytes('villa/missing.js') is None
+
+
+def test_list_copy_delete(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    storage.put_bytes('villa/a.js', b'a', {'CacheControl': 'no-cache'})
+    storage.put_bytes('villa/assets/b.js', b'bb')
+    storage.put_bytes('villain/c.js', b'c')
+    assert sorted(storage.list_objects('villa/')) == ['villa/a.js', 'villa/assets/b.js']
+    storage.copy('villa/a.js', 'loft/a.js')
+    assert storage.get_bytes('loft/a.js') == b'a' and storage.metadata('loft/a.js') == {'CacheControl': 'no-cache'}
+    storage.delete_keys(['villa/a.js', 'villa/assets/b.js'])
+    assert storage.list_objects('villa/') == {} and storage.get_bytes('villain/c.js') == b'c'
+
+
+def test_keys_stay_inside_the_root(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    with pytest.raises(ValueError):
+        storage.put_bytes('../outside.js', b'x')
+
+
+def test_batched():
+    assert [len(batch) for batch in batched(list(range(2500)), 1000)] == [1000, 1000, 500]
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+import app
+import config
+from storage import LocalStorage
+
+
+@pytest.fixture
+def dist(tmp_path):
+    files = {
+        'index.html': '<html><head><script type="module" src="/assets/index-CPhCYaEi.js"></script></head></html>',
+        'assets/index-CPhCYaEi.js': 'export default 1;\n' * 100,
+        'favicon.ico': 'ico',
+        'models/villa.gltf': '{"asset": {"version": "2.0"}}',
+    }
+    for path, data in files.items():
+        dest = tmp_path / 'dist' / path
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_text(data)
+    return str(tmp_path / 'dist')
+
+
+def test_deploy_and_redeploy(tmp_path, dist):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    first = app.sync_to_s3('villa', storage, dist, tenant_settings={'viewer': {'grid': True}})
+    assert first and first['shared'] == {'files': 1, 'uploaded': 1, 'bytes': first['shared']['bytes']}
+    assert sorted(key.rsplit('/', 1)[1] for key in storage.list_objects(first['prefix'])) == \
+        ['.deploy-manifest.json', 'config.json', 'favicon.ico', 'index.html', 'villa.gltf']
+    assert json.loads(storage.get_bytes(f"{first['prefix']}/config.json")) == {'projectName': 'villa', 'viewer': {'grid': True}}
+    pointer = storage.get_bytes('villa/index.html').decode()
+    assert f'src="{config.SHARED_ASSETS_URL}/assets/index-CPhCYaEi.js"' in pointer
+    assert '__TENANT_CONFIG__' in pointer
+
+    again = app.sync_to_s3('villa', storage, dist, tenant_settings={'viewer': {'grid': True}})
+    assert again['previousVersion'] == first['version'] and again['files'] == 0
+    assert again['copied'] == again['unchanged'] == 4 and again['shared']['uploaded'] == 0
+
+
+def test_copy_from_another_tenant(tmp_path, dist):
+    storage = LocalStorage(str(tmp_path / 'bucket'))
+    villa = app.sync_to_s3('villa', storage, dist)
+    loft = app.sync_to_s3('loft', storage, dist, copy_from=villa['prefix'])
+    assert loft['copied'] == 2  # favicon.ico and the model, index.html and config.json name the tenant
+    assert loft['files'] == 2
+    with open(os.path.join(dist, 'favicon.ico'), 'rb') as f:
+        assert storage.get_bytes(f"{loft['prefix']}/favicon.ico") == f.read()
+
+
+def test_build_without_index_fails(tmp_path, dist):
+    os.remove(os.path.join(dist, 'index.html'))
+    assert app.sync_to_s3('villa', LocalStorage(str(tmp_path / 'bucket')), dist) is False
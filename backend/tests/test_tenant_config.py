@@ -0,0 +1,35 @@
+import json
+import re
+
+import tenant_config
+
+PAGE = '<html><head><title>t</title><script type="module" src="/app.js"></script></head><body></body></html>'
+
+
+def injected_payload(html):
+    match = re.search(r'<script>window\.__TENANT_CONFIG__ = (.*?);</script>', html)
+    return match.group(1)
+
+
+def test_config_goes_in_front_of_the_first_script():
+    html = tenant_config.inject_html(PAGE, {'projectName': 'villa'})
+    assert html.index('__TENANT_CONFIG__') < html.index('src="/app.js"')
+    assert json.loads(injected_payload(html)) == {'projectName': 'villa'}
+
+
+def test_markup_in_values_cannot_break_out_of_the_script():
+    config = {'title': '</script><script>alert(1)</script> <!-- a & b >', 'viewer': {'x': '<script'}}
+    html = tenant_config.inject_html(PAGE, config)
+    payload = injected_payload(html)
+    assert not set('<>&') & set(payload)
+    assert json.loads(payload) == config
+    assert html.count('<script') == 2
+
+
+def test_validate():
+    assert tenant_config.validate(None) is None
+    assert tenant_config.validate({'modelUrls': ['a.glb'], 'viewer': {}}) is None
+    assert tenant_config.validate([]) == 'config must be a json object'
+    assert tenant_config.validate({'modelUrls': 'a.glb'})
+    assert tenant_config.validate({'viewer': 1})
+    assert tenant_config.validate({'blob': 'x' * tenant_config.MAX_CONFIG_BYTES})
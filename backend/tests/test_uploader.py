@@ -0,0 +1,46 @@
+import concurrent.futures
+
+import uploader
+
+
+class FakeTransferManager:
+    """
+    Runs uploads on a thread pool and calls the subscribers the way s3transfer does.
+    """
+
+    def __init__(self, fail=()):
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        self.fail = set(fail)
+        self.uploaded = {}
+
+    def upload(self, local_path, bucket, key, extra_args=None, subscribers=()):
+        def run():
+            with open(local_path, 'rb') as f:
+                data = f.read()
+            if key in self.fail:
+                raise ConnectionError('connection reset')
+            if data:
+                for subscriber in subscribers:
+                    subscriber.on_progress(None, len(data))
+            self.uploaded[(bucket, key)] = (data, extra_args)
+            for subscriber in subscribers:
+                subscriber.on_done(None)
+        return self.pool.submit(run)
+
+
+def test_upload_files(tmp_path):
+    items = []
+    for name, data in (('index.html', b'<html></html>'), ('empty.txt', b''), ('app.js', b'x' * 100)):
+        (tmp_path / name).write_bytes(data)
+        items.append((str(tmp_path / name), f'villa/{name}', {'ContentType': 'text/plain'} if name == 'empty.txt' else None))
+    manager = FakeTransferManager(fail=['villa/app.js'])
+    progress = []
+    report = uploader.upload_files(items, 'bucket', lambda key, size, done=False: progress.append((key, size, done)),
+                                   manager=manager)
+
+    assert report.total_bytes == 113 and [stats.key for stats in report.errors] == ['villa/app.js']
+    assert manager.uploaded[('bucket', 'villa/empty.txt')] == (b'', {'ContentType': 'text/plain'})
+    assert ('villa/index.html', 13, False) in progress and ('villa/index.html', 0, True) in progress
+    summary = report.to_dict()
+    assert summary['files'] == 3 and summary['errors'] == 1
+    assert all(stats['seconds'] >= 0 for stats in summary['perFile'])
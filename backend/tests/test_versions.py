@@ -0,0 +1,68 @@
+import pytest
+
+import config
+import versions
+from storage import LocalStorage
+
+HTML = '<!doctype html><html><head><title>villa</title></head><body></body></html>'
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path))
+
+
+def deploy(storage, version, body='villa'):
+    prefix = versions.version_prefix('villa', version)
+    html = HTML.replace('villa', body)
+    storage.put_bytes(f'{prefix}/index.html', html.encode())
+    storage.put_bytes(f'{prefix}/config.json', b'{}')
+    return versions.publish(storage, 'villa', version, html, {'index.html': {'size': len(html)}})
+
+
+def version_ids(n):
+    return [f'2026010{i}T000000000-abcdef' for i in range(1, n + 1)]
+
+
+def test_pointer_base_is_absolute():
+    html = versions.pointer_html(HTML, 'villa', '20260101T000000000-abcdef')
+    assert '<head><base href="/villa/_v/20260101T000000000-abcdef/">' in html
+    assert '<meta name="deploy-version" content="20260101T000000000-abcdef">' in html
+
+
+def test_publish_switches_the_pointer_and_removes_in_place_files(storage):
+    storage.put_bytes('villa/assets/old.js', b'old')
+    storage.put_bytes('villa/.deploy-manifest.json', b'{}')
+    first, second = version_ids(2)
+    deploy(storage, first)
+    assert versions.current_version(storage, 'villa') == first
+    assert 'villa/assets/old.js' not in storage.list_objects('villa')
+    deploy(storage, second)
+    assert versions.current_version(storage, 'villa') == second
+    assert [v['id'] for v in versions.load_versions(storage, 'villa')] == [first, second]
+
+
+def test_rollback(storage):
+    first, second = version_ids(2)
+    deploy(storage, first, 'first')
+    deploy(storage, second, 'second')
+    assert versions.rollback(storage, 'villa') == first
+    pointer = storage.get_bytes('villa/index.html').decode()
+    assert 'first' in pointer and f'/villa/_v/{first}/' in pointer
+    with pytest.raises(ValueError):
+        versions.rollback(storage, 'villa')  # Nothing older than the first version
+    with pytest.raises(ValueError):
+        versions.rollback(storage, 'villa', '20990101T000000000-abcdef')
+    assert versions.rollback(storage, 'villa', second) == second
+
+
+def test_versions_beyond_the_retention_are_deleted(storage, monkeypatch):
+    monkeypatch.setattr(config, 'DEPLOY_KEEP_VERSIONS', 2)
+    ids = version_ids(4)
+    for version in ids[:3]:
+        deploy(storage, version)
+    assert [v['id'] for v in versions.load_versions(storage, 'villa')] == ids[1:3]
+    assert not storage.list_objects(versions.version_prefix('villa', ids[0]))
+    versions.rollback(storage, 'villa', ids[1])
+    assert deploy(storage, ids[3]) == [ids[1]]
+    assert storage.get_bytes(f'{versions.version_prefix("villa", ids[2])}/config.json') == b'{}'
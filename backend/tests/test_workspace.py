@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import config
+import workspace
+
+CHILD = '''
+import os, sys, time
+sys.path.insert(0, {backend!r})
+import workspace
+workspace.Workspace({job!r}).__enter__()
+print('ready', flush=True)
+if {exit_now}:
+    os._exit(1)
+time.sleep(60)
+'''
+
+
+@pytest.fixture
+def workspace_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'WORKSPACE_DIR', str(tmp_path))
+    monkeypatch.setattr(workspace, '_owner', None)
+    monkeypatch.setenv('WORKSPACE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def start(job, exit_now):
+    code = CHILD.format(backend=os.path.dirname(workspace.__file__), job=job, exit_now=exit_now)
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE)
+    assert process.stdout.readline().strip() == b'ready'
+    return process
+
+
+def job_dirs(root):
+    return sorted(job for owner in os.listdir(root) if os.path.isdir(root / owner)
+                  for job in os.listdir(root / owner) if job != workspace.LOCK_FILE)
+
+
+def test_workspace_removed_when_job_is_done(workspace_dir):
+    with workspace.Workspace('job') as ws:
+        assert os.path.isdir(ws.path)
+        assert os.path.dirname(ws.path) == workspace.owner_dir()
+    assert not os.path.exists(ws.path)
+
+
+def test_cleanup_keeps_live_owners_and_removes_dead_ones(workspace_dir):
+    live = start('live', exit_now=False)
+    try:
+        start('dead', exit_now=True).wait()
+        with workspace.Workspace('mine'):
+            assert job_dirs(workspace_dir) == ['dead', 'live', 'mine']
+            assert workspace.cleanup_stale(max_age=0) == 1
+            assert job_dirs(workspace_dir) == ['live', 'mine']
+    finally:
+        live.kill()
+        live.wait()
+    assert workspace.cleanup_stale() == 1
+    assert job_dirs(workspace_dir) == []
+
+
+def test_folders_without_owner_expire_by_age(workspace_dir):
+    (workspace_dir / 'old-job').mkdir()
+    (workspace_dir / 'new-job').mkdir()
+    os.utime(workspace_dir / 'old-job', (0, 0))
+    assert workspace.cleanup_stale(max_age=3600) == 1
+    assert sorted(os.listdir(workspace_dir)) == ['new-job']
+
+
+def test_quota(workspace_dir):
+    with workspace.Workspace('job', quota=10) as ws:
+        os.makedirs(ws.dist)
+        with open(os.path.join(ws.dist, 'index.html'), 'w') as f:
+            f.write('x' * 100)
+        with pytest.raises(workspace.WorkspaceQuotaExceeded):
+            ws.check_quota()
+        with pytest.raises(workspace.WorkspaceQuotaExceeded):
+            workspace.Workspace('second', quota=10).__enter__()
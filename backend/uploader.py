@@ -0,0 +1,167 @@
+"""
+Parallel upload engine for sync_to_s3.
+
+One boto3 client (with a connection pool sized for the upload concurrency) and one s3transfer
+TransferManager are created lazily and shared by every job, so TCP/TLS connections are reused across
+deploys instead of being set up again per file. Files are submitted to the TransferManager all at
+once and uploaded concurrently. Files of MULTIPART_THRESHOLD bytes and more (.glb models) don't come
+through here, storage.py hands them to multipart.py (resumable, checksummed parts).
+
+boto3 is imported on first use, so the report classes (and LocalStorage) work without it installed.
+"""
+
+import os
+import threading
+import time
+
+import config
+
+_lock = threading.Lock()
+_s3_client = None
+_transfer_manager = None
+
+
+def get_s3_client():
+    """
+    Long-lived s3 client shared by all jobs. boto3 clients are thread safe.
+    """
+    global _s3_client
+    with _lock:
+        if _s3_client is None:
+            import boto3
+            from botocore.config import Config
+            _s3_client = boto3.client('s3', config=Config(
+                max_pool_connections=config.S3_MAX_POOL_CONNECTIONS,
+                retries={'max_attempts': 5, 'mode': 'adaptive'},
+            ))
+        return _s3_client
+
+
+def create_transfer_manager(concurrency, client=None):
+    from s3transfer.manager import TransferConfig, TransferManager
+    return TransferManager(client or get_s3_client(), TransferConfig(
+        max_request_concurrency=concurrency,
+        multipart_threshold=config.MULTIPART_THRESHOLD,
+        multipart_chunksize=config.MULTIPART_CHUNKSIZE,
+    ))
+
+
+def get_transfer_manager():
+    """
+    TransferManager shared by all jobs, so UPLOAD_CONCURRENCY is a limit for the whole process.
+    """
+    global _transfer_manager
+    client = get_s3_client()
+    with _lock:
+        if _transfer_manager is None:
+            _transfer_manager = create_transfer_manager(config.UPLOAD_CONCURRENCY, client)
+        return _transfer_manager
+
+
+class FileStats:
+    def __init__(self, key, size):
+        self.key = key
+        self.size = size
+        self.started = None
+        self.finished = None
+        self.error = None
+
+    @property
+    def seconds(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    def to_dict(self):
+        seconds = self.seconds
+        return {
+            'key': self.key,
+            'bytes': self.size,
+            'seconds': round(seconds, 4),
+            'mbPerSecond': round(self.size / seconds / 1e6, 3) if seconds else None,
+            'error': self.error,
+        }
+
+
+class UploadReport:
+    """
+    Per-file and total throughput of one upload run.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def total_bytes(self):
+        return sum(f.size for f in self.files)
+
+    @property
+    def errors(self):
+        return [f for f in self.files if f.error]
+
+    def to_dict(self):
+        seconds = (self.finished or time.perf_counter()) - self.started
+        return {
+            'files': len(self.files),
+            'bytes': self.total_bytes,
+            'seconds': round(seconds, 3),
+            'filesPerSecond': round(len(self.files) / seconds, 2) if seconds else None,
+            'mbPerSecond': round(self.total_bytes / seconds / 1e6, 3) if seconds else None,
+            'errors': len(self.errors),
+            'perFile': [f.to_dict() for f in self.files],
+        }
+
+
+class _StatsSubscriber:
+    """
+    s3transfer subscriber recording when the first byte of a file went out and when the transfer finished.
+    """
+
+    def __init__(self, stats, progress=None):
+        self.stats = stats
+        self.progress = progress
+
+    def on_queued(self, future, **kwargs):
+        pass
+
+    def on_progress(self, future, bytes_transferred, **kwargs):
+        if self.stats.started is None:
+            self.stats.started = time.perf_counter()
+        if self.progress:
+            self.progress(self.stats.key, bytes_transferred)
+
+    def on_done(self, future, **kwargs):
+        self.stats.finished = time.perf_counter()
+        if self.progress:
+            self.progress(self.stats.key, 0, done=True)
+
+
+def upload_files(items, bucket, progress=None, manager=None):
+    """
+    Upload `items`, a list of (local_path, key, extra_args) tuples, concurrently and wait for all of
+    them. Returns an UploadReport, failed files have `error` set instead of raising.
+    `progress(key, bytes_transferred, done=False)` is called as bytes go out and when a file is done.
+    """
+    manager = manager or get_transfer_manager()
+    report = UploadReport()
+    futures = []
+    for local_path, key, extra_args in items:
+        stats = FileStats(key, os.path.getsize(local_path))
+        report.files.append(stats)
+        future = manager.upload(local_path, bucket, key, extra_args=extra_args or None,
+                                subscribers=[_StatsSubscriber(stats, progress)])
+        futures.append((future, stats))
+
+    for future, stats in futures:
+        try:
+            future.result()
+        except Exception as e:
+            stats.error = str(e)
+        if stats.started is None:  # Empty file, on_progress never fires
+            stats.started = stats.finished or time.perf_counter()
+
+    report.finished = time.perf_counter()
+    return report
+
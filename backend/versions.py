@@ -0,0 +1,182 @@
+"""
+Immutable, versioned tenant deploys.
+
+Every deploy of a tenant goes to its own prefix and is never modified afterwards:
+    <tenant>/_v/<version>/...                  <=== complete tenant files of one deploy (+ its deploy manifest)
+    <tenant>/.deploy-versions.json             <=== versions deployed so far, oldest first
+    <tenant>/index.html                        <=== the pointer
+
+The pointer is the tenant's index.html: a copy of the version's index.html with a
+<base href="/<tenant>/_v/<version>/"> so every relative url of the page (config.json, models, public files)
+resolves into that version, and a <meta name="deploy-version"> naming it. The base is absolute, a relative
+one would resolve against the site root when the page is opened as /<tenant> (no trailing slash). Visitors keep getting the
+old version until the pointer is written once the upload finished, the switch is that one small PUT
+(atomic on s3, os.replace on LocalStorage), and so is a rollback. Fingerprinted bundles live in the
+shared asset store and are referenced by absolute urls, <base> doesn't touch them.
+
+Versions beyond the retention (DEPLOY_KEEP_VERSIONS newest + the live one) are deleted after a deploy,
+with the batched delete of the storage backend. The first versioned deploy of a tenant that was deployed
+in place before (files right under <tenant>/) deletes those files once the pointer is written.
+"""
+
+import gzip
+import json
+import re
+import threading
+import time
+import uuid
+
+import compression
+import config
+
+VERSIONS_DIR = '_v'
+VERSIONS_INDEX = '.deploy-versions.json'
+POINTER = 'index.html'
+
+VERSION_RE = re.compile(r'^\d{8}T\d{9}-[0-9a-f]{6}$')
+VERSION_META_RE = re.compile(r'<meta name="deploy-version" content="([^"]+)">')
+HEAD_RE = re.compile(r'<head(\s[^>]*)?>', re.IGNORECASE)
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock(project_name):
+    """
+    Serializes index updates, pointer switches and gc of a tenant within this process.
+    """
+    with _locks_lock:
+        return _locks.setdefault(project_name, threading.Lock())
+
+
+def new_version_id():
+    """
+    UTC timestamp (ms) + random suffix, sorts in deploy order.
+    """
+    now = time.time()
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}"
+
+
+def version_prefix(project_name, version):
+    return f'{project_name}/{VERSIONS_DIR}/{version}'
+
+
+def pointer_html(html, project_name, version):
+    """
+    The version's index.html as served from the tenant root.
+    """
+    tags = f'<base href="/{version_prefix(project_name, version)}/"><meta name="deploy-version" content="{version}">'
+    match = HEAD_RE.search(html)
+    if match:
+        return html[:match.end()] + tags + html[match.end():]
+    return tags + html
+
+
+def _html(data):
+    if data[:2] == b'\x1f\x8b':  # Stored gzip encoded, see compression.prepare()
+        data = gzip.decompress(data)
+    return data.decode('utf-8')
+
+
+def load_versions(storage, project_name):
+    """
+    [{'id', 'createdAt', 'files', 'bytes'}] of the tenant, oldest first.
+    """
+    data = storage.get_bytes(f'{project_name}/{VERSIONS_INDEX}')
+    if not data:
+        return []
+    try:
+        return json.loads(data).get('versions', [])
+    except ValueError:
+        return []
+
+
+def _save_versions(storage, project_name, versions):
+    body = json.dumps({'versions': versions}, sort_keys=True).encode()
+    storage.put_bytes(f'{project_name}/{VERSIONS_INDEX}', body,
+                      {'ContentType': 'application/json', 'CacheControl': 'no-cache'})
+
+
+def current_version(storage, project_name):
+    """
+    Version the pointer currently names, None for a tenant that was never deployed with versions.
+    """
+    data = storage.get_bytes(f'{project_name}/{POINTER}')
+    if not data:
+        return None
+    match = VERSION_META_RE.search(_html(data))
+    return match.group(1) if match else None
+
+
+def _write_pointer(storage, project_name, version, html):
+    storage.put_bytes(f'{project_name}/{POINTER}', pointer_html(html, project_name, version).encode('utf-8'),
+                      {'ContentType': compression.content_type(POINTER), 'CacheControl': compression.cache_control(POINTER)})
+
+
+def publish(storage, project_name, version, html, files):
+    """
+    Record an uploaded version and point the tenant at it. `html` is the version's index.html,
+    `files` its deploy manifest. Returns the versions deleted by the retention policy.
+    """
+    with _lock(project_name):
+        versions = [v for v in load_versions(storage, project_name) if v['id'] != version]
+        versions.append({
+            'id': version,
+            'createdAt': time.time(),
+            'files': len(files),
+            'bytes': sum(entry['size'] for entry in files.values()),
+        })
+        _save_versions(storage, project_name, versions)
+        first = current_version(storage, project_name) is None
+        _write_pointer(storage, project_name, version, html)
+        if first:
+            _delete_unversioned(storage, project_name)
+        return _collect_garbage(storage, project_name, versions, version)
+
+
+def _delete_unversioned(storage, project_name):
+    """
+    Delete what an in-place deploy left under the tenant prefix (assets, .deploy-manifest.json,
+    index.html.br, ...), everything but the versions, their index and the pointer.
+    """
+    keep = {f'{project_name}/{POINTER}', f'{project_name}/{VERSIONS_INDEX}'}
+    versioned = f'{project_name}/{VERSIONS_DIR}/'
+    storage.delete_keys([key for key in storage.list_objects(project_name)
+                         if key not in keep and not key.startswith(versioned)])
+
+
+def rollback(storage, project_name, version=None):
+    """
+    Point the tenant at an earlier version (default: the one before the live one). Returns the version,
+    raises ValueError when there is nothing to roll back to.
+    """
+    with _lock(project_name):
+        ids = [v['id'] for v in load_versions(storage, project_name)]
+        live = current_version(storage, project_name)
+        if version is None:
+            older = ids[:ids.index(live)] if live in ids else ids[:-1]
+            if not older:
+                raise ValueError(f'No earlier version of {project_name} to roll back to')
+            version = older[-1]
+        if version not in ids:
+            raise ValueError(f'Unknown version of {project_name}: {version}')
+        data = storage.get_bytes(f'{version_prefix(project_name, version)}/{POINTER}')
+        if data is None:
+            raise ValueError(f'Version {version} of {project_name} has no index.html')
+        _write_pointer(storage, project_name, version, _html(data))
+        return version
+
+
+def _collect_garbage(storage, project_name, versions, live):
+    """
+    Delete versions beyond the DEPLOY_KEEP_VERSIONS newest, never the live one.
+    """
+    keep = {v['id'] for v in versions[-config.DEPLOY_KEEP_VERSIONS:]} | {live}
+    expired = [v['id'] for v in versions if v['id'] not in keep]
+    if not expired:
+        return []
+    # Out of the index first, a version whose delete fails half way is never offered for rollback
+    _save_versions(storage, project_name, [v for v in versions if v['id'] in keep])
+    for version in expired:
+        storage.delete_keys(storage.list_objects(version_prefix(project_name, version)))
+    return expired
@@ -0,0 +1,135 @@
+"""
+Per-job scratch folders for builds.
+
+Every job builds into <WORKSPACE_DIR>/<owner>/<job id>/dist instead of the shared multi-tenant-web-app/dist,
+so any number of builds can run side by side without one tenant uploading another tenant's half
+written output. The folder is removed when the job is done.
+
+<owner> is one folder per server process (gunicorn workers, a second instance on the host), the process
+holds a flock on <owner>/.lock for as long as it runs. The kernel drops the lock when the process dies,
+so cleanup_stale() removes the workspaces of dead processes right away and never touches live builds.
+
+WORKSPACE_QUOTA_BYTES caps the disk used by all workspaces together: a job doesn't start while the
+workspaces are over the quota, and a build that pushes them over it fails.
+"""
+
+import fcntl
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import config
+
+_lock = threading.Lock()
+_owner = None  # (pid, owner dir, open lock file) of this process
+LOCK_FILE = '.lock'
+
+
+class WorkspaceQuotaExceeded(RuntimeError):
+    pass
+
+
+def disk_usage(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except FileNotFoundError:  # Removed by a job finishing in the meantime
+                pass
+    return total
+
+
+def owner_dir():
+    """
+    This process's folder under WORKSPACE_DIR, created (and locked) on first use and again after a fork.
+    """
+    global _owner
+    with _lock:
+        if _owner is None or _owner[0] != os.getpid():
+            if _owner is not None:
+                _owner[2].close()  # Inherited from the parent, the parent still holds the lock
+            path = os.path.join(config.WORKSPACE_DIR, f'{os.getpid()}-{uuid.uuid4().hex[:8]}')
+            os.makedirs(path)
+            lock_file = open(os.path.join(path, LOCK_FILE), 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            _owner = (os.getpid(), path, lock_file)
+        return _owner[1]
+
+
+def _owner_alive(path):
+    """
+    Whether the process owning `path` still holds its lock, None for folders without one.
+    """
+    try:
+        with open(os.path.join(path, LOCK_FILE)) as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            return False
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def cleanup_stale(max_age=None):
+    """
+    Remove the workspaces of server processes that are gone, and folders without an owner (older layout)
+    that are older than `max_age` seconds.
+    """
+    max_age = config.WORKSPACE_MAX_AGE if max_age is None else max_age
+    if not os.path.isdir(config.WORKSPACE_DIR):
+        return 0
+    own = _owner[1] if _owner is not None and _owner[0] == os.getpid() else None
+    removed = 0
+    for name in os.listdir(config.WORKSPACE_DIR):
+        path = os.path.join(config.WORKSPACE_DIR, name)
+        if path == own:
+            continue
+        alive = _owner_alive(path)
+        try:
+            stale = alive is False or (alive is None and time.time() - os.path.getmtime(path) > max_age)
+        except FileNotFoundError:  # Removed by another process in the meantime
+            continue
+        if stale:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            removed += 1
+    return removed
+
+
+class Workspace:
+    """
+    with Workspace(job.id) as ws:
+        run_build(..., out_dir=ws.dist)
+        ws.check_quota()
+    """
+
+    def __init__(self, job_id, quota=None):
+        self.path = os.path.join(owner_dir(), job_id)
+        self.dist = os.path.join(self.path, 'dist')
+        self.quota = config.WORKSPACE_QUOTA_BYTES if quota is None else quota
+
+    def __enter__(self):
+        with _lock:
+            if disk_usage(config.WORKSPACE_DIR) >= self.quota:
+                cleanup_stale()
+                if disk_usage(config.WORKSPACE_DIR) >= self.quota:
+                    raise WorkspaceQuotaExceeded('Workspace disk quota exceeded, try again once running builds finish.')
+            os.makedirs(self.path)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def check_quota(self):
+        """
+        Fail the job if its output pushed all workspaces together over the quota.
+        """
+        used = disk_usage(config.WORKSPACE_DIR)
+        if used > self.quota:
+            raise WorkspaceQuotaExceeded(f'Workspace disk quota exceeded ({used} > {self.quota} bytes).')
@@ -4,4 +4,5 @@ import react from '@vitejs/plugin-react'
 // https://vitejs.dev/config/
 export default defineConfig({
   plugins: [react()],
+  base: './', // Relative asset urls, every tenant is served from its own prefix (bucket/<tenant>/)
 })